@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Scale benchmarks of case_mapping on synthetic cases (see case_mapping.synthetic).
+
+Every size runs in a fresh interpreter, so that its peak RSS is its own, and measures:
+  - construction: building the objects from the library's classes
+  - serialization: writing them to a case file with stream.BundleWriter
+  - loading: reading the file back with stream.iter_case_file() and directory.load_entity()
+  - peak RSS, and the serialized bytes of objects and facets per @type
+Objects are built and written in chunks, so that memory use is bounded for 10^7 objects.
+The scaling of concurrent appends (Bundle.concurrent_appends()) is then measured from 1 to N threads, and the memory
+saved by storing olo:slot entries as item @ids (base.OrderedSlots) rather than slot dictionaries.
+
+    python benchmarks/run.py --sizes 1000 100000 --output results.json
+    python benchmarks/run.py --sizes 1000 --threads 1 2 4 8 16
+    python benchmarks/run.py --sizes 1000 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Allow running from a source checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import case_mapping  # noqa: E402
+from case_mapping.base import OrderedSlots, json_default  # noqa: E402
+from case_mapping.directory import load_entity  # noqa: E402
+from case_mapping.stream import BundleWriter, iter_case_file  # noqa: E402
+from case_mapping.synthetic import CaseGenerator  # noqa: E402
+from case_mapping.uco.core import Bundle  # noqa: E402
+from case_mapping.uco.observable import (  # noqa: E402
+    FacetAccount,
+    FacetPhoneAccount,
+    ObservableObject,
+)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+CHUNK_SIZE = 100000
+DEFAULT_THREADS = (1, 2, 4, 8)
+SCALING_OBJECTS = 100000
+SLOT_ITEMS = 100000
+
+# The throughput metrics compared by --compare (higher is better)
+THROUGHPUTS = ("construct_per_second", "serialize_per_second", "load_per_second")
+
+
+def peak_rss():
+    """
+    The peak resident set size of this process in bytes, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _account(sizes, kind, text):
+    entry = sizes.setdefault(kind, {"count": 0, "bytes": 0})
+    entry["count"] += 1
+    entry["bytes"] += len(text.encode("utf-8"))
+
+
+def _type_sizes(objects, objects_sizes, facet_sizes):
+    for obj in objects:
+        _account(
+            objects_sizes,
+            obj.get("@type"),
+            json.dumps(obj, separators=(",", ":"), default=json_default),
+        )
+        for facet in obj.get("uco-core:hasFacet") or []:
+            _account(
+                facet_sizes,
+                facet.get("@type"),
+                json.dumps(facet, separators=(",", ":"), default=json_default),
+            )
+
+
+def measure(count, seed, work_dir=None):
+    """
+    Run the benchmarks for a case of count objects in this process.
+    :return: A dictionary of measurements
+    """
+    generator = CaseGenerator(seed=seed)
+    objects = generator.iter_objects(count)
+    object_sizes, facet_sizes = dict(), dict()
+    construct = serialize = 0.0
+    fd, path = tempfile.mkstemp(suffix=".json", dir=work_dir)
+    os.close(fd)
+    try:
+        with BundleWriter(path, Bundle(uco_core_name="benchmark")) as writer:
+            remaining = count
+            while remaining:
+                start = time.perf_counter()
+                chunk = [next(objects) for _ in range(min(CHUNK_SIZE, remaining))]
+                construct += time.perf_counter() - start
+                start = time.perf_counter()
+                writer.write(chunk)
+                serialize += time.perf_counter() - start
+                _type_sizes(chunk, object_sizes, facet_sizes)
+                remaining -= len(chunk)
+                del chunk
+        file_bytes = os.path.getsize(path)
+
+        start = time.perf_counter()
+        loaded = 0
+        for event, _, value in iter_case_file(path):
+            if event == "object":
+                load_entity(value)
+                loaded += 1
+        load = time.perf_counter() - start
+    finally:
+        os.remove(path)
+
+    return {
+        "objects": count,
+        "seed": seed,
+        "construct_seconds": construct,
+        "construct_per_second": count / construct if construct else None,
+        "serialize_seconds": serialize,
+        "serialize_per_second": count / serialize if serialize else None,
+        "load_seconds": load,
+        "load_per_second": loaded / load if load else None,
+        "file_bytes": file_bytes,
+        "bytes_per_object": file_bytes / count if count else None,
+        "peak_rss_bytes": peak_rss(),
+        "object_types": object_sizes,
+        "facet_types": facet_sizes,
+    }
+
+
+def _extract(appender, shared, index):
+    obj = ObservableObject()
+    appender.append_facets(obj, FacetPhoneAccount(phone_number=str(index)))
+    appender.append_to_uco_object(obj, order=index)
+    shared.append_facets(FacetAccount(identifier=str(index)))
+
+
+def measure_scaling(count, threads):
+    """
+    Measure the throughput of concurrent appends for every number of threads: each work item builds an object and
+    appends it through the bundle's ConcurrentAppender, and a facet directly to an object shared by all the threads,
+    as the extractors of a thread pool do; the appender is then flushed.
+    :return: A list of measurements, one per number of threads
+    """
+    results = []
+    for workers in threads:
+        bundle = Bundle(uco_core_name="scaling")
+        shared = ObservableObject()
+        start = time.perf_counter()
+        with bundle.concurrent_appends() as appender:
+            with ThreadPoolExecutor(workers) as pool:
+                for _ in pool.map(
+                    lambda index: _extract(appender, shared, index), range(count)
+                ):
+                    pass
+        seconds = time.perf_counter() - start
+        if len(bundle["uco-core:object"]) != count:
+            raise RuntimeError(f"Objects lost with {workers} threads")
+        results.append(
+            {
+                "threads": workers,
+                "objects": count,
+                "seconds": seconds,
+                "objects_per_second": count / seconds,
+            }
+        )
+    for result in results:
+        result["speedup"] = (
+            result["objects_per_second"] / results[0]["objects_per_second"]
+        )
+    return results
+
+
+def _allocated(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def measure_slot_memory(count):
+    """
+    Measure the memory of the olo:slot entries of count indexed items, as slot dictionaries and as OrderedSlots.
+    """
+    ids = [f"kb:observable-{i:036d}" for i in range(count)]
+    legacy = _allocated(
+        lambda: [
+            {"olo:index": str(i + 1), "olo:item": {"@id": item_id}}
+            for i, item_id in enumerate(ids)
+        ]
+    )
+    compact = _allocated(lambda: OrderedSlots(ids))
+    return {
+        "items": count,
+        "legacy_bytes": legacy,
+        "compact_bytes": compact,
+        "saved_bytes_per_million": (legacy - compact) * 1000000 // count,
+    }
+
+
+def run(
+    sizes, seed, work_dir=None, threads=DEFAULT_THREADS, scaling_objects=SCALING_OBJECTS
+):
+    """
+    Measure every size in a fresh interpreter, then the scaling of concurrent appends and the memory of olo:slot
+    entries in this one.
+    :return: The results document
+    """
+    results = []
+    for count in sizes:
+        command = [sys.executable, os.path.abspath(__file__), "--measure", str(count)]
+        command += ["--seed", str(seed)]
+        if work_dir:
+            command += ["--work-dir", work_dir]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout
+        results.append(json.loads(output))
+        print(_summary(results[-1]), file=sys.stderr)
+    scaling = measure_scaling(scaling_objects, threads) if threads else []
+    for result in scaling:
+        print(
+            f"{result['threads']:>10} threads: {result['objects_per_second']:,.0f} appends/s "
+            f"({result['speedup']:.2f}x)",
+            file=sys.stderr,
+        )
+    slots = measure_slot_memory(SLOT_ITEMS)
+    print(
+        f"olo:slot memory saved: {slots['saved_bytes_per_million'] / (1 << 20):,.0f} MiB per million items",
+        file=sys.stderr,
+    )
+
+    return {
+        "version": case_mapping.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+        "scaling": scaling,
+        "slot_memory": slots,
+    }
+
+
+def _summary(result):
+    rss = result["peak_rss_bytes"]
+    return (
+        f"{result['objects']:>10} objects: "
+        f"construct {result['construct_per_second']:,.0f}/s, "
+        f"serialize {result['serialize_per_second']:,.0f}/s, "
+        f"load {result['load_per_second']:,.0f}/s, "
+        f"{result['bytes_per_object']:,.0f} bytes/object, "
+        f"peak RSS {'?' if rss is None else f'{rss / (1 << 20):,.0f} MiB'}"
+    )
+
+
+def compare(current, baseline):
+    """
+    Print the throughput ratios (current / baseline) of the sizes measured in both documents.
+    """
+    previous = {result["objects"]: result for result in baseline["results"]}
+    print(f"{'objects':>10}  " + "  ".join(f"{name:>22}" for name in THROUGHPUTS))
+    for result in current["results"]:
+        old = previous.get(result["objects"])
+        if old is None:
+            continue
+        ratios = [
+            f"{result[name] / old[name]:>21.2f}x"
+            if result[name] and old[name]
+            else f"{'-':>22}"
+            for name in THROUGHPUTS
+        ]
+        print(f"{result['objects']:>10}  " + "  ".join(ratios))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results (JSON) to this file")
+    parser.add_argument("--compare", help="Compare with the results of a previous run")
+    parser.add_argument("--work-dir", help="The directory of the temporary case files")
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="*",
+        default=DEFAULT_THREADS,
+        help="The numbers of threads of the concurrent append scaling run (none to skip it)",
+    )
+    parser.add_argument(
+        "--scaling-objects",
+        type=int,
+        default=SCALING_OBJECTS,
+        help="The number of objects appended per number of threads",
+    )
+    parser.add_argument("--measure", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        json.dump(measure(args.measure, args.seed, args.work_dir), sys.stdout)
+        return
+
+    document = run(
+        args.sizes, args.seed, args.work_dir, args.threads, args.scaling_objects
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(document, fp, indent=4)
+    else:
+        json.dump(document, sys.stdout, indent=4)
+        print()
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            compare(document, json.load(fp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import asyncio
+
+from .base import unpack_args_array
+from .stream import BundleWriter
+
+_DONE = object()
+
+
+class AsyncBundleWriter:
+    def __init__(
+        self,
+        fp_or_path,
+        bundle=None,
+        indent=None,
+        max_queue=1024,
+        batch_size=256,
+        executor=None,
+    ):
+        """
+        An asyncio sink writing a bundle incrementally (see stream.BundleWriter) without blocking the event loop:
+        encoding and file I/O run on an executor, in batches, while producers await append().
+        Appended objects are queued in a bounded queue, so fast producers are slowed down (backpressure) instead of
+        letting the backlog grow without bounds. Objects must not be modified after they have been appended.
+
+            async with AsyncBundleWriter("case.json", bundle) as writer:
+                await writer.append(obj)
+
+        :param fp_or_path: A path or an opened text file
+        :param bundle: A Bundle (or any dict) providing the top-level properties
+        :param indent: Pretty-print with this indentation level (compact output when None)
+        :param max_queue: The maximum number of objects waiting to be written
+        :param batch_size: The maximum number of objects written per executor call
+        :param executor: The concurrent.futures executor to run encoding and I/O on (defaults to the loop's default)
+        """
+        self.fp_or_path = fp_or_path
+        self.bundle = bundle
+        self.indent = indent
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.executor = executor
+        self.objects_written = 0
+        self._writer = None
+        self._queue = None
+        self._task = None
+        self._error = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
+
+    async def __aenter__(self):
+        self._writer = await self._run(
+            lambda: BundleWriter(self.fp_or_path, self.bundle, indent=self.indent)
+        )
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.ensure_future(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._queue.put(_DONE)
+        await self._task
+        await self._run(self._writer.close)
+        if self._error is not None and exc_type is None:
+            raise self._error
+
+    @unpack_args_array
+    async def append(self, *args):
+        """
+        Queue a single/tuple of objects to be written, waiting while the queue is full.
+        """
+        for item in args:
+            if self._error is not None:
+                raise self._error
+            await self._queue.put(item)
+
+    def _write_batch(self, batch):
+        # One object per write() call, so that the event loop thread can take the GIL between objects.
+        for item in batch:
+            self._writer.write(item)
+
+    async def _consume(self):
+        done = False
+        while not done:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            if batch and self._error is None:
+                try:
+                    await self._run(self._write_batch, batch)
+                    self.objects_written += len(batch)
+                except Exception as error:
+                    # Keep draining the queue so that producers are not blocked forever.
+                    self._error = error
@@ -18,21 +18,155 @@ def unpack_args_array(func):
     return wrapper
 
 
+class LazyValue:
+    """
+    A property value that is only computed when the entity holding it is serialized (e.g. a file-backed data
+    payload, see payload.py). Subclasses implement to_json(); those setting streamed to True also implement
+    iter_json(), and are then written piece by piece by stream.BundleWriter instead of being materialized whole.
+    """
+
+    streamed = False
+
+    def to_json(self):
+        raise NotImplementedError
+
+    def iter_json(self):
+        """
+        Yield the JSON text of the value in pieces.
+        """
+        yield json.dumps(self.to_json())
+
+    def copy(self):
+        """
+        A copy for an entity copied by Bundle.edit(); immutable values return themselves.
+        """
+        return self
+
+
+def json_default(value):
+    """
+    The default hook of json.dumps(), materializing LazyValues.
+    """
+    if isinstance(value, LazyValue):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class GeneratedList(list):
+    """
+    A property value list whose items are generated when it is iterated, from a compact state kept by the
+    subclass (e.g. the nodes of a message thread, see threads.py). json.dumps() iterates list subclasses instead of
+    reading their storage, so unlike LazyValues these serialize without json_default(). Subclasses implement
+    __iter__() and __len__(); the list storage itself is theirs to use, or left empty.
+    """
+
+    __slots__ = ()
+    __hash__ = None
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __contains__(self, value):
+        return any(item == value for item in self)
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __eq__(self, other):
+        return list(self) == (list(other) if isinstance(other, GeneratedList) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def copy(self):
+        """
+        A copy for an entity copied by Bundle.edit(); by default the generated items, as a plain list.
+        """
+        return list(self)
+
+    def rewrite_references(self, resolve):
+        """
+        Point the @id references of the generated items at resolve(@id) (see dedup.py).
+        """
+        raise NotImplementedError
+
+
+class OrderedSlots(GeneratedList):
+    """
+    The olo:slot entries of an ordered list (see ObjectEntity.append_indexed_items), stored as the @ids of their
+    items only: the slot dictionaries, a tenth of the memory each, are generated when the list is read or serialized.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, ids=()):
+        super().__init__(ids)
+
+    @classmethod
+    def from_slots(cls, slots):
+        """
+        Rebuild the slots of a loaded olo:slot list.
+        """
+        ordered = sorted(slots, key=lambda slot: int(slot["olo:index"]))
+        return cls(slot["olo:item"]["@id"] for slot in ordered)
+
+    def iter_ids(self):
+        return list.__iter__(self)
+
+    def __iter__(self):
+        for i, item_id in enumerate(list.__iter__(self)):
+            yield {"olo:index": str(i + 1), "olo:item": {"@id": item_id}}
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item_id = list.__getitem__(self, index)
+        if index < 0:
+            index += len(self)
+        return {"olo:index": str(index + 1), "olo:item": {"@id": item_id}}
+
+    def __reduce__(self):
+        return self.__class__, (list(self.iter_ids()),)
+
+    def copy(self):
+        return self.__class__(self.iter_ids())
+
+    def rewrite_references(self, resolve):
+        self[:] = [resolve(item_id) for item_id in self.iter_ids()]
+
+
 class FacetEntity(dict):
+    # Set on entities that belong to a Bundle with an enabled journal (see journal.py)
+    _journal = None
+    _journal_root = None
+
     def __init__(self):
         self["@id"] = str(uuid4())
 
     def __str__(self):
-        return json.dumps(self, indent=4)
+        return json.dumps(self, indent=4, default=json_default)
 
     def get_id(self):
         return self["@id"]
 
+    def _changed(self, key=None, children=()):
+        """
+        Report a mutation of this entity (and the entities appended under key) to the journal, if any, and drop its
+        cached content digest (see validation.content_hash()).
+        """
+        self.__dict__.pop("_content_digest", None)
+        if self._journal is not None:
+            self._journal.changed(self, key, children)
+
     def _append_stuff(self, key, *args, refs=False, objects=False):
         if len(args) == 1 and not args[0]:  # True if no objects to append provided
             pass
         else:
-            if len(args) and self.get(key) is None:
+            # setdefault() is atomic, so concurrent first appends cannot each create (and lose) a list
+            if len(args) and self.setdefault(key, list()) is None:
                 self[key] = list()
             elif len(args) and isinstance(
                 self[key], dict
@@ -46,6 +180,7 @@ class FacetEntity(dict):
                         self[key].append(item)
                 else:
                     print(f"{item}: NOT A CASE OBJECT")
+            self._changed(key, args if objects else ())
 
     def _append_refs(self, key, *args):
         self._append_stuff(key, *args, refs=True)
@@ -54,13 +189,14 @@ class FacetEntity(dict):
         self._append_stuff(key, *args, objects=True)
 
     def _append_strings(self, key, *args):
-        if len(args) and self.get(key) is None:
+        if len(args) and self.setdefault(key, list()) is None:
             self[key] = list()
         for item in args:
             if isinstance(item, str):
                 self[key].append(item)
             else:
                 print(f"{item}: NOT A STRING")
+        self._changed()
 
     def _str_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -68,6 +204,7 @@ class FacetEntity(dict):
                 self[key] = var
             else:
                 self.__handle_var_type_errors(key, var, "str")
+        self._changed()
 
     def _float_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -79,6 +216,7 @@ class FacetEntity(dict):
                 # self[key] = {"@type": "xsd:decimal", "@value": str(float(var))}
             else:
                 self.__handle_var_type_errors(key, var, "float")
+        self._changed()
 
     def _int_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -87,6 +225,7 @@ class FacetEntity(dict):
                 # self[key] = {"@type": "xsd:integer", "@value": str(var)}
             else:
                 self.__handle_var_type_errors(key, var, "int")
+        self._changed()
 
     def _bool_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -95,6 +234,7 @@ class FacetEntity(dict):
                 # self[key] = {"@type": "xsd:boolean", "@value": var}
             else:
                 self.__handle_var_type_errors(key, var, "bool")
+        self._changed()
 
     def _datetime_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -104,6 +244,7 @@ class FacetEntity(dict):
                 self[key] = {"@type": "xsd:dateTime", "@value": iso_format}
             else:
                 self.__handle_var_type_errors(key, var, "datetime")
+        self._changed()
 
     def _nonegative_int_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -112,6 +253,7 @@ class FacetEntity(dict):
                 # self[key] = {"@type": "xsd:nonNegativeInteger", "@value": str(var)}
             else:
                 self.__handle_var_type_errors(key, var, "non-negative integer")
+        self._changed()
 
     def _node_reference_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -129,6 +271,7 @@ class FacetEntity(dict):
                 # self[key] = {"@id": var.get_id()}
             else:
                 self.__handle_var_type_errors(key, var, "ObjectEntity (no @id key)")
+        self._changed()
 
     def _str_list_vars(self, **kwargs):
         for key, var in kwargs.items():
@@ -142,6 +285,7 @@ class FacetEntity(dict):
                 self[key] = [var]
             else:
                 self.__handle_var_type_errors(key, var, "str")
+        self._changed()
 
     @staticmethod
     def __handle_list_type_errors(var_name, var_val, expected_type):
@@ -200,18 +344,16 @@ class ObjectEntity(FacetEntity):
             pass
         else:
             if len(args) and self["olo:slot"] is None:
-                self["olo:slot"] = list()
-
-            current_index = len(self["olo:slot"])
+                self["olo:slot"] = OrderedSlots()
+            elif not isinstance(self["olo:slot"], OrderedSlots):  # Loaded from a file
+                self["olo:slot"] = OrderedSlots.from_slots(self["olo:slot"])
+            slots = self["olo:slot"]
 
             for item in args:
                 if isinstance(item, FacetEntity):
-                    new_entry = dict()
-                    current_index += 1
-                    new_entry["olo:index"] = str(current_index)
-                    new_entry["olo:item"] = {"@id": item.get_id()}
-                    self["olo:slot"].append(new_entry)
+                    slots.append(item.get_id())
                 else:
                     print(f"{item}: NOT A CASE OBJECT")
 
-            self["olo:length"] = str(current_index)
+            self["olo:length"] = str(len(slots))
+            self._changed()
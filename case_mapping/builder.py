@@ -0,0 +1,116 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from .base import json_default
+from .directory import load_entity
+
+# The default number of work units in flight per worker
+PENDING_PER_WORKER = 4
+
+
+def chunked(items, size):
+    """
+    Partition an iterable (e.g. a list of files) into work units (lists) of at most size items.
+    """
+    iterator = iter(items)
+    while True:
+        unit = list(islice(iterator, size))
+        if not unit:
+            return
+        yield unit
+
+
+def row_ranges(total, size):
+    """
+    Partition the rows (or database pages) 0..total into (start, stop) work units of at most size rows.
+    """
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def bounded_map(executor, function, items, max_pending):
+    """
+    Like executor.map(function, items), but with at most max_pending items submitted and not yet consumed: the
+    input is only read, and results only accumulate, as fast as the results are consumed.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _map_unit(mapper, unit):
+    """
+    Run a mapping function in a worker and return its objects as a single string of JSON lines, which is far
+    cheaper to send back to the parent process than pickled entity trees.
+    """
+    objects = mapper(unit)
+    if isinstance(objects, dict):
+        objects = [objects]
+    return "\n".join(
+        json.dumps(obj, separators=(",", ":"), default=json_default) for obj in objects
+    )
+
+
+class ParallelBundleBuilder:
+    def __init__(self, mapper, max_workers=None, max_pending=None, mp_context=None):
+        """
+        Builds CASE objects on a pool of processes, so that CPU-bound mapping code can use all cores.
+        Work units are mapped by mapper in the workers and their results are merged in the order of the units,
+        either into a Bundle or, without ever being decoded, into a BundleWriter.
+        :param mapper: A picklable (module-level) function taking a work unit and returning an ObjectEntity or an
+                       iterable of ObjectEntities
+        :param max_workers: The number of worker processes (defaults to the number of CPUs)
+        :param max_pending: The maximum number of work units in flight; the input is only consumed as results are
+                            merged, which bounds memory use (defaults to PENDING_PER_WORKER units per worker)
+        :param mp_context: A multiprocessing context for the pool
+        """
+        self.mapper = mapper
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or PENDING_PER_WORKER * self.max_workers
+        self.mp_context = mp_context
+
+    def iter_encoded(self, units):
+        """
+        Map the work units and yield the resulting objects as compact JSON text, in order.
+        :param units: An iterable of picklable work units (see chunked() and row_ranges())
+        """
+        executor = ProcessPoolExecutor(self.max_workers, mp_context=self.mp_context)
+        try:
+            for text in bounded_map(
+                executor, partial(_map_unit, self.mapper), units, self.max_pending
+            ):
+                yield from self._split(text)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _split(text):
+        return text.split("\n") if text else []
+
+    def write(self, units, writer):
+        """
+        Map the work units and stream the resulting objects into a BundleWriter.
+        :return: The number of objects written
+        """
+        count = 0
+        for text in self.iter_encoded(units):
+            writer.write_raw(text)
+            count += 1
+        return count
+
+    def build(self, units, bundle):
+        """
+        Map the work units and append the resulting objects to a Bundle.
+        :return: The bundle
+        """
+        for text in self.iter_encoded(units):
+            bundle.append_to_uco_object(load_entity(json.loads(text)))
+        return bundle
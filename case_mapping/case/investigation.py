@@ -38,6 +38,7 @@ class InvestigativeAction(ObjectEntity):
             "@type": "xsd:dateTime",
             "@value": time.isoformat(),
         }
+        self._changed()
         return time
 
 
@@ -0,0 +1,81 @@
+import threading
+
+from .base import unpack_args_array
+
+
+class ConcurrentAppender:
+    def __init__(self, bundle):
+        """
+        Collects objects and facets appended from many threads into per-thread buffers, without any lock on the
+        append path, and merges them into the bundle on flush() (or when the bundle is serialized).
+        Merged items are ordered by the order key given when appending (e.g. the index of the work item that
+        produced them), which makes the result independent of thread scheduling. Items appended without an order key
+        follow the keyed ones, grouped by thread.
+        :param bundle: The Bundle to merge into
+        """
+        self.bundle = bundle
+        self._local = threading.local()
+        self._lock = threading.Lock()  # Only taken when a thread registers its buffer
+        self._buffers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def _buffer(self):
+        try:
+            return self._local.buffer
+        except AttributeError:
+            buffer = self._local.buffer = []
+            with self._lock:
+                self._buffers.append(buffer)
+            return buffer
+
+    @unpack_args_array
+    def append_to_uco_object(self, *args, order=None):
+        """
+        Buffer a single/tuple of objects to be added to the bundle.
+        :param args: CASE objects
+        :param order: The order key of these objects in the merged bundle (any mutually comparable values)
+        """
+        buffer = self._buffer()
+        for item in args:
+            buffer.append((order, None, item))
+
+    def append_facets(self, obj, *args, order=None):
+        """
+        Buffer a single/tuple of facets to be appended to obj.
+        :param obj: An ObjectEntity
+        :param args: Facets
+        :param order: The order key of these facets among the facets buffered for the same object
+        """
+        buffer = self._buffer()
+        for item in args:
+            buffer.append((order, obj, item))
+
+    def flush(self):
+        """
+        Merge everything buffered so far into the bundle, in order.
+        :return: The number of items merged
+        """
+        with self._lock:
+            buffers = list(self._buffers)
+        entries = []
+        for thread_index, buffer in enumerate(buffers):
+            # Entries appended meanwhile stay in the buffer for the next flush
+            items = buffer[:]
+            del buffer[: len(items)]
+            for sequence, (order, obj, item) in enumerate(items):
+                key = (order is None, 0 if order is None else order)
+                entries.append((key, thread_index, sequence, obj, item))
+        entries.sort(key=lambda entry: entry[:3])
+
+        objects = [item for _, _, _, obj, item in entries if obj is None]
+        if objects:
+            self.bundle.append_to_uco_object(objects)
+        for _, _, _, obj, item in entries:
+            if obj is not None:
+                obj.append_facets(item)
+        return len(entries)
@@ -0,0 +1,99 @@
+import base64
+import hashlib
+import math
+import mmap
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional; a pure Python fallback is used without it
+    numpy = None
+
+DEFAULT_HASH_ALGORITHMS = ("MD5", "SHA1", "SHA256")
+
+CHUNK_SIZE = 1 << 20
+
+
+def _hasher(method):
+    return hashlib.new(method.lower().replace("-", ""))
+
+
+class _Histogram:
+    """
+    Byte value counts, accumulated chunk by chunk.
+    """
+
+    def __init__(self):
+        self.counts = numpy.zeros(256, dtype=numpy.int64) if numpy else Counter()
+
+    def update(self, chunk):
+        if numpy is not None:
+            self.counts += numpy.bincount(
+                numpy.frombuffer(chunk, dtype=numpy.uint8), minlength=256
+            )
+        else:
+            self.counts.update(bytes(chunk))
+
+    def entropy(self):
+        """
+        The Shannon entropy of the data, in bits per byte.
+        """
+        if numpy is not None:
+            total = int(self.counts.sum())
+            if not total:
+                return 0.0
+            p = self.counts[self.counts > 0] / total
+            return float(-(p * numpy.log2(p)).sum())
+        total = sum(self.counts.values())
+        return -sum(
+            count / total * math.log2(count / total) for count in self.counts.values()
+        )
+
+
+def digest_buffer(
+    buffer,
+    algorithms=DEFAULT_HASH_ALGORITHMS,
+    entropy=True,
+    magic_length=4,
+    chunk_size=CHUNK_SIZE,
+):
+    """
+    Compute the hashes, size, magic number and entropy of a buffer in a single pass over its content.
+    :param buffer: Any object supporting the buffer protocol (bytes, mmap, memoryview, ...)
+    :param algorithms: The hash methods to compute (hashlib names such as "MD5", "SHA1", "SHA256")
+    :param entropy: Whether to compute the Shannon entropy
+    :param magic_length: The number of leading bytes making up the magic number
+    :param chunk_size: The number of bytes processed at a time
+    :return: A dictionary with the keys size, magic_number (base64), entropy (None if not computed) and hashes
+             (method: hex digest)
+    """
+    view = memoryview(buffer).cast("B")
+    hashers = {method: _hasher(method) for method in algorithms}
+    histogram = _Histogram() if entropy else None
+    for start in range(0, len(view), chunk_size):
+        chunk = view[start : start + chunk_size]
+        for hasher in hashers.values():
+            hasher.update(chunk)
+        if histogram is not None:
+            histogram.update(chunk)
+    return {
+        "size": len(view),
+        "magic_number": base64.b64encode(view[:magic_length]).decode("ascii")
+        if len(view)
+        else None,
+        "entropy": histogram.entropy() if histogram is not None else None,
+        "hashes": {method: hasher.hexdigest() for method, hasher in hashers.items()},
+    }
+
+
+def digest_file(path, **kwargs):
+    """
+    digest_buffer() over a memory-mapped file, so that the file is read once and never copied into memory.
+    """
+    with open(path, "rb") as fp:
+        try:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return digest_buffer(b"", **kwargs)
+        with buffer:
+            return digest_buffer(buffer, **kwargs)
@@ -0,0 +1,264 @@
+import json
+import os
+import sqlite3
+import tempfile
+from hashlib import blake2b
+
+from .base import GeneratedList, json_default
+from .references import is_reference
+from .stream import OBJECT_KEYS, BundleWriter, iter_case_file
+
+# Per-@type key fields. An object is a deduplication candidate when its own type, or the type of one of its facets,
+# is listed here; objects whose configured key fields are equal (and whose remaining facets are identical) are
+# considered the same observable.
+DEFAULT_KEY_FIELDS = {
+    "uco-identity:Organization": ("uco-core:name",),
+    "uco-observable:HostName": ("uco-observable:value",),
+    "uco-observable:DomainNameFacet": ("uco-observable:value",),
+    "uco-observable:IPv4AddressFacet": ("uco-observable:addressValue",),
+    "uco-observable:EmailAddressFacet": ("uco-observable:addressValue",),
+    "uco-observable:EmailAccountFacet": ("uco-observable:emailAddress",),
+    "uco-observable:PhoneAccountFacet": ("uco-observable:phoneNumber",),
+    "uco-observable:WifiAddressFacet": ("uco-observable:addressValue",),
+    "uco-observable:BluetoothAddressFacet": ("uco-observable:addressValue",),
+    "uco-observable:URLFacet": ("uco-observable:fullValue",),
+    "uco-observable:ContentDataFacet": ("uco-observable:hash",),
+}
+
+
+def _canonical(value, resolve):
+    """
+    Strip the (random) @id of inline nodes, resolve references through the survivor map and order multi-valued
+    properties, so that semantically identical values compare equal.
+    """
+    if isinstance(value, dict):
+        if is_reference(value):
+            return {"@id": resolve(value["@id"])}
+        return {k: _canonical(v, resolve) for k, v in value.items() if k != "@id"}
+    if isinstance(value, list):
+        items = [_canonical(v, resolve) for v in value]
+        return sorted(
+            items,
+            key=lambda item: json.dumps(item, sort_keys=True, default=json_default),
+        )
+    return value
+
+
+def _rewrite(value, resolve):
+    """
+    Point every reference at its survivor, replacing embedded duplicates with a reference to their survivor.
+    Containers are updated in place; the (possibly replaced) value is returned.
+    """
+    if isinstance(value, GeneratedList):
+        value.rewrite_references(resolve)
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            value[i] = _rewrite(item, resolve)
+    elif isinstance(value, dict):
+        if "@id" in value:
+            target = resolve(value["@id"])
+            if target != value["@id"]:
+                if is_reference(value):
+                    value["@id"] = target
+                    return value
+                return {"@id": target, "@type": value.get("@type")}
+        for key, item in value.items():
+            if key != "@id":
+                value[key] = _rewrite(item, resolve)
+    return value
+
+
+class _MemoryStore:
+    def __init__(self):
+        self.survivors = dict()
+        self.remap = dict()
+
+    def begin_pass(self):
+        self.survivors.clear()
+
+    def claim(self, digest, _id):
+        return self.survivors.setdefault(digest, _id)
+
+    def get(self, _id):
+        return self.remap.get(_id)
+
+    def set(self, _id, survivor):
+        self.remap[_id] = survivor
+
+    def close(self):
+        pass
+
+
+class _SqliteStore:
+    """
+    The key tables kept in an on-disk SQLite database, so that the number of distinct keys is bounded by disk
+    rather than by memory.
+    """
+
+    def __init__(self, work_dir=None):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite", dir=work_dir)
+        os.close(fd)
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE remap (id TEXT PRIMARY KEY, survivor TEXT)")
+
+    def begin_pass(self):
+        self.db.execute("DROP TABLE IF EXISTS survivors")
+        self.db.execute("CREATE TABLE survivors (digest BLOB PRIMARY KEY, id TEXT)")
+
+    def claim(self, digest, _id):
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO survivors VALUES (?, ?)", (digest, _id)
+        )
+        if cursor.rowcount:
+            return _id
+        return self.db.execute(
+            "SELECT id FROM survivors WHERE digest = ?", (digest,)
+        ).fetchone()[0]
+
+    def get(self, _id):
+        row = self.db.execute(
+            "SELECT survivor FROM remap WHERE id = ?", (_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, _id, survivor):
+        self.db.execute("INSERT OR REPLACE INTO remap VALUES (?, ?)", (_id, survivor))
+
+    def close(self):
+        self.db.close()
+        os.remove(self.path)
+
+
+class Deduplicator:
+    def __init__(self, key_fields=None, max_passes=8, work_dir=None):
+        """
+        Merges semantically identical objects (the same email address, phone number, organization, hash, ...) into
+        a single survivor and points every reference at it. The first occurrence of each group survives.
+        Objects referencing merged objects may become identical in turn, so grouping is repeated until a pass finds
+        no new duplicates.
+        :param key_fields: A dictionary of @type to the tuple of key fields identifying objects/facets of that type
+                           (defaults to DEFAULT_KEY_FIELDS)
+        :param max_passes: The maximum number of grouping passes
+        :param work_dir: Directory for the temporary key database used when deduplicating case files
+        """
+        self.key_fields = DEFAULT_KEY_FIELDS if key_fields is None else key_fields
+        self.max_passes = max_passes
+        self.work_dir = work_dir
+
+    def _key_part(self, node, skip):
+        fields = self.key_fields.get(node.get("@type"))
+        if fields is None:
+            return False, {k: v for k, v in node.items() if k not in skip}
+        values = {field: node[field] for field in fields if node.get(field) is not None}
+        if not values:
+            return None, None
+        return True, values
+
+    def digest(self, obj, resolve=lambda _id: _id):
+        """
+        Return the grouping key of an object, or None if it is not a deduplication candidate.
+        """
+        keyed, part = self._key_part(obj, ("@id", "uco-core:hasFacet"))
+        if keyed is None:
+            return None
+        parts = [obj.get("@type"), part]
+        facets = obj.get("uco-core:hasFacet") or []
+        for facet in facets if isinstance(facets, list) else [facets]:
+            facet_keyed, facet_part = self._key_part(facet, ("@id",))
+            if facet_keyed is None:
+                return None
+            keyed = keyed or facet_keyed
+            parts.append([facet.get("@type"), facet_part])
+        if not keyed:
+            return None
+        text = json.dumps(
+            _canonical(parts, resolve), sort_keys=True, default=json_default
+        )
+        return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _resolver(self, store):
+        def resolve(_id):
+            survivor = store.get(_id)
+            while survivor is not None:
+                _id, survivor = survivor, store.get(survivor)
+            return _id
+
+        return resolve
+
+    def _group(self, iter_objects, store):
+        """
+        Run grouping passes over the objects produced by iter_objects() and return the number of duplicates found.
+        """
+        resolve = self._resolver(store)
+        found = 0
+        for _ in range(self.max_passes):
+            store.begin_pass()
+            new = 0
+            for obj in iter_objects():
+                _id = obj.get("@id")
+                if _id is None or store.get(_id) is not None:
+                    continue
+                digest = self.digest(obj, resolve)
+                if digest is None:
+                    continue
+                survivor = store.claim(digest, _id)
+                if survivor != _id:
+                    store.set(_id, survivor)
+                    new += 1
+            found += new
+            if not new:
+                break
+        return found
+
+    def deduplicate_bundle(self, bundle):
+        """
+        Deduplicate the objects of a Bundle in place.
+        :return: The number of objects removed
+        """
+        store = _MemoryStore()
+
+        def iter_objects():
+            for key in OBJECT_KEYS:
+                yield from bundle.get(key) or []
+
+        removed = self._group(iter_objects, store)
+        resolve = self._resolver(store)
+        for key in OBJECT_KEYS:
+            if bundle.get(key):
+                survivors = [
+                    obj for obj in bundle[key] if store.get(obj["@id"]) is None
+                ]
+                bundle[key] = [_rewrite(obj, resolve) for obj in survivors]
+        return removed
+
+    def deduplicate_case_file(self, source, destination, indent=None):
+        """
+        Deduplicate a CASE file into a new file. The file is streamed (once per grouping pass plus a final
+        rewriting pass) and the key tables are kept on disk, so that files larger than memory can be processed.
+        :param source: Path of the CASE file to read
+        :param destination: Path of the CASE file to write
+        :param indent: Pretty-print the output with this indentation level
+        :return: The number of objects removed
+        """
+        store = _SqliteStore(self.work_dir)
+        header = dict()
+
+        def iter_objects():
+            for event, key, value in iter_case_file(source):
+                if event == "object":
+                    yield value
+                else:
+                    header[key] = value
+
+        try:
+            removed = self._group(iter_objects, store)
+            resolve = self._resolver(store)
+            with BundleWriter(destination, header, indent=indent) as writer:
+                for event, key, value in iter_case_file(source):
+                    if event == "object" and store.get(value.get("@id")) is None:
+                        writer.write(_rewrite(value, resolve), key=key)
+        finally:
+            store.close()
+        return removed
@@ -6,3 +6,21 @@ submodules = [v for k, v in globals().items() if k[:2] != "__"]
 directory = dict()
 for submodule in submodules:
     directory |= submodule.directory
+
+
+def load_entity(value):
+    """
+    Recursively turn a parsed JSON value (e.g. an object read from a case file) back into instances of the classes
+    in the directory. References ({"@id": ..., "@type": ...}) and values of unknown types are left as plain dicts.
+    """
+    if isinstance(value, list):
+        return [load_entity(item) for item in value]
+    if isinstance(value, dict):
+        loaded = {key: load_entity(item) for key, item in value.items()}
+        cls = directory.get(value.get("@type"))
+        if cls is None or not loaded.keys() - {"@id", "@type"}:
+            return loaded
+        entity = cls.__new__(cls)
+        entity.update(loaded)
+        return entity
+    return value
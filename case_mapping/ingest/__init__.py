@@ -0,0 +1,13 @@
+from . import (
+    browser,
+    common,
+    disk,
+    exif,
+    ext4,
+    filesystem,
+    gps,
+    mail,
+    mobile,
+    network,
+    x509,
+)
@@ -0,0 +1,195 @@
+import json
+from urllib.parse import urlsplit
+
+from ..base import LazyValue
+from ..stream import BundleWriter
+from ..uco.observable import (
+    FacetUrl,
+    FacetUrlHistory,
+    ObservableObject,
+    UrlHistoryEntry,
+)
+from .common import Interner, connect_read_only, sink_function, utc_datetime_us
+
+# Microseconds between 1601-01-01 (the WebKit/Chromium epoch) and 1970-01-01
+WEBKIT_EPOCH_OFFSET = 11644473600000000
+
+# One row per URL: url, title, visit count, typed count, first and last visit (microseconds since the POSIX epoch,
+# NULL when unknown). Timestamps are converted to the POSIX epoch by SQLite, for a whole batch at a time.
+QUERIES = {
+    "chromium": f"""
+        SELECT u.url, u.title, u.visit_count, u.typed_count,
+               (SELECT MIN(v.visit_time) FROM visits v WHERE v.url = u.id AND v.visit_time > 0)
+                   - {WEBKIT_EPOCH_OFFSET},
+               NULLIF(u.last_visit_time, 0) - {WEBKIT_EPOCH_OFFSET}
+        FROM urls u ORDER BY u.id
+    """,
+    "firefox": """
+        SELECT p.url, p.title, p.visit_count, p.typed,
+               (SELECT MIN(v.visit_date) FROM moz_historyvisits v WHERE v.place_id = p.id AND v.visit_date > 0),
+               NULLIF(p.last_visit_date, 0)
+        FROM moz_places p ORDER BY p.id
+    """,
+}
+
+# A table identifying each database schema
+SCHEMA_TABLES = {"chromium": "urls", "firefox": "moz_places"}
+
+
+def url_observable(url):
+    """
+    A URL observable with a URLFacet holding the full URL and its components.
+    """
+    parts = urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    return ObservableObject(
+        facets=FacetUrl(
+            url_address=url,
+            url_scheme=parts.scheme or None,
+            url_host=parts.hostname or None,
+            url_port=port,
+            url_path=parts.path or None,
+            url_query=parts.query or None,
+            url_fragment=parts.fragment or None,
+        )
+    )
+
+
+class _HistoryEntries(LazyValue):
+    """
+    The entries of a URLHistoryFacet written to a BundleWriter: the database is read again while the facet is
+    written, so that the entries are never all held in memory. Like the other LazyValues, it is materialized by
+    str() and by json.dumps(..., default=base.json_default), while plain json.dumps() raises TypeError.
+    """
+
+    streamed = True
+
+    def __init__(self, ingester):
+        self.ingester = ingester
+
+    def to_json(self):
+        return [entry for batch in self.ingester.iter_entries() for entry in batch]
+
+    def iter_json(self):
+        separator = "["
+        for batch in self.ingester.iter_entries():
+            for entry in batch:
+                yield separator + json.dumps(entry)
+                separator = ","
+        yield "]" if separator == "," else "[]"
+
+
+class BrowserHistoryIngester:
+    def __init__(
+        self,
+        path,
+        browser=None,
+        batch_size=10000,
+        user_profile=None,
+        immutable=False,
+        urls=None,
+    ):
+        """
+        Maps a Chromium (History) or Firefox (places.sqlite) history database into URL observables, one per
+        distinct URL, and a URLHistoryFacet with one URLHistoryEntry per URL. Rows are read in batches of batch_size
+        through a read-only connection, so histories of millions of rows are processed in bounded memory.
+        :param path: The history database
+        :param browser: "chromium" or "firefox" (detected from the schema when None)
+        :param batch_size: The number of rows fetched at a time
+        :param user_profile: The user profile recorded in the entries
+        :param immutable: Open the database as immutable (see connect_read_only())
+        :param urls: An Interner of URL observables, to share URLs between several databases
+        """
+        self.path = path
+        self.browser = browser
+        self.batch_size = batch_size
+        self.user_profile = user_profile
+        self.immutable = immutable
+        self.urls = urls if urls is not None else Interner(url_observable)
+
+    def _detect(self, connection):
+        tables = {
+            name
+            for (name,) in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        for browser, table in SCHEMA_TABLES.items():
+            if table in tables:
+                return browser
+        raise ValueError(f"{self.path} is not a known browser history database")
+
+    def iter_batches(self):
+        """
+        Yield the rows of the database, a list of (url, title, visit count, typed count, first visit, last visit)
+        tuples at a time, with timestamps in microseconds since the POSIX epoch.
+        """
+        connection = connect_read_only(self.path, self.immutable)
+        try:
+            if self.browser is None:
+                self.browser = self._detect(connection)
+            cursor = connection.execute(QUERIES[self.browser])
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            connection.close()
+
+    def _entry(self, row, url):
+        _, title, visit_count, typed_count, first_visit, last_visit = row
+        entry = UrlHistoryEntry(
+            first_visit=utc_datetime_us(first_visit),
+            last_visit=utc_datetime_us(last_visit),
+            manually_entered_count=typed_count,
+            page_title=title or None,
+            visit_count=visit_count,
+            user_profile=self.user_profile,
+        )
+        entry["uco-observable:url"] = url
+        return entry
+
+    def iter_entries(self, created=None):
+        """
+        Yield the URLHistoryEntries of the database, a batch at a time. URL observables created on the way are
+        appended to created.
+        """
+        created = [] if created is None else created
+        for rows in self.iter_batches():
+            yield [self._entry(row, self.urls.get(row[0], created)) for row in rows]
+
+    def ingest(self, sink, history=None, browser_info=None):
+        """
+        Stream the URL observables into a Bundle, BundleWriter or ConcurrentAppender, followed by a history
+        observable with a URLHistoryFacet holding the entries.
+        With a BundleWriter, the entries are only read (again) while the history observable is being written: its
+        URLHistoryFacet then holds them as a LazyValue (see _HistoryEntries) instead of a list.
+        :param history: A URLHistoryFacet to append the entries to, instead of creating a history observable
+        :param browser_info: The observable of the browser, for a created URLHistoryFacet
+        :return: The number of entries
+        """
+        append = sink_function(sink)
+        streamed = history is None and isinstance(sink, BundleWriter)
+        facet = history if history is not None else FacetUrlHistory(browser_info)
+        count = 0
+        created = []
+        batches = self.iter_batches() if streamed else self.iter_entries(created)
+        for batch in batches:
+            if streamed:  # Only the URLs are needed before the entries are written
+                for row in batch:
+                    self.urls.get(row[0], created)
+            else:
+                facet.append_history_entries(batch)
+            for obj in created:
+                append(obj)
+            created.clear()
+            count += len(batch)
+        if history is None:
+            if streamed and count:
+                facet["uco-observable:urlHistoryEntry"] = _HistoryEntries(self)
+            append(ObservableObject(facets=facet))
+        return count
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from urllib.request import pathname2url
+
+from ..stream import BundleWriter
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def sink_function(sink):
+    """
+    Return a function appending objects to sink, which may be a Bundle, a BundleWriter or a ConcurrentAppender,
+    or any callable taking objects as arguments.
+    """
+    if isinstance(sink, BundleWriter):
+        return sink.write
+    if hasattr(sink, "append_to_uco_object"):
+        return sink.append_to_uco_object
+    return sink
+
+
+def utc_datetime(timestamp):
+    """
+    A timezone-aware datetime from a POSIX timestamp (None stays None).
+    """
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def utc_datetime_us(microseconds):
+    """
+    A timezone-aware datetime from a number of microseconds since the POSIX epoch (None stays None).
+    """
+    if microseconds is None:
+        return None
+    return _EPOCH + timedelta(microseconds=microseconds)
+
+
+class Interner:
+    def __init__(self, factory):
+        """
+        One observable per distinct key (e.g. a URL or a normalized phone number). Only a reference to each
+        observable is kept, so that observables can be streamed out as soon as they are created and the memory used
+        only grows with the number of distinct keys.
+        :param factory: A function creating the ObjectEntity of a key, or a list of ObjectEntities of which the
+                        first is the one referenced (e.g. an email address and its account)
+        """
+        self.factory = factory
+        self.references = dict()
+
+    def __len__(self):
+        return len(self.references)
+
+    def get(self, key, created, *args):
+        """
+        Return a reference ({"@id", "@type"}) to the observable of key, creating it with factory(key, *args) (and
+        appending the new objects to created) on first use.
+        """
+        reference = self.references.get(key)
+        if reference is None:
+            objects = self.factory(key, *args)
+            if not isinstance(objects, (list, tuple)):
+                objects = [objects]
+            created.extend(objects)
+            reference = self.references[key] = {
+                "@id": objects[0].get_id(),
+                "@type": objects[0].get("@type"),
+            }
+        return reference
+
+
+def connect_read_only(path, immutable=False):
+    """
+    Open an SQLite database read-only, through a URI, so that evidence files are never modified.
+    :param immutable: Also skip locking and journal (-wal) files, for databases copied from a device
+    """
+    uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return sqlite3.connect(uri, uri=True)
@@ -0,0 +1,349 @@
+import mmap
+import os
+import struct
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ..uco.observable import FacetDisk, FacetDiskPartition, FacetFile, ObservableObject
+from .common import sink_function
+
+SECTOR_SIZE = 512
+
+# MBR partition type names
+MBR_TYPES = {
+    0x01: "FAT12",
+    0x04: "FAT16",
+    0x05: "Extended",
+    0x06: "FAT16",
+    0x07: "NTFS/exFAT",
+    0x0B: "FAT32",
+    0x0C: "FAT32 (LBA)",
+    0x0E: "FAT16 (LBA)",
+    0x0F: "Extended (LBA)",
+    0x82: "Linux swap",
+    0x83: "Linux",
+    0x85: "Linux extended",
+    0x8E: "Linux LVM",
+    0xA5: "FreeBSD",
+    0xA8: "Apple UFS",
+    0xAF: "Apple HFS/HFS+",
+    0xEE: "GPT protective",
+    0xEF: "EFI System",
+    0xFD: "Linux RAID",
+}
+
+EXTENDED_TYPES = {0x05, 0x0F, 0x85}
+
+# GPT partition type names, by type GUID
+GPT_TYPES = {
+    "c12a7328-f81f-11d2-ba4b-00a0c93ec93b": "EFI System",
+    "21686148-6449-6e6f-744e-656564454649": "BIOS boot",
+    "e3c9e316-0b5c-4db8-817d-f92df00215ae": "Microsoft reserved",
+    "ebd0a0a2-b9e5-4433-87c0-68b6b72699c7": "Microsoft basic data",
+    "de94bba4-06d1-4d40-a16a-bfd50179d6ac": "Windows recovery",
+    "0fc63daf-8483-4772-8e79-3d69d8477de4": "Linux filesystem",
+    "0657fd6d-a4ab-43c4-84e5-0933c84b4f4f": "Linux swap",
+    "e6d6d379-f507-44c2-a23c-238f2a3df928": "Linux LVM",
+    "a19d880f-05fc-4d3b-a006-743f0f84911e": "Linux RAID",
+    "48465300-0000-11aa-aa11-00306543ecac": "Apple HFS+",
+    "7c3457ef-0000-11aa-aa11-00306543ecac": "Apple APFS",
+}
+
+_MBR_ENTRY = struct.Struct("<B3sB3sII")
+_GPT_HEADER = struct.Struct("<8sIIIIQQQQ16sQIII")
+_GPT_ENTRY = struct.Struct("<16s16sQQQ72s")
+
+# The maximum number of logical partitions followed in an extended partition
+MAX_LOGICAL_PARTITIONS = 128
+
+# The OEM names of the volume boot records identified by their name alone
+_VBR_OEM_NAMES = {b"NTFS    ": "NTFS", b"EXFAT   ": "exFAT"}
+# The valid bytes per sector and sectors per cluster of a FAT BIOS parameter block
+_SECTOR_SIZES = {512, 1024, 2048, 4096}
+_CLUSTERS = {1, 2, 4, 8, 16, 32, 64, 128}
+
+
+def _volume_boot_record(buffer):
+    """
+    The file system of a volume boot record (the first sector of a partitionless volume, which also ends in 55AA):
+    a jump instruction followed by an NTFS/exFAT OEM name or a FAT BIOS parameter block; None for anything else.
+    """
+    if not ((buffer[0] == 0xEB and buffer[2] == 0x90) or buffer[0] == 0xE9):
+        return None
+    name = _VBR_OEM_NAMES.get(bytes(buffer[3:11]))
+    if name is not None:
+        return name
+    bytes_per_sector, sectors_per_cluster = struct.unpack_from("<HB", buffer, 11)
+    if bytes_per_sector not in _SECTOR_SIZES or sectors_per_cluster not in _CLUSTERS:
+        return None
+    # The file system type of a FAT12/16 and a FAT32 BIOS parameter block
+    for offset in (54, 82):
+        if buffer[offset : offset + 3] == b"FAT":
+            return buffer[offset : offset + 8].decode("ascii", "replace").strip()
+    return None
+
+
+def _mbr_entries(buffer, offset):
+    """
+    The non-empty entries of the partition table of the MBR/EBR at offset: (index, type, bootable, first LBA,
+    number of sectors). Entries with a status other than 0x00 or 0x80 mean the sector is not a partition table.
+    """
+    if buffer[offset + 510 : offset + 512] != b"\x55\xaa":
+        raise ValueError(f"No partition table signature at offset {offset}")
+    entries = []
+    for index in range(4):
+        status, _, kind, _, first, count = _MBR_ENTRY.unpack_from(
+            buffer, offset + 446 + 16 * index
+        )
+        if status not in (0x00, 0x80):
+            raise ValueError(
+                f"Invalid partition entry status 0x{status:02X} at offset {offset}"
+            )
+        if kind and count:
+            entries.append((index, kind, status == 0x80, first, count))
+    return entries
+
+
+def _mbr_partition(number, kind, bootable, first, count, sector_size):
+    return {
+        "number": number,
+        "type": MBR_TYPES.get(kind, f"0x{kind:02X}"),
+        "type_id": kind,
+        "bootable": bootable,
+        "offset": first * sector_size,
+        "size": count * sector_size,
+        "guid": None,
+        "name": None,
+    }
+
+
+def _read_mbr(buffer, sector_size):
+    file_system = _volume_boot_record(buffer)
+    if file_system is not None:
+        raise ValueError(f"No partition table: {file_system} volume boot record")
+    partitions = []
+    logical = 5
+    sectors = len(buffer) // sector_size
+    for index, kind, bootable, first, count in _mbr_entries(buffer, 0):
+        if first == 0 or first + count > sectors:
+            raise ValueError(
+                f"Partition {index + 1} (LBA {first}, {count} sectors) outside the image"
+            )
+        partitions.append(
+            _mbr_partition(index + 1, kind, bootable, first, count, sector_size)
+        )
+        if kind not in EXTENDED_TYPES:
+            continue
+        # Follow the chain of extended boot records: the first entry of each is a logical partition (relative to
+        # the EBR), the second one the next EBR (relative to the extended partition)
+        ebr = first
+        visited = set()
+        while ebr not in visited and len(visited) < MAX_LOGICAL_PARTITIONS:
+            visited.add(ebr)
+            if (ebr + 1) * sector_size > len(buffer):
+                raise ValueError(f"Extended boot record at LBA {ebr} beyond the image")
+            entries = _mbr_entries(buffer, ebr * sector_size)
+            next_ebr = None
+            for _, entry_kind, entry_bootable, entry_first, entry_count in entries:
+                if entry_kind in EXTENDED_TYPES:
+                    next_ebr = first + entry_first
+                else:
+                    partitions.append(
+                        _mbr_partition(
+                            logical,
+                            entry_kind,
+                            entry_bootable,
+                            ebr + entry_first,
+                            entry_count,
+                            sector_size,
+                        )
+                    )
+                    logical += 1
+            if next_ebr is None:
+                break
+            ebr = next_ebr
+    return partitions
+
+
+def _read_gpt(buffer, sector_size):
+    header = _GPT_HEADER.unpack_from(buffer, sector_size)
+    header_size = header[2]
+    raw_header = bytearray(buffer[sector_size : sector_size + header_size])
+    raw_header[16:20] = b"\0\0\0\0"
+    if zlib.crc32(raw_header) != header[3]:
+        raise ValueError("Corrupt GPT header")
+    entries_lba, entry_count, entry_size, entries_crc = header[10:14]
+    start = entries_lba * sector_size
+    table = buffer[start : start + entry_count * entry_size]
+    if zlib.crc32(table) != entries_crc:
+        raise ValueError("Corrupt GPT partition entries")
+    partitions = []
+    for index in range(entry_count):
+        type_guid, unique_guid, first, last, _, name = _GPT_ENTRY.unpack_from(
+            table, index * entry_size
+        )
+        if type_guid == bytes(16):
+            continue
+        type_guid = str(uuid.UUID(bytes_le=type_guid))
+        partitions.append(
+            {
+                "number": index + 1,
+                "type": GPT_TYPES.get(type_guid, type_guid),
+                "type_id": type_guid,
+                "bootable": None,
+                "offset": first * sector_size,
+                "size": (last - first + 1) * sector_size,
+                "guid": str(uuid.UUID(bytes_le=unique_guid)),
+                "name": name.decode("utf-16-le").rstrip("\0") or None,
+            }
+        )
+    return str(uuid.UUID(bytes_le=header[9])), partitions
+
+
+def read_partition_table(path, sector_size=None):
+    """
+    Read the partition table of a raw disk image. The image is memory-mapped and only the MBR, the extended boot
+    records and the GPT header and entries are read, whatever the size of the image. A partitionless volume (a
+    FAT/NTFS/exFAT boot sector) or an implausible partition table raise ValueError.
+    :param sector_size: The logical sector size (detected from the GPT header location, 512 or 4096, when None)
+    :return: {"path", "size", "scheme": "mbr" or "gpt", "sector_size", "disk_guid" (GPT only), "partitions": a
+             list of {"number", "type", "type_id", "bootable", "offset", "size" (in bytes), "guid", "name"}}
+    """
+    with open(path, "rb") as fp:
+        try:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            raise ValueError(f"{path} is empty") from None
+    with buffer:
+        if len(buffer) < SECTOR_SIZE:
+            raise ValueError(f"{path} is smaller than a sector")
+        table = {
+            "path": os.fspath(path),
+            "size": len(buffer),
+            "scheme": "mbr",
+            "sector_size": sector_size or SECTOR_SIZE,
+            "disk_guid": None,
+        }
+        try:
+            for size in (sector_size,) if sector_size else (512, 4096):
+                if buffer[size : size + 8] == b"EFI PART":
+                    table["scheme"] = "gpt"
+                    table["sector_size"] = size
+                    table["disk_guid"], table["partitions"] = _read_gpt(buffer, size)
+                    return table
+            table["partitions"] = _read_mbr(buffer, table["sector_size"])
+        except (ValueError, struct.error) as error:
+            raise ValueError(f"{path}: {error}") from None
+        return table
+
+
+def _read_tables(paths, sector_size):
+    results = []
+    for path in paths:
+        try:
+            results.append((read_partition_table(path, sector_size), None))
+        except (OSError, ValueError) as error:
+            results.append((None, error))
+    return results
+
+
+def partition_objects(table):
+    """
+    The observables of a partition table: an observable with a DiskPartitionFacet per partition, followed by the
+    disk observable (with a FileFacet for the image and a DiskFacet referencing the partitions).
+    """
+    partitions = [
+        ObservableObject(
+            facets=FacetDiskPartition(
+                serial_number=partition["guid"],
+                partition_type=partition["type"],
+                total_space=partition["size"],
+                offset=partition["offset"],
+            )
+        )
+        for partition in table["partitions"]
+    ]
+    disk = ObservableObject()
+    disk.append_facets(
+        FacetFile(
+            file_name=os.path.basename(table["path"]),
+            file_path=table["path"],
+            size_bytes=table["size"],
+        ),
+        FacetDisk(size=table["size"], partition=partitions or None),
+    )
+    return partitions + [disk]
+
+
+class DiskImageIngester:
+    def __init__(self, workers=None, sector_size=None, chunk_size=16, mp_context=None):
+        """
+        Maps the partition tables (MBR, with extended partitions, or GPT) of raw disk images into disk and disk
+        partition observables, reading the images on a pool of processes.
+        :param workers: The number of worker processes (defaults to the number of CPUs)
+        :param sector_size: The logical sector size (detected when None, see read_partition_table())
+        :param chunk_size: The number of images handed to a worker at a time
+        :param mp_context: A multiprocessing context for the pool
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.sector_size = sector_size
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self.errors = []
+
+    @staticmethod
+    def images(paths):
+        """
+        Yield the images of paths, the regular files of a directory (in name order) standing for the directory.
+        """
+        for path in paths:
+            if os.path.isdir(path):
+                for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+                    if entry.is_file():
+                        yield entry.path
+            else:
+                yield path
+
+    def iter_tables(self, paths):
+        """
+        Yield the partition table of every image, in order; images without a partition table are recorded in
+        errors.
+        """
+        images = list(self.images(paths))
+        units = [
+            images[start : start + self.chunk_size]
+            for start in range(0, len(images), self.chunk_size)
+        ]
+        sector_sizes = [self.sector_size] * len(units)
+        if len(units) <= 1:
+            results = map(_read_tables, units, sector_sizes)
+        else:
+            executor = ProcessPoolExecutor(
+                min(self.workers, len(units)), mp_context=self.mp_context
+            )
+            results = executor.map(_read_tables, units, sector_sizes)
+        try:
+            for unit in results:
+                for table, error in unit:
+                    if error is not None:
+                        self.errors.append(error)
+                    else:
+                        yield table
+        finally:
+            if len(units) > 1:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def ingest(self, paths, sink):
+        """
+        Stream the partition and disk observables of disk images (or directories of images) into a Bundle,
+        BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for table in self.iter_tables(paths):
+            for obj in partition_objects(table):
+                append(obj)
+                count += 1
+        return count
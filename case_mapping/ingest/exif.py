@@ -0,0 +1,396 @@
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from ..uco.observable import FacetEXIF, FacetFile, FacetRasterPicture, ObservableObject
+from .common import sink_function
+
+# Tag names of the TIFF/EXIF IFDs (IFD0, Exif and Interoperability IFDs) and of the GPS IFD
+TAGS = {
+    0x0100: "ImageWidth",
+    0x0101: "ImageLength",
+    0x0102: "BitsPerSample",
+    0x0103: "Compression",
+    0x0106: "PhotometricInterpretation",
+    0x010E: "ImageDescription",
+    0x010F: "Make",
+    0x0110: "Model",
+    0x0112: "Orientation",
+    0x0115: "SamplesPerPixel",
+    0x011A: "XResolution",
+    0x011B: "YResolution",
+    0x0128: "ResolutionUnit",
+    0x0131: "Software",
+    0x0132: "DateTime",
+    0x013B: "Artist",
+    0x0213: "YCbCrPositioning",
+    0x8298: "Copyright",
+    0x829A: "ExposureTime",
+    0x829D: "FNumber",
+    0x8822: "ExposureProgram",
+    0x8827: "ISOSpeedRatings",
+    0x9000: "ExifVersion",
+    0x9003: "DateTimeOriginal",
+    0x9004: "DateTimeDigitized",
+    0x9010: "OffsetTime",
+    0x9011: "OffsetTimeOriginal",
+    0x9012: "OffsetTimeDigitized",
+    0x9201: "ShutterSpeedValue",
+    0x9202: "ApertureValue",
+    0x9203: "BrightnessValue",
+    0x9204: "ExposureBiasValue",
+    0x9205: "MaxApertureValue",
+    0x9207: "MeteringMode",
+    0x9208: "LightSource",
+    0x9209: "Flash",
+    0x920A: "FocalLength",
+    0x9286: "UserComment",
+    0x9290: "SubSecTime",
+    0x9291: "SubSecTimeOriginal",
+    0x9292: "SubSecTimeDigitized",
+    0xA000: "FlashpixVersion",
+    0xA001: "ColorSpace",
+    0xA002: "PixelXDimension",
+    0xA003: "PixelYDimension",
+    0xA217: "SensingMethod",
+    0xA402: "ExposureMode",
+    0xA403: "WhiteBalance",
+    0xA404: "DigitalZoomRatio",
+    0xA405: "FocalLengthIn35mmFilm",
+    0xA406: "SceneCaptureType",
+    0xA420: "ImageUniqueID",
+    0xA430: "CameraOwnerName",
+    0xA431: "BodySerialNumber",
+    0xA432: "LensSpecification",
+    0xA433: "LensMake",
+    0xA434: "LensModel",
+    0xA435: "LensSerialNumber",
+}
+
+GPS_TAGS = {
+    0x0000: "GPSVersionID",
+    0x0001: "GPSLatitudeRef",
+    0x0002: "GPSLatitude",
+    0x0003: "GPSLongitudeRef",
+    0x0004: "GPSLongitude",
+    0x0005: "GPSAltitudeRef",
+    0x0006: "GPSAltitude",
+    0x0007: "GPSTimeStamp",
+    0x0010: "GPSImgDirectionRef",
+    0x0011: "GPSImgDirection",
+    0x0012: "GPSMapDatum",
+    0x001D: "GPSDateStamp",
+}
+
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+INTEROPERABILITY_IFD = 0xA005
+
+TIFF_COMPRESSION = {
+    1: "Uncompressed",
+    5: "LZW",
+    6: "JPEG (old-style)",
+    7: "JPEG",
+    8: "Adobe Deflate",
+    32773: "PackBits",
+}
+
+JPEG_COMPRESSION = {
+    0xC0: "Baseline DCT",
+    0xC1: "Extended sequential DCT",
+    0xC2: "Progressive DCT",
+    0xC3: "Lossless",
+    0xC9: "Extended sequential DCT, arithmetic coding",
+    0xCA: "Progressive DCT, arithmetic coding",
+    0xCB: "Lossless, arithmetic coding",
+}
+
+# Field type: (struct format character, size in bytes)
+_TYPES = {
+    1: ("B", 1),
+    2: ("s", 1),
+    3: ("H", 2),
+    4: ("I", 4),
+    5: ("I", 8),
+    6: ("b", 1),
+    7: ("s", 1),
+    8: ("h", 2),
+    9: ("i", 4),
+    10: ("i", 8),
+    11: ("f", 4),
+    12: ("d", 8),
+}
+
+# Undefined (binary) values longer than this, such as maker notes, are not recorded
+_MAX_UNDEFINED = 64
+
+
+def _format_number(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+
+class _TiffReader:
+    """
+    Reads IFD entries from TIFF-structured data (a TIFF file, or the body of a JPEG APP1 Exif segment).
+    """
+
+    def __init__(self, data):
+        self.data = data
+        order = bytes(data[:2])
+        if order == b"II":
+            self.endian = "<"
+        elif order == b"MM":
+            self.endian = ">"
+        else:
+            raise ValueError("Not TIFF data")
+        if self.unpack("H", 2)[0] != 42:
+            raise ValueError("Not TIFF data")
+
+    def unpack(self, fmt, offset):
+        return struct.unpack_from(self.endian + fmt, self.data, offset)
+
+    def _value(self, field_type, count, offset):
+        fmt, size = _TYPES[field_type]
+        if count * size <= 4:
+            position = offset + 8
+        else:
+            position = self.unpack("I", offset + 8)[0]
+        if position + count * size > len(self.data):
+            return None
+        if field_type == 2:
+            raw = bytes(self.data[position : position + count])
+            return raw.split(b"\0", 1)[0].decode("utf-8", "replace").strip()
+        if field_type == 7:
+            if count > _MAX_UNDEFINED:
+                return None
+            raw = bytes(self.data[position : position + count])
+            return raw.decode("ascii") if raw.isascii() and raw.isalnum() else raw.hex()
+        if field_type in (5, 10):
+            numbers = self.unpack(f"{2 * count}{fmt}", position)
+            values = [
+                _format_number(numerator / denominator) if denominator else "inf"
+                for numerator, denominator in zip(numbers[::2], numbers[1::2])
+            ]
+        else:
+            values = [_format_number(n) for n in self.unpack(f"{count}{fmt}", position)]
+        return " ".join(values)
+
+    def read_ifd(self, offset, names, tags, pointers, visited):
+        """
+        Add the named entries of the IFD at offset to tags, following the pointers to sub-IFDs ({tag: names}).
+        """
+        if offset in visited or offset + 2 > len(self.data):
+            return
+        visited.add(offset)
+        (count,) = self.unpack("H", offset)
+        for i in range(count):
+            entry = offset + 2 + 12 * i
+            if entry + 12 > len(self.data):
+                return
+            tag, field_type, value_count = self.unpack("HHI", entry)
+            if tag in pointers:
+                sub_names = pointers[tag]
+                self.read_ifd(
+                    self.unpack("I", entry + 8)[0], sub_names, tags, pointers, visited
+                )
+            elif tag in names and field_type in _TYPES:
+                value = self._value(field_type, value_count, entry)
+                if value:
+                    tags[names[tag]] = value
+
+    def read(self):
+        """
+        Return the tags of IFD0 (the main image) and of its Exif, GPS and Interoperability IFDs.
+        """
+        tags = dict()
+        pointers = {EXIF_IFD: TAGS, GPS_IFD: GPS_TAGS, INTEROPERABILITY_IFD: TAGS}
+        self.read_ifd(self.unpack("I", 4)[0], TAGS, tags, pointers, set())
+        return tags
+
+
+def _read_jpeg(data, header):
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            break
+        marker = data[position + 1]
+        if marker == 0xFF:  # Fill byte
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # Markers without a segment
+            position += 2
+            continue
+        if marker in (0xD9, 0xDA):  # The image data starts here
+            break
+        (length,) = struct.unpack_from(">H", data, position + 2)
+        start, end = position + 4, min(position + 2 + length, len(data))
+        if marker == 0xE1 and bytes(data[start : start + 6]) == b"Exif\0\0":
+            try:
+                header["tags"].update(_TiffReader(data[start + 6 : end]).read())
+            except (ValueError, struct.error):
+                pass
+        elif marker in JPEG_COMPRESSION and end - start >= 6:
+            precision, height, width, components = struct.unpack_from(
+                ">BHHB", data, start
+            )
+            header.update(
+                height=height,
+                width=width,
+                bits_per_pixel=precision * components,
+                compression=JPEG_COMPRESSION[marker],
+            )
+        position += 2 + length
+    return header
+
+
+def _read_tiff(data, header):
+    tags = _TiffReader(data).read()
+    header["tags"] = tags
+    if tags.get("ImageWidth", "").isdigit():
+        header["width"] = int(tags["ImageWidth"])
+    if tags.get("ImageLength", "").isdigit():
+        header["height"] = int(tags["ImageLength"])
+    if "BitsPerSample" in tags:
+        header["bits_per_pixel"] = sum(
+            int(bits) for bits in tags["BitsPerSample"].split()
+        )
+    if tags.get("Compression", "").isdigit():
+        code = int(tags["Compression"])
+        header["compression"] = TIFF_COMPRESSION.get(code, str(code))
+    return header
+
+
+def read_image_header(path):
+    """
+    Parse the header of a JPEG or TIFF file. The file is memory-mapped and only its header segments and IFDs are
+    touched (hence read from disk), so the cost depends on the size of the header, not of the image.
+    :return: A dictionary with the keys picture_type ("jpg" or "tiff"), tags (EXIF tag name: value as a string),
+             width, height, bits_per_pixel and compression (None when unknown), or None if the file is neither a
+             JPEG nor a TIFF file
+    """
+    with open(path, "rb") as fp:
+        try:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return None
+    with buffer:
+        data = memoryview(buffer)
+        try:
+            header = dict(
+                tags=dict(),
+                width=None,
+                height=None,
+                bits_per_pixel=None,
+                compression=None,
+            )
+            if bytes(data[:2]) == b"\xff\xd8":
+                header["picture_type"] = "jpg"
+                return _read_jpeg(data, header)
+            if bytes(data[:4]) in (b"II*\0", b"MM\0*"):
+                header["picture_type"] = "tiff"
+                try:
+                    return _read_tiff(data, header)
+                except (ValueError, struct.error):
+                    return header
+            return None
+        finally:
+            data.release()
+
+
+def image_facets(header):
+    """
+    Return the EXIFFacet (None without tags) and RasterPictureFacet of a header returned by read_image_header().
+    """
+    exif = FacetEXIF(**header["tags"]) if header["tags"] else None
+    picture = FacetRasterPicture(
+        picture_type=header["picture_type"],
+        picture_width=header["width"],
+        picture_height=header["height"],
+        bits_per_pixel=header["bits_per_pixel"],
+        image_compression_method=header["compression"],
+    )
+    return exif, picture
+
+
+def _read_headers(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append((path, read_image_header(path), None))
+        except OSError as error:
+            results.append((path, None, error))
+    return results
+
+
+class ExifExtractor:
+    def __init__(self, workers=None, chunk_size=64, mp_context=None):
+        """
+        Extracts EXIFFacets and RasterPictureFacets from JPEG and TIFF files on a pool of processes.
+        Only plain header dictionaries are sent back from the workers; facets are built in the calling process.
+        :param workers: The number of worker processes (defaults to the number of CPUs)
+        :param chunk_size: The number of files handed to a worker at a time
+        :param mp_context: A multiprocessing context for the pool
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self.errors = []
+
+    def iter_headers(self, paths):
+        """
+        Yield (path, header) for every JPEG or TIFF file of paths, in order (see read_image_header()).
+        Files that cannot be read are recorded in errors.
+        """
+        paths = list(paths)
+        units = [
+            paths[start : start + self.chunk_size]
+            for start in range(0, len(paths), self.chunk_size)
+        ]
+        if len(units) <= 1:
+            results = map(_read_headers, units)
+        else:
+            executor = ProcessPoolExecutor(
+                min(self.workers, len(units)), mp_context=self.mp_context
+            )
+            results = executor.map(_read_headers, units)
+        try:
+            for unit in results:
+                for path, header, error in unit:
+                    if error is not None:
+                        self.errors.append(error)
+                    elif header is not None:
+                        yield path, header
+        finally:
+            if len(units) > 1:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_facets(self, paths):
+        """
+        Yield (path, EXIFFacet or None, RasterPictureFacet) for every JPEG or TIFF file of paths, in order.
+        """
+        for path, header in self.iter_headers(paths):
+            yield (path, *image_facets(header))
+
+    def ingest(self, paths, sink):
+        """
+        Stream a File observable (with FileFacet, EXIFFacet and RasterPictureFacet) per picture into a Bundle,
+        BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for path, exif, picture in self.iter_facets(paths):
+            file_object = ObservableObject()
+            file_object.append_facets(
+                FacetFile(
+                    file_name=os.path.basename(path),
+                    file_path=os.fspath(path),
+                )
+            )
+            if exif is not None:
+                file_object.append_facets(exif)
+            file_object.append_facets(picture)
+            append(file_object)
+            count += 1
+        return count
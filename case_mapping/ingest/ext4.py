@@ -0,0 +1,388 @@
+import mmap
+import struct
+
+# NumPy is optional for the package, but required to read inode tables
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ..uco.observable import FacetExtInode, FacetFile, ObservableObject
+from .common import sink_function, utc_datetime_us
+
+SUPERBLOCK_OFFSET = 1024
+EXT4_MAGIC = 0xEF53
+
+# Superblock feature flags
+INCOMPAT_64BIT = 0x80
+RO_COMPAT_GDT_CSUM = 0x10
+RO_COMPAT_METADATA_CSUM = 0x400
+
+# Group descriptor flags
+BG_INODE_UNINIT = 0x1
+
+# (name, format, offset) of the superblock fields read
+_SUPERBLOCK_FIELDS = (
+    ("inodes_count", "<I", 0),
+    ("blocks_count", "<I", 4),
+    ("first_data_block", "<I", 20),
+    ("log_block_size", "<I", 24),
+    ("blocks_per_group", "<I", 32),
+    ("inodes_per_group", "<I", 40),
+    ("magic", "<H", 56),
+    ("rev_level", "<I", 76),
+    ("inode_size", "<H", 88),
+    ("feature_ro_compat", "<I", 100),
+    ("feature_incompat", "<I", 96),
+    ("volume_name", "16s", 120),
+    ("desc_size", "<H", 254),
+)
+
+# (name, format, offset) of the inode fields read; the fields from offset 128 on are only present in large inodes,
+# and only valid when i_extra_isize covers them
+INODE_FIELDS = (
+    ("mode", "<u2", 0),
+    ("uid", "<u2", 2),
+    ("size_lo", "<u4", 4),
+    ("atime", "<i4", 8),
+    ("ctime", "<i4", 12),
+    ("mtime", "<i4", 16),
+    ("dtime", "<u4", 20),
+    ("gid", "<u2", 24),
+    ("links_count", "<u2", 26),
+    ("flags", "<u4", 32),
+    ("size_high", "<u4", 108),
+    ("uid_high", "<u2", 120),
+    ("gid_high", "<u2", 122),
+    ("extra_isize", "<u2", 128),
+    ("ctime_extra", "<u4", 132),
+    ("mtime_extra", "<u4", 136),
+    ("atime_extra", "<u4", 140),
+    ("crtime", "<i4", 144),
+    ("crtime_extra", "<u4", 148),
+)
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy is required to read ext4 inode tables")
+
+
+def inode_dtype(inode_size):
+    """
+    A NumPy structured dtype mapping the fields of INODE_FIELDS over inode records of inode_size bytes.
+    """
+    _require_numpy()
+    fields = [field for field in INODE_FIELDS if field[2] + 4 <= inode_size]
+    return numpy.dtype(
+        {
+            "names": [name for name, _, _ in fields],
+            "formats": [fmt for _, fmt, _ in fields],
+            "offsets": [offset for _, _, offset in fields],
+            "itemsize": inode_size,
+        }
+    )
+
+
+def _times(inodes, name, extra_offset=None):
+    """
+    Times in microseconds since the POSIX epoch (0 when unset), from the seconds and, when valid, the extra field
+    (2 epoch bits and nanoseconds) of every inode.
+    """
+    seconds = inodes[name].astype(numpy.int64)
+    microseconds = seconds * 1000000
+    extra_name = f"{name}_extra"
+    if extra_offset is not None and extra_name in inodes.dtype.names:
+        extra = inodes[extra_name].astype(numpy.int64)
+        valid = inodes["extra_isize"] >= extra_offset + 4 - 128
+        microseconds = numpy.where(
+            valid,
+            (seconds + ((extra & 3) << 32)) * 1000000 + (extra >> 2) // 1000,
+            microseconds,
+        )
+    return numpy.where(seconds != 0, microseconds, 0)
+
+
+class Ext4Reader:
+    def __init__(self, path, offset=0):
+        """
+        A read-only reader of the superblock, group descriptors and inode tables of an ext2/3/4 file system image.
+        The image is memory-mapped and every inode table is decoded as a whole through a structured dtype (see
+        inode_dtype()), so that scanning is dominated by sequential reads.
+        :param path: The image
+        :param offset: The offset of the file system in the image (e.g. a partition offset)
+        """
+        _require_numpy()
+        self.path = path
+        self.offset = offset
+        # The groups whose descriptor, inode bitmap or inode table is (partly) missing from a truncated image
+        self.truncated = []
+        with open(path, "rb") as fp:
+            self._buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.superblock = self._read_superblock()
+            self.groups = self._read_group_descriptors()
+        except (ValueError, struct.error):
+            self._buffer.close()
+            raise
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_superblock(self):
+        start = self.offset + SUPERBLOCK_OFFSET
+        if len(self._buffer) < start + 1024:
+            raise ValueError(
+                f"{self.path}: truncated image, no superblock at offset {self.offset}"
+            )
+        superblock = {
+            name: struct.unpack_from(fmt, self._buffer, start + field_offset)[0]
+            for name, fmt, field_offset in _SUPERBLOCK_FIELDS
+        }
+        if superblock["magic"] != EXT4_MAGIC:
+            raise ValueError(
+                f"{self.path}: no ext2/3/4 file system at offset {self.offset}"
+            )
+        superblock["block_size"] = 1024 << superblock["log_block_size"]
+        if superblock["rev_level"] == 0:
+            superblock["inode_size"] = 128
+        if not superblock["feature_incompat"] & INCOMPAT_64BIT:
+            superblock["desc_size"] = 32
+        superblock["volume_name"] = (
+            superblock["volume_name"].rstrip(b"\0").decode("utf-8", "replace")
+        )
+        return superblock
+
+    def _read_group_descriptors(self):
+        """
+        The inode bitmap and table locations (in bytes), flags and number of unused inodes of every group.
+        """
+        superblock = self.superblock
+        block_size = superblock["block_size"]
+        count = -(-superblock["inodes_count"] // superblock["inodes_per_group"])
+        start = self.offset + (superblock["first_data_block"] + 1) * block_size
+        available = max(len(self._buffer) - start, 0) // superblock["desc_size"]
+        if available < count:
+            self.truncated.extend(range(available, count))
+            count = available
+        descriptors = numpy.frombuffer(
+            self._buffer,
+            dtype=numpy.dtype(
+                {
+                    "names": ["inode_bitmap", "inode_table", "flags", "itable_unused"],
+                    "formats": ["<u4", "<u4", "<u2", "<u2"],
+                    "offsets": [4, 8, 18, 28],
+                    "itemsize": superblock["desc_size"],
+                }
+            ),
+            count=count,
+            offset=start,
+        )
+        inode_bitmap = descriptors["inode_bitmap"].astype(numpy.int64)
+        inode_table = descriptors["inode_table"].astype(numpy.int64)
+        if superblock["desc_size"] >= 64:
+            high = numpy.frombuffer(
+                self._buffer,
+                dtype=numpy.dtype(
+                    {
+                        "names": ["inode_bitmap", "inode_table"],
+                        "formats": ["<u4", "<u4"],
+                        "offsets": [36, 40],
+                        "itemsize": superblock["desc_size"],
+                    }
+                ),
+                count=count,
+                offset=start,
+            )
+            inode_bitmap |= high["inode_bitmap"].astype(numpy.int64) << 32
+            inode_table |= high["inode_table"].astype(numpy.int64) << 32
+            del high
+        groups = [
+            {
+                "inode_bitmap": self.offset + bitmap * block_size,
+                "inode_table": self.offset + table * block_size,
+                "flags": flags,
+                "itable_unused": unused,
+            }
+            for bitmap, table, flags, unused in zip(
+                inode_bitmap.tolist(),
+                inode_table.tolist(),
+                descriptors["flags"].tolist(),
+                descriptors["itable_unused"].tolist(),
+            )
+        ]
+        del descriptors
+        return groups
+
+    def iter_tables(self, deleted=True):
+        """
+        Yield, for every group, a dictionary of NumPy arrays describing its allocated (and, with deleted, its
+        unallocated but not blank) inodes: "inode" (numbers), "allocated", "mode", "uid", "gid", "size",
+        "links_count", "flags", and "atime", "ctime", "mtime", "dtime", "crtime" in microseconds since the POSIX
+        epoch (0 when unset). Groups whose inode table is not initialized are skipped, as are the groups whose
+        inode bitmap or table lies past the end of a truncated image; only the complete inodes of a table cut short
+        are read. Both are recorded in truncated.
+        """
+        superblock = self.superblock
+        per_group = superblock["inodes_per_group"]
+        inode_size = superblock["inode_size"]
+        dtype = inode_dtype(inode_size)
+        uninit_bg = superblock["feature_ro_compat"] & (
+            RO_COMPAT_GDT_CSUM | RO_COMPAT_METADATA_CSUM
+        )
+        for index, group in enumerate(self.groups):
+            if uninit_bg and group["flags"] & BG_INODE_UNINIT:
+                continue
+            # Inodes past the unused tail of the table have never been used
+            count = per_group - group["itable_unused"] if uninit_bg else per_group
+            count = min(count, superblock["inodes_count"] - index * per_group)
+            if count <= 0:
+                continue
+            size = len(self._buffer)
+            readable = max(size - group["inode_table"], 0) // inode_size
+            if group["inode_bitmap"] + (count + 7) // 8 > size or not readable:
+                self.truncated.append(index)
+                continue
+            if readable < count:
+                self.truncated.append(index)
+                count = readable
+            bitmap = numpy.frombuffer(
+                self._buffer,
+                dtype=numpy.uint8,
+                count=(count + 7) // 8,
+                offset=group["inode_bitmap"],
+            )
+            allocated = numpy.unpackbits(bitmap, bitorder="little")[:count].astype(bool)
+            del bitmap
+            inodes = numpy.frombuffer(
+                self._buffer, dtype=dtype, count=count, offset=group["inode_table"]
+            )
+            selected = allocated & (inodes["mode"] != 0)
+            if deleted:
+                selected |= ~allocated & (
+                    (inodes["mode"] != 0) | (inodes["dtime"] != 0)
+                )
+            inodes = inodes[selected]  # A copy: the mapping is not referenced anymore
+            table = {
+                "inode": numpy.flatnonzero(selected) + index * per_group + 1,
+                "allocated": allocated[selected],
+                "mode": inodes["mode"],
+                "uid": inodes["uid"] | (inodes["uid_high"].astype(numpy.uint32) << 16),
+                "gid": inodes["gid"] | (inodes["gid_high"].astype(numpy.uint32) << 16),
+                "size": inodes["size_lo"].astype(numpy.int64)
+                | (inodes["size_high"].astype(numpy.int64) << 32),
+                "links_count": inodes["links_count"],
+                "flags": inodes["flags"],
+                "atime": _times(inodes, "atime", 140),
+                "ctime": _times(inodes, "ctime", 132),
+                "mtime": _times(inodes, "mtime", 136),
+                "dtime": inodes["dtime"].astype(numpy.int64) * 1000000,
+            }
+            table["crtime"] = (
+                _times(inodes, "crtime", 148)
+                if "crtime" in inodes.dtype.names
+                else numpy.zeros(len(inodes), dtype=numpy.int64)
+            )
+            if "crtime" in inodes.dtype.names:
+                table["crtime"][inodes["extra_isize"] < 20] = 0
+            yield table
+
+
+def _time(microseconds):
+    return utc_datetime_us(microseconds) if microseconds else None
+
+
+def inode_objects(table):
+    """
+    Yield an observable per inode of a table (see Ext4Reader.iter_tables()), with an ExtInodeFacet (file type,
+    permissions, owner, link count, flags, change and deletion times) and a FileFacet (size and times).
+    """
+    columns = [
+        table[name].tolist()
+        for name in (
+            "inode",
+            "mode",
+            "uid",
+            "gid",
+            "size",
+            "links_count",
+            "flags",
+            "atime",
+            "ctime",
+            "mtime",
+            "dtime",
+            "crtime",
+        )
+    ]
+    for (
+        inode,
+        mode,
+        uid,
+        gid,
+        size,
+        links_count,
+        flags,
+        atime,
+        ctime,
+        mtime,
+        dtime,
+        crtime,
+    ) in zip(*columns):
+        obj = ObservableObject()
+        obj.append_facets(
+            FacetExtInode(
+                deletion_time=_time(dtime),
+                inode_change_time=_time(ctime),
+                file_type=mode >> 12,
+                flags=flags,
+                hard_link_count=links_count,
+                inode_id=inode,
+                permissions=mode & 0o7777,
+                sgid=gid,
+                suid=uid,
+            ),
+            FacetFile(
+                size_bytes=size,
+                accessed_time=_time(atime),
+                created_time=_time(crtime),
+                modified_time=_time(mtime),
+                metadata_changed_time=_time(ctime),
+            ),
+        )
+        yield obj
+
+
+class ExtInodeIngester:
+    def __init__(self, path, offset=0, deleted=True):
+        """
+        Maps the inodes of an ext2/3/4 file system image into observables with an ExtInodeFacet and a FileFacet.
+        :param path: The image
+        :param offset: The offset of the file system in the image (e.g. a partition offset)
+        :param deleted: Also map unallocated inodes that still hold metadata (deleted files)
+        """
+        self.path = path
+        self.offset = offset
+        self.deleted = deleted
+
+    def iter_objects(self):
+        with Ext4Reader(self.path, self.offset) as reader:
+            for table in reader.iter_tables(self.deleted):
+                yield from inode_objects(table)
+
+    def ingest(self, sink):
+        """
+        Stream the inode observables into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects():
+            append(obj)
+            count += 1
+        return count
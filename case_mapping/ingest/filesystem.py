@@ -0,0 +1,231 @@
+import os
+import posixpath
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ..content import DEFAULT_HASH_ALGORITHMS, digest_file
+from ..uco.observable import (
+    FacetContentData,
+    FacetFile,
+    FacetPathRelation,
+    ObservableObject,
+    ObservableRelationship,
+)
+from .common import sink_function, utc_datetime
+
+
+def _file_facet(name, path, stat, file_system_type, is_dir):
+    extension = None
+    if not is_dir and "." in name.lstrip("."):
+        extension = name.rsplit(".", 1)[1]
+    return FacetFile(
+        file_system_type=file_system_type,
+        file_name=name,
+        file_path=path,
+        file_extension=extension,
+        size_bytes=None if is_dir else stat.st_size,
+        accessed_time=utc_datetime(stat.st_atime),
+        created_time=utc_datetime(getattr(stat, "st_birthtime", None)),
+        modified_time=utc_datetime(stat.st_mtime),
+        metadata_changed_time=utc_datetime(stat.st_ctime),
+    )
+
+
+def _contained_within(child, parent, path):
+    relationship = ObservableRelationship(
+        source=child,
+        target=parent,
+        kind_of_relationship="Contained_Within",
+        directional=True,
+    )
+    relationship.append_facets(FacetPathRelation(path=path))
+    return relationship
+
+
+class _Node:
+    __slots__ = ("observable", "children")
+
+    def __init__(self, observable):
+        self.observable = observable
+        self.children = dict()
+
+
+class _PathTrie:
+    """
+    Directory observables keyed by path components, so that each directory is created exactly once (together with
+    the relationship to its parent) however many files below it are ingested, and in whichever order.
+    """
+
+    def __init__(self, root_path, file_system_type):
+        self.file_system_type = file_system_type
+        self.root = _Node(self._directory(root_path, root_path, None))
+
+    def _directory(self, name, path, stat):
+        directory = ObservableObject()
+        if stat is not None:
+            directory.append_facets(
+                _file_facet(name, path, stat, self.file_system_type, True)
+            )
+        else:
+            directory.append_facets(
+                FacetFile(
+                    file_system_type=self.file_system_type,
+                    file_name=name,
+                    file_path=path,
+                )
+            )
+        return directory
+
+    def get(self, parts, root_path, created, stat=None):
+        """
+        Return the observable of the directory at parts (path components below the root), creating it and any
+        missing ancestor; new objects are appended to created.
+        """
+        node = self.root
+        path = root_path
+        for i, name in enumerate(parts):
+            path = posixpath.join(path, name)
+            child = node.children.get(name)
+            if child is None:
+                directory = self._directory(
+                    name, path, stat if i == len(parts) - 1 else None
+                )
+                child = node.children[name] = _Node(directory)
+                created.append(directory)
+                created.append(_contained_within(directory, node.observable, path))
+            node = child
+        return node.observable
+
+
+class FilesystemIngester:
+    def __init__(
+        self,
+        root,
+        root_path="/",
+        file_system_type=None,
+        algorithms=DEFAULT_HASH_ALGORITHMS,
+        entropy=False,
+        workers=None,
+        max_pending=None,
+    ):
+        """
+        Maps a directory tree (e.g. a mounted evidence image) into File observables with FileFacets and
+        ContentDataFacets, and Contained_Within relationships (with a PathRelationFacet) from every file and
+        directory to its parent directory.
+        The tree is walked with os.scandir() while file contents are hashed on a pool of threads (hashlib releases
+        the GIL), so that many reads are in flight at once. Each directory observable is created once and shared by
+        all of its entries. Objects are produced in a deterministic order: every directory before its entries,
+        entries sorted by name.
+        :param root: The directory to ingest
+        :param root_path: The path recorded for root in the observables (e.g., "/" or "/sdcard")
+        :param file_system_type: The file system type recorded in the FileFacets (e.g., "EXT4")
+        :param algorithms: The hash methods computed for each file (no ContentDataFacet when empty)
+        :param entropy: Whether to compute the entropy of each file
+        :param workers: The number of hashing threads (defaults to 4 per CPU, up to 32)
+        :param max_pending: The maximum number of files being hashed ahead of the output (defaults to 8 per thread)
+        """
+        self.root = root
+        self.root_path = root_path
+        self.file_system_type = file_system_type
+        self.algorithms = tuple(algorithms)
+        self.entropy = entropy
+        self.workers = workers or min(32, 4 * (os.cpu_count() or 1))
+        self.max_pending = max_pending or 8 * self.workers
+        self.errors = []
+
+    def _walk(self, trie):
+        """
+        Yield (objects, None) for directories and (path, (name, recorded path, stat, parent)) for regular files.
+        """
+        stack = [(self.root, ())]
+        while stack:
+            directory, parts = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except OSError as error:
+                self.errors.append(error)
+                continue
+            parent = trie.get(parts, self.root_path, [])
+            subdirectories = []
+            for entry in entries:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if entry.is_dir(follow_symlinks=False):
+                        created = []
+                        trie.get(parts + (entry.name,), self.root_path, created, stat)
+                        yield created, None
+                        subdirectories.append((entry.path, parts + (entry.name,)))
+                    elif entry.is_file(follow_symlinks=False):
+                        path = posixpath.join(self.root_path, *parts, entry.name)
+                        yield entry.path, (entry.name, path, stat, parent)
+                except OSError as error:
+                    self.errors.append(error)
+            stack.extend(reversed(subdirectories))
+
+    def _file_objects(self, info, digest):
+        name, path, stat, parent = info
+        file_object = ObservableObject()
+        file_object.append_facets(
+            _file_facet(name, path, stat, self.file_system_type, False)
+        )
+        if digest is not None:
+            file_object.append_facets(
+                FacetContentData(
+                    size_bytes=digest["size"],
+                    magic_number=digest["magic_number"],
+                    entropy=digest["entropy"],
+                    hashes=digest["hashes"],
+                )
+            )
+        return [file_object, _contained_within(file_object, parent, path)]
+
+    def _digest(self, path):
+        try:
+            return digest_file(path, algorithms=self.algorithms, entropy=self.entropy)
+        except OSError as error:
+            self.errors.append(error)
+            return None
+
+    def iter_objects(self):
+        """
+        Walk the tree and yield its observables and relationships.
+        """
+        trie = _PathTrie(self.root_path, self.file_system_type)
+        yield trie.root.observable
+        hashing = bool(self.algorithms) or self.entropy
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending = deque()
+            for payload, info in self._walk(trie):
+                if info is None:
+                    pending.append((None, payload))
+                elif hashing:
+                    pending.append((executor.submit(self._digest, payload), info))
+                else:
+                    pending.append((None, self._file_objects(info, None)))
+                while pending and (
+                    pending[0][0] is None
+                    or pending[0][0].done()
+                    or len(pending) > self.max_pending
+                ):
+                    yield from self._finish(pending.popleft())
+            while pending:
+                yield from self._finish(pending.popleft())
+
+    def _finish(self, entry):
+        future, payload = entry
+        if future is None:
+            return payload
+        return self._file_objects(payload, future.result())
+
+    def ingest(self, sink):
+        """
+        Stream the observables of the tree into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects():
+            append(obj)
+            count += 1
+        return count
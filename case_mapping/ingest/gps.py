@@ -0,0 +1,339 @@
+import csv
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from array import array
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional for the package, but required for track ingest
+    numpy = None
+
+from ..uco.location import FacetLocation, Location
+from .common import sink_function
+
+# The mean radius of the Earth, in metres
+EARTH_RADIUS = 6371008.8
+
+# The time of fixes without one
+NO_TIME = numpy.iinfo(numpy.int64).min if numpy is not None else None
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_GPX_POINTS = {"trkpt", "rtept", "wpt"}
+
+# An ISO 8601 date and time: the part datetime.fromisoformat() always accepts, the fraction and the zone
+_ISO_TIME = re.compile(
+    r"(.*[T ]\d\d(?::\d\d){0,2})(?:[.,](\d+))?(Z|[+-]\d\d(?::?\d\d)?)?$", re.IGNORECASE
+)
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("NumPy is required to ingest GPS tracks")
+
+
+def _iso_time(value):
+    """
+    An ISO 8601 time in the form accepted by datetime.fromisoformat() on Python 3.9 and earlier: "Z" is written
+    +00:00, the zone offset gets its colon and the fraction exactly six digits (truncated to microseconds).
+    """
+    value = value.strip()
+    match = _ISO_TIME.match(value)
+    if match is None:
+        return value
+    time, fraction, zone = match.groups()
+    if fraction:
+        time += "." + fraction[:6].ljust(6, "0")
+    if zone is None:
+        return time
+    if zone in "Zz":
+        return time + "+00:00"
+    return f"{time}{zone[:3]}:{zone[3:].lstrip(':') or '00'}"
+
+
+def _microseconds(value):
+    """
+    An ISO 8601 time (e.g. "2021-03-04T05:06:07Z") in microseconds since the POSIX epoch.
+    """
+    parsed = datetime.fromisoformat(_iso_time(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def haversine(latitude1, longitude1, latitude2, longitude2):
+    """
+    The great-circle distances, in metres, between arrays of points in degrees.
+    """
+    latitude1, longitude1, latitude2, longitude2 = map(
+        numpy.radians, (latitude1, longitude1, latitude2, longitude2)
+    )
+    a = (
+        numpy.sin((latitude2 - latitude1) / 2) ** 2
+        + numpy.cos(latitude1)
+        * numpy.cos(latitude2)
+        * numpy.sin((longitude2 - longitude1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+
+
+class Track:
+    def __init__(self, latitude, longitude, altitude=None, time=None):
+        """
+        The fixes of a track, as NumPy arrays.
+        :param latitude: Latitudes in degrees
+        :param longitude: Longitudes in degrees
+        :param altitude: Altitudes in metres (NaN when unknown)
+        :param time: Times in microseconds since the POSIX epoch (NO_TIME when unknown)
+        """
+        _require_numpy()
+        self.latitude = numpy.asarray(latitude, dtype=numpy.float64)
+        self.longitude = numpy.asarray(longitude, dtype=numpy.float64)
+        count = len(self.latitude)
+        self.altitude = (
+            numpy.full(count, numpy.nan)
+            if altitude is None
+            else numpy.asarray(altitude, dtype=numpy.float64)
+        )
+        self.time = (
+            numpy.full(count, NO_TIME, dtype=numpy.int64)
+            if time is None
+            else numpy.asarray(time, dtype=numpy.int64)
+        )
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def select(self, indexes):
+        """
+        A Track of the fixes at indexes (a boolean mask or an array of indexes).
+        """
+        return Track(
+            self.latitude[indexes],
+            self.longitude[indexes],
+            self.altitude[indexes],
+            self.time[indexes],
+        )
+
+    def downsample(self, min_distance=None, min_interval=None):
+        """
+        Keep a fix every min_distance metres travelled along the track and/or every min_interval seconds; the
+        first and last fixes are always kept. A fix is kept when it starts a new distance or time step, which is
+        computed for all the fixes at once from the cumulative distance and the elapsed time.
+        :return: A Track of the retained fixes
+        """
+        if len(self) < 3 or (min_distance is None and min_interval is None):
+            return self
+        keep = numpy.zeros(len(self), dtype=bool)
+        keep[[0, -1]] = True
+        if min_distance is not None:
+            steps = haversine(
+                self.latitude[:-1],
+                self.longitude[:-1],
+                self.latitude[1:],
+                self.longitude[1:],
+            )
+            travelled = numpy.concatenate(([0.0], numpy.cumsum(steps)))
+            buckets = numpy.floor(travelled / min_distance)
+            keep[1:] |= buckets[1:] != buckets[:-1]
+        if min_interval is not None:
+            known = self.time != NO_TIME
+            if known.any():
+                elapsed = (self.time - self.time[known].min()) / 1e6
+                buckets = numpy.where(known, numpy.floor(elapsed / min_interval), -1)
+                keep[1:] |= buckets[1:] != buckets[:-1]
+        return self.select(keep)
+
+    def snap(self, cell_size, unique=False, centers=False):
+        """
+        Keep the first fix of every run of consecutive fixes in the same cell of a grid of cell_size degrees.
+        :param unique: Keep a single fix per cell for the whole track
+        :param centers: Move the retained fixes to the centre of their cell
+        :return: A Track of the retained fixes
+        """
+        rows = numpy.floor(self.latitude / cell_size).astype(numpy.int64)
+        columns = numpy.floor(self.longitude / cell_size).astype(numpy.int64)
+        if unique:
+            cells = numpy.stack((rows, columns), axis=1)
+            indexes = numpy.sort(numpy.unique(cells, axis=0, return_index=True)[1])
+        else:
+            changed = numpy.ones(len(self), dtype=bool)
+            changed[1:] = (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1])
+            indexes = numpy.flatnonzero(changed)
+        track = self.select(indexes)
+        if centers:
+            track.latitude = (rows[indexes] + 0.5) * cell_size
+            track.longitude = (columns[indexes] + 0.5) * cell_size
+        return track
+
+
+def read_gpx(path):
+    """
+    Read the track, route and waypoints of a GPX file into a Track, in document order.
+    """
+    _require_numpy()
+    latitude, longitude, altitude = array("d"), array("d"), array("d")
+    time = array("q")
+    for _, element in ElementTree.iterparse(path):
+        tag = element.tag.rpartition("}")[2]
+        if tag not in _GPX_POINTS:
+            continue
+        latitude.append(float(element.get("lat")))
+        longitude.append(float(element.get("lon")))
+        elevation = time_value = None
+        for child in element:
+            child_tag = child.tag.rpartition("}")[2]
+            if child_tag == "ele" and child.text:
+                elevation = float(child.text)
+            elif child_tag == "time" and child.text:
+                time_value = _microseconds(child.text)
+        altitude.append(numpy.nan if elevation is None else elevation)
+        time.append(NO_TIME if time_value is None else time_value)
+        element.clear()
+    return Track(
+        numpy.frombuffer(latitude, dtype=numpy.float64),
+        numpy.frombuffer(longitude, dtype=numpy.float64),
+        numpy.frombuffer(altitude, dtype=numpy.float64),
+        numpy.frombuffer(time, dtype=numpy.int64),
+    )
+
+
+def read_csv(
+    path,
+    latitude="latitude",
+    longitude="longitude",
+    altitude=None,
+    time=None,
+    time_scale=1000000,
+    **kwargs,
+):
+    """
+    Read a CSV file with a header row into a Track. Times may be numbers (time_scale microseconds per unit since
+    the POSIX epoch, e.g. 1000 for milliseconds) or ISO 8601 strings.
+    :param latitude: The latitude column
+    :param longitude: The longitude column
+    :param altitude: The altitude column, if any
+    :param time: The time column, if any
+    :param kwargs: Passed to csv.reader (e.g. delimiter=";")
+    """
+    _require_numpy()
+    columns = {"latitude": latitude, "longitude": longitude}
+    arrays = {"latitude": array("d"), "longitude": array("d"), "altitude": array("d")}
+    times = array("q")
+    with open(path, newline="", encoding="utf-8") as fp:
+        reader = csv.reader(fp, **kwargs)
+        header = next(reader)
+        indexes = {key: header.index(column) for key, column in columns.items()}
+        altitude_index = header.index(altitude) if altitude else None
+        time_index = header.index(time) if time else None
+        for row in reader:
+            if not row:
+                continue
+            for key, index in indexes.items():
+                arrays[key].append(float(row[index]))
+            value = row[altitude_index] if altitude_index is not None else ""
+            arrays["altitude"].append(float(value) if value else numpy.nan)
+            value = row[time_index].strip() if time_index is not None else ""
+            if not value:
+                times.append(NO_TIME)
+                continue
+            try:
+                times.append(round(float(value) * time_scale))
+            except ValueError:
+                times.append(_microseconds(value))
+    return Track(
+        *(numpy.frombuffer(arrays[key], dtype=numpy.float64) for key in arrays),
+        numpy.frombuffer(times, dtype=numpy.int64),
+    )
+
+
+class TrackIngester:
+    def __init__(
+        self,
+        min_distance=None,
+        min_interval=None,
+        cell_size=None,
+        unique_cells=False,
+        csv_columns=None,
+    ):
+        """
+        Maps GPX and CSV tracks into Location objects with a LatLongCoordinatesFacet. The fixes are loaded into
+        NumPy arrays and downsampled as a whole (see Track.downsample() and Track.snap()) before any Location is
+        created, so that only the retained fixes are ever mapped.
+        :param min_distance: Keep a fix every min_distance metres travelled
+        :param min_interval: Keep a fix every min_interval seconds
+        :param cell_size: Keep a fix per visit of every cell of a grid of cell_size degrees
+        :param unique_cells: Keep a single fix per grid cell
+        :param csv_columns: Keyword arguments of read_csv() (column names, time_scale, delimiter, ...)
+        """
+        _require_numpy()
+        self.min_distance = min_distance
+        self.min_interval = min_interval
+        self.cell_size = cell_size
+        self.unique_cells = unique_cells
+        self.csv_columns = csv_columns or dict()
+        self.points = 0
+        self.retained = 0
+
+    def read(self, path):
+        """
+        Read a .gpx or .csv file into a Track.
+        """
+        if os.fspath(path).lower().endswith(".gpx"):
+            return read_gpx(path)
+        return read_csv(path, **self.csv_columns)
+
+    def downsample(self, track):
+        """
+        Apply the grid and the distance/time thresholds to a Track.
+        """
+        if self.cell_size is not None:
+            track = track.snap(self.cell_size, self.unique_cells)
+        return track.downsample(self.min_distance, self.min_interval)
+
+    def iter_objects(self, paths):
+        """
+        Yield a Location per retained fix of every track, in order. The time of a fix, when known, is the
+        objectCreatedTime of its Location: UCO has no observation time on locations or their facets, and the
+        Location object is created from the fix at that time.
+        """
+        for path in paths:
+            track = self.read(path)
+            retained = self.downsample(track)
+            self.points += len(track)
+            self.retained += len(retained)
+            altitudes = [
+                None if altitude != altitude else altitude  # NaN
+                for altitude in retained.altitude.tolist()
+            ]
+            times = [
+                None if time == NO_TIME else _EPOCH + timedelta(microseconds=time)
+                for time in retained.time.tolist()
+            ]
+            for latitude, longitude, altitude, time in zip(
+                retained.latitude.tolist(),
+                retained.longitude.tolist(),
+                altitudes,
+                times,
+            ):
+                yield Location(
+                    facets=FacetLocation(
+                        latitude=latitude, longitude=longitude, altitude=altitude
+                    ),
+                    created_time=time,
+                )
+
+    def ingest(self, paths, sink):
+        """
+        Stream the Locations of GPX and CSV tracks into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects(paths):
+            append(obj)
+            count += 1
+        return count
@@ -0,0 +1,310 @@
+import email
+import hashlib
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone
+from email.header import decode_header, make_header
+from email.utils import getaddresses, parsedate_to_datetime
+from functools import partial
+
+from ..builder import PENDING_PER_WORKER, bounded_map
+from ..uco.observable import (
+    FacetContentData,
+    FacetEmailAccount,
+    FacetEmailAddress,
+    FacetEmailMessage,
+    FacetFile,
+    ObservableObject,
+    ObservableRelationship,
+)
+from .common import Interner, sink_function
+
+# The size of the mbox byte ranges parsed by each work unit
+CHUNK_SIZE = 64 << 20
+
+_FROM_LINE = re.compile(rb"^From ", re.MULTILINE)
+
+ADDRESS_HEADERS = {"from": "From", "to": "To", "cc": "Cc", "bcc": "Bcc"}
+
+
+def split_mbox(path, chunk_size=CHUNK_SIZE):
+    """
+    Partition an mbox file into (path, start, end) byte ranges of about chunk_size bytes, each starting at a
+    message boundary (a "From " line), so that they can be parsed independently.
+    """
+    with open(path, "rb") as fp:
+        try:
+            buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty files cannot be mapped
+            return []
+    with buffer:
+        starts = [0]
+        position = chunk_size
+        while position < len(buffer):
+            found = buffer.find(b"\nFrom ", position)
+            if found == -1:
+                break
+            starts.append(found + 1)
+            position = found + 1 + chunk_size
+        return [
+            (path, start, end) for start, end in zip(starts, starts[1:] + [len(buffer)])
+        ]
+
+
+def _text(value):
+    """
+    Decode an RFC 2047 encoded header.
+    """
+    if value is None:
+        return None
+    try:
+        return str(make_header(decode_header(value))).strip() or None
+    except (ValueError, LookupError):
+        return str(value).strip() or None
+
+
+def _addresses(message, header):
+    return [
+        (_text(name), address.strip().lower())
+        for name, address in getaddresses(message.get_all(header, []))
+        if address.strip()
+    ]
+
+
+def _payload(part):
+    try:
+        return part.get_payload(decode=True) or b""
+    except (ValueError, LookupError):
+        return b""
+
+
+def _parse_message(data, offset, store):
+    """
+    Parse a message into a plain (picklable) record.
+    """
+    message = email.message_from_bytes(data)
+    try:
+        sent_time = parsedate_to_datetime(message["Date"]) if message["Date"] else None
+    except (TypeError, ValueError):
+        sent_time = None
+    if sent_time is not None and sent_time.tzinfo is None:
+        # No time zone, or -0000 (UTC, the local zone being unknown: RFC 5322, 3.3)
+        sent_time = sent_time.replace(tzinfo=timezone.utc)
+    record = {
+        "offset": offset,
+        "subject": _text(message["Subject"]),
+        "message_id": _text(message["Message-ID"]),
+        "x_mailer": _text(message["X-Mailer"]),
+        "content_type": message.get_content_type(),
+        "is_multipart": message.is_multipart(),
+        "sent_time": sent_time,
+        "body": None,
+        "attachments": [],
+    }
+    for key, header in ADDRESS_HEADERS.items():
+        record[key] = _addresses(message, header)
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        filename = _text(part.get_filename())
+        if filename is None and part.get_content_disposition() != "attachment":
+            if record["body"] is None and part.get_content_type() == "text/plain":
+                charset = part.get_content_charset() or "utf-8"
+                try:
+                    body = _payload(part).decode(charset, "replace")
+                except LookupError:
+                    body = _payload(part).decode("utf-8", "replace")
+                record["body"] = store.put_text(body) if store is not None else body
+            continue
+        content = _payload(part)
+        record["attachments"].append(
+            (
+                filename,
+                part.get_content_type(),
+                len(content),
+                hashlib.sha256(content).hexdigest(),
+                store.put_bytes(content) if store is not None else None,
+            )
+        )
+    return record
+
+
+def _parse_unit(unit, store):
+    """
+    Parse the messages of an mbox byte range (or a whole .eml file when end is None).
+    """
+    path, start, end = unit
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        data = fp.read() if end is None else fp.read(end - start)
+    if end is None:
+        return [_parse_message(data, start, store)]
+    boundaries = [match.start() for match in _FROM_LINE.finditer(data)]
+    records = []
+    for begin, finish in zip(boundaries, boundaries[1:] + [len(data)]):
+        # Skip the "From " envelope line
+        body_start = data.find(b"\n", begin, finish)
+        if body_start != -1:
+            records.append(
+                _parse_message(data[body_start + 1 : finish], start + begin, store)
+            )
+    return records
+
+
+def _parse_units(units, store):
+    return [record for unit in units for record in _parse_unit(unit, store)]
+
+
+def email_address(address, display_name=None):
+    """
+    The observables of an email address: one with an EmailAddressFacet, and its account (EmailAccountFacet).
+    """
+    address_object = ObservableObject(
+        facets=FacetEmailAddress(email_address_value=address, display_name=display_name)
+    )
+    account = ObservableObject(facets=FacetEmailAccount(email_address=address_object))
+    return [address_object, account]
+
+
+class MailIngester:
+    def __init__(
+        self,
+        workers=None,
+        store=None,
+        chunk_size=CHUNK_SIZE,
+        mp_context=None,
+        addresses=None,
+    ):
+        """
+        Maps mbox and .eml files into email message observables (with an EmailMessageFacet), attachment
+        observables (with FileFacet and ContentDataFacet, Attached_To their message) and, once per address, email
+        address and account observables, as example.py builds them.
+        Large mbox files are split at message boundaries (see split_mbox()) and parsed on a pool of processes; the
+        workers only send plain records back, and observables are created in the calling process in file order.
+        :param workers: The number of worker processes (defaults to the number of CPUs)
+        :param store: A payload.BlobStore; when given, bodies and attachments are written to the store (by the
+                      workers) and referenced lazily instead of being held in memory. The facets then hold
+                      payload.PayloadReferences, which json.dumps() only serializes with default=base.json_default
+        :param chunk_size: The approximate size of the mbox byte ranges parsed by each work unit
+        :param mp_context: A multiprocessing context for the pool
+        :param addresses: An Interner of email addresses, to share addresses between ingesters
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.store = store
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self.addresses = addresses if addresses is not None else Interner(email_address)
+
+    def units(self, paths):
+        """
+        Yield the work units of mbox and .eml files: (path, start, end) byte ranges, end being None for .eml files.
+        """
+        for path in paths:
+            with open(path, "rb") as fp:
+                is_mbox = fp.read(5) == b"From "
+            if is_mbox:
+                yield from split_mbox(path, self.chunk_size)
+            else:
+                yield path, 0, None
+
+    def iter_records(self, paths):
+        """
+        Yield a plain record per message, in file order.
+        """
+        units = list(self.units(paths))
+        # Small .eml files are grouped, so that every task carries a reasonable amount of work
+        groups = []
+        for unit in units:
+            if groups and unit[2] is None and groups[-1][-1][2] is None:
+                if len(groups[-1]) < 64:
+                    groups[-1].append(unit)
+                    continue
+            groups.append([unit])
+        if len(groups) <= 1 or self.workers == 1:
+            for group in groups:
+                yield from _parse_units(group, self.store)
+            return
+        workers = min(self.workers, len(groups))
+        executor = ProcessPoolExecutor(workers, mp_context=self.mp_context)
+        try:
+            for records in bounded_map(
+                executor,
+                partial(_parse_units, store=self.store),
+                groups,
+                PENDING_PER_WORKER * workers,
+            ):
+                yield from records
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _references(self, addresses, created):
+        return [
+            self.addresses.get(address, created, display_name)
+            for display_name, address in addresses
+        ]
+
+    def _objects(self, record):
+        created = []
+        senders = self._references(record["from"], created)
+        facet = FacetEmailMessage(
+            subject=record["subject"],
+            sent_time=record["sent_time"],
+            message_id=record["message_id"],
+            x_mailer=record["x_mailer"],
+            content_type=record["content_type"],
+            is_multipart=record["is_multipart"],
+        )
+        if senders:
+            facet["uco-observable:from"] = senders[0]
+        for key in ("to", "cc", "bcc"):
+            references = self._references(record[key], created)
+            if references:
+                facet[f"uco-observable:{key}"] = references
+        if record["body"] is not None:
+            facet["uco-observable:body"] = record["body"]
+        message = ObservableObject(facets=facet)
+        objects = created + [message]
+        for name, mime_type, size, sha256, payload in record["attachments"]:
+            attachment = ObservableObject()
+            attachment.append_facets(
+                FacetFile(file_name=name, size_bytes=size),
+                FacetContentData(
+                    mime_type=mime_type,
+                    size_bytes=size,
+                    hash_method="SHA256",
+                    hash_value=sha256,
+                    data_payload=payload,
+                ),
+            )
+            objects += [
+                attachment,
+                ObservableRelationship(
+                    source=attachment,
+                    target=message,
+                    kind_of_relationship="Attached_To",
+                    directional=True,
+                ),
+            ]
+        return objects
+
+    def iter_objects(self, paths):
+        """
+        Yield the observables of every message: new addresses and accounts first, then the message, its
+        attachments and their relationships.
+        """
+        for record in self.iter_records(paths):
+            yield from self._objects(record)
+
+    def ingest(self, paths, sink):
+        """
+        Stream the observables of mbox and .eml files into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects(paths):
+            append(obj)
+            count += 1
+        return count
@@ -0,0 +1,250 @@
+import re
+
+from ..uco.observable import (
+    FacetCall,
+    FacetMessage,
+    FacetPhoneAccount,
+    FacetSMSMessage,
+    Message,
+    ObservableObject,
+)
+from .common import Interner, connect_read_only, sink_function, utc_datetime_us
+
+# The fields read from a table; a TableMapping maps each of them to a column (or any SQL expression)
+FIELDS = ("id", "address", "time", "type", "text", "thread", "duration")
+
+_SEPARATORS = re.compile(r"[\s\-().]")
+
+
+def normalize_phone_number(number, country_code=None):
+    """
+    Normalize a phone number for comparison: separators are removed, an international "00" prefix becomes "+" and,
+    with a country code (e.g. "44"), national numbers (with a leading trunk "0") are made international.
+    Alphanumeric sender ids (e.g. "VODAFONE") are only stripped.
+    :return: The normalized number, or None for empty numbers
+    """
+    if number is None:
+        return None
+    number = str(number).strip()
+    digits = _SEPARATORS.sub("", number)
+    if not digits.lstrip("+").isdigit():
+        return number or None
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    if country_code and digits.startswith("0"):
+        return f"+{country_code}{digits[1:]}"
+    return digits
+
+
+def phone_account(number):
+    """
+    A phone account observable with a PhoneAccountFacet.
+    """
+    return ObservableObject(facets=FacetPhoneAccount(phone_number=number))
+
+
+class TableMapping:
+    def __init__(self, table, kind, columns, types=None, time_scale=1000, order="_id"):
+        """
+        Describes how the rows of a table map to messages or calls.
+        :param table: The table name
+        :param kind: "sms" (SMSMessageFacet), "message" (MessageFacet) or "call" (CallFacet)
+        :param columns: {field: column or SQL expression} for the fields in FIELDS; unmapped fields are NULL
+        :param types: {type column value: (message/call type, whether the row was received)}
+        :param time_scale: The number of microseconds per time unit (1000 for milliseconds since the POSIX epoch)
+        :param order: The ORDER BY clause
+        """
+        self.table = table
+        self.kind = kind
+        self.columns = dict(columns)
+        self.types = types or dict()
+        self.time_scale = time_scale
+        self.order = order
+
+    def query(self):
+        """
+        The SELECT statement returning the fields of every row. Times (and end times, from the duration in seconds)
+        are converted to microseconds since the POSIX epoch by SQLite, for a whole batch at a time.
+        """
+        columns = {field: self.columns.get(field) or "NULL" for field in FIELDS}
+        time = f"NULLIF({columns['time']}, 0) * {self.time_scale}"
+        expressions = [columns[field] for field in FIELDS]
+        expressions[FIELDS.index("time")] = time
+        expressions.append(f"{time} + ({columns['duration']}) * 1000000")
+        return (
+            f"SELECT {', '.join(expressions)} FROM {self.table} ORDER BY {self.order}"
+        )
+
+
+ANDROID_SMS = TableMapping(
+    "sms",
+    "sms",
+    {
+        "id": "_id",
+        "address": "address",
+        "time": "date",
+        "type": "type",
+        "text": "body",
+        "thread": "thread_id",
+    },
+    types={
+        1: ("inbox", True),
+        2: ("sent", False),
+        3: ("draft", False),
+        4: ("outbox", False),
+        5: ("failed", False),
+        6: ("queued", False),
+    },
+)
+
+ANDROID_CALLS = TableMapping(
+    "calls",
+    "call",
+    {
+        "id": "_id",
+        "address": "number",
+        "time": "date",
+        "type": "type",
+        "duration": "duration",
+    },
+    types={
+        1: ("incoming", True),
+        2: ("outgoing", False),
+        3: ("missed", True),
+        4: ("voicemail", True),
+        5: ("rejected", True),
+        6: ("blocked", True),
+        7: ("answered externally", True),
+    },
+)
+
+
+class PhoneRecordIngester:
+    def __init__(
+        self,
+        path,
+        mapping,
+        owner_number=None,
+        country_code=None,
+        application=None,
+        batch_size=10000,
+        immutable=False,
+        accounts=None,
+    ):
+        """
+        Maps the rows of an SMS (mmssms.db) or call log (calllog.db) table into Message observables with an
+        SMSMessageFacet or MessageFacet, or observables with a CallFacet. Every phone number is normalized and
+        interned into a single phone account observable, shared by all the messages and calls referencing it.
+        Rows are read in batches of batch_size through a read-only connection and streamed out as they are mapped.
+        :param path: The database
+        :param mapping: A TableMapping (e.g. ANDROID_SMS or ANDROID_CALLS)
+        :param owner_number: The phone number of the device, recorded as the other end of every message and call
+        :param country_code: The country code used to normalize national numbers (see normalize_phone_number())
+        :param application: The observable of the messaging/phone application, referenced by every record
+        :param batch_size: The number of rows fetched at a time
+        :param immutable: Open the database as immutable (see common.connect_read_only())
+        :param accounts: An Interner of phone accounts, to share accounts between several databases
+        """
+        self.path = path
+        self.mapping = mapping
+        self.country_code = country_code
+        self.application = application
+        self.batch_size = batch_size
+        self.immutable = immutable
+        self.accounts = accounts if accounts is not None else Interner(phone_account)
+        self.owner_number = normalize_phone_number(owner_number, country_code)
+
+    def iter_batches(self):
+        """
+        Yield the rows of the table, a list of tuples (the fields of FIELDS, followed by the end time) at a time.
+        """
+        connection = connect_read_only(self.path, self.immutable)
+        try:
+            cursor = connection.execute(self.mapping.query())
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            connection.close()
+
+    def _account(self, number, created):
+        if number is None:
+            return None
+        return self.accounts.get(number, created)
+
+    def _record(self, row, created):
+        record_id, address, time, type_code, text, thread, duration, end_time = row
+        record_type, received = self.mapping.types.get(type_code, (None, None))
+        if record_type is None and type_code is not None:
+            record_type = str(type_code)
+        other = self._account(
+            normalize_phone_number(address, self.country_code), created
+        )
+        owner = self._account(self.owner_number, created)
+        if received is None:  # Unknown direction
+            sender, recipient = None, other
+        elif received:
+            sender, recipient = other, owner
+        else:
+            sender, recipient = owner, other
+
+        if self.mapping.kind == "call":
+            facet = FacetCall(
+                call_type=record_type,
+                start_time=utc_datetime_us(time),
+                end_time=utc_datetime_us(end_time),
+                call_duration=duration,
+            )
+            obj = ObservableObject()
+        else:
+            facet_class = (
+                FacetSMSMessage if self.mapping.kind == "sms" else FacetMessage
+            )
+            facet = facet_class(
+                message_text=text,
+                sent_time=utc_datetime_us(time),
+                message_type=record_type,
+                message_id=None if record_id is None else str(record_id),
+                session_id=None if thread is None else str(thread),
+            )
+            obj = Message()
+        if sender is not None:
+            facet["uco-observable:from"] = sender
+        if recipient is not None:
+            facet["uco-observable:to"] = (
+                recipient if self.mapping.kind == "call" else [recipient]
+            )
+        if self.application is not None:
+            facet["uco-observable:application"] = {
+                "@id": self.application.get_id(),
+                "@type": self.application.get("@type"),
+            }
+        obj.append_facets(facet)
+        return obj
+
+    def iter_objects(self):
+        """
+        Yield the phone accounts (each before its first use) and the message or call observables.
+        """
+        created = []
+        for rows in self.iter_batches():
+            for row in rows:
+                record = self._record(row, created)
+                if created:
+                    yield from created
+                    created.clear()
+                yield record
+
+    def ingest(self, sink):
+        """
+        Stream the observables into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects():
+            append(obj)
+            count += 1
+        return count
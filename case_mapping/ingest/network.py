@@ -0,0 +1,353 @@
+import ipaddress
+import os
+import re
+import socket
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from ..builder import PENDING_PER_WORKER, bounded_map
+from ..uco.observable import (
+    FacetDomainName,
+    FacetIPv4Address,
+    ObservableDomainName,
+    ObservableHostName,
+    ObservableIPv4Address,
+    ObservableRelationship,
+)
+from .common import Interner, sink_function, utc_datetime_us
+
+# The approximate number of bytes of a log handed to a worker at a time
+CHUNK_SIZE = 16 << 20
+
+# The fields read from each kind of Zeek log
+LOG_FIELDS = {
+    "conn": ("ts", "id.orig_h", "id.resp_h", "duration"),
+    "dns": ("ts", "query", "answers"),
+    "http": ("ts", "id.orig_h", "host"),
+}
+
+_IPV4 = struct.Struct("!I")
+# A host name (as the answer of CNAME, PTR, MX... queries): dot-separated labels of letters, digits, hyphens and
+# underscores (used by SRV and DKIM names), at most 253 characters
+_HOST_NAME = re.compile(
+    r"(?=.{1,253}$)[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?"
+    r"(?:\.[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?)*"
+)
+
+
+def pack_ipv4(address):
+    """
+    An IPv4 address as an integer, or None for anything else (e.g. an IPv6 address).
+    """
+    try:
+        return (
+            _IPV4.unpack(socket.inet_aton(address))[0]
+            if address.count(".") == 3
+            else None
+        )
+    except OSError:
+        return None
+
+
+def dns_answer(answer):
+    """
+    Classify the answer of a DNS query: a packed IPv4 address, a (lowercase) host name, or None for anything else
+    (IPv6 addresses, TXT records...).
+    """
+    try:
+        address = ipaddress.ip_address(answer)
+    except ValueError:
+        answer = answer.lower().rstrip(".")
+        return answer if _HOST_NAME.fullmatch(answer) else None
+    return int(address) if address.version == 4 else None
+
+
+def unpack_ipv4(value):
+    return socket.inet_ntoa(_IPV4.pack(value))
+
+
+def ipv4_address(value):
+    """
+    An IPv4Address observable with an IPv4AddressFacet, from a packed address.
+    """
+    return ObservableIPv4Address(facets=FacetIPv4Address(ip=unpack_ipv4(value)))
+
+
+def domain_name(name):
+    """
+    A DomainName observable with a DomainNameFacet.
+    """
+    return ObservableDomainName(facets=FacetDomainName(name))
+
+
+def host_name(name):
+    """
+    A HostName observable.
+    """
+    return ObservableHostName(name)
+
+
+def read_header(path):
+    """
+    Read the header of a Zeek TSV log.
+    :return: {"path": the kind of log (e.g. "conn"), "fields": field names, "separator", "set_separator",
+             "unset_field", "empty_field", "size": the size of the header in bytes}
+    """
+    header = {
+        "path": None,
+        "fields": (),
+        "separator": "\t",
+        "set_separator": ",",
+        "unset_field": "-",
+        "empty_field": "(empty)",
+        "size": 0,
+    }
+    with open(path, "rb") as fp:
+        for line in fp:
+            if not line.startswith(b"#"):
+                break
+            header["size"] += len(line)
+            line = line.decode("utf-8", "replace").rstrip("\r\n")
+            if line.startswith("#separator "):
+                header["separator"] = (
+                    line.split(" ", 1)[1].encode().decode("unicode_escape")
+                )
+                continue
+            key, _, value = line[1:].partition(header["separator"])
+            if key == "fields":
+                header["fields"] = tuple(value.split(header["separator"]))
+            elif key in ("path", "set_separator", "unset_field", "empty_field"):
+                header[key] = value
+    return header
+
+
+def _timestamp(value):
+    """
+    A Zeek timestamp ("1614834367.123456") in microseconds since the POSIX epoch.
+    """
+    seconds, _, fraction = value.partition(".")
+    return int(seconds) * 1000000 + int((fraction + "000000")[:6])
+
+
+def _parse_unit(unit):
+    """
+    Parse the rows of a byte range of a log into compact tuples, with addresses packed into integers:
+    conn: (ts, originator, responder, duration in microseconds), dns: (ts, query, [answers (see dns_answer())]) and
+    http: (ts, originator, host), timestamps being in microseconds.
+    :return: (records, errors)
+    """
+    path, start, end, header = unit
+    kind = header["path"]
+    separator = header["separator"]
+    missing = {header["unset_field"], header["empty_field"], ""}
+    try:
+        indexes = [header["fields"].index(field) for field in LOG_FIELDS[kind]]
+    except ValueError as error:
+        return [], [ValueError(f"{path}: {error}")]
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        lines = fp.read(end - start).decode("utf-8", "replace").splitlines()
+    records = []
+    errors = []
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        values = line.split(separator)
+        try:
+            values = [values[index] for index in indexes]
+            values = [None if value in missing else value for value in values]
+            ts = _timestamp(values[0])
+            if kind == "conn":
+                duration = values[3]
+                records.append(
+                    (
+                        ts,
+                        pack_ipv4(values[1]),
+                        pack_ipv4(values[2]),
+                        None if duration is None else _timestamp(duration),
+                    )
+                )
+            elif kind == "dns":
+                answers = [
+                    dns_answer(answer)
+                    for answer in (values[2] or "").split(header["set_separator"])
+                    if answer
+                ]
+                records.append((ts, values[1] and values[1].lower(), answers))
+            else:
+                records.append(
+                    (ts, pack_ipv4(values[1]), values[2] and values[2].lower())
+                )
+        except (IndexError, TypeError, ValueError) as error:
+            errors.append(ValueError(f"{path}: {error}: {line!r}"))
+    return records, errors
+
+
+class NetworkLogIngester:
+    def __init__(
+        self,
+        workers=None,
+        chunk_size=CHUNK_SIZE,
+        mp_context=None,
+        addresses=None,
+        domains=None,
+        hosts=None,
+    ):
+        """
+        Maps Zeek TSV logs (conn, dns and http) into ObservableRelationships between interned observables: each
+        distinct IPv4 address (packed into an integer), domain name and host name yields a single IPv4Address,
+        DomainName or HostName observable, shared by all the relationships referencing it.
+        - conn: originator Connected_To responder, from the start to the end of the connection
+        - dns: query Resolved_To every answer that is an IPv4 address or a host name (CNAME, PTR, MX... answers);
+          queries without answers only yield their domain name
+        - http: originator Connected_To the host of the request
+        Logs are split at line boundaries and parsed on a pool of processes, chunk_size bytes at a time; workers
+        only send compact tuples back, and observables are created in the calling process in file order. Rows
+        with IPv6 addresses and DNS answers that are IPv6 addresses or other records (e.g. TXT), for which there
+        are no observables in this library, are counted in skipped.
+        :param workers: The number of worker processes (defaults to the number of CPUs)
+        :param chunk_size: The approximate number of bytes handed to a worker at a time
+        :param mp_context: A multiprocessing context for the pool
+        :param addresses: An Interner of IPv4 addresses (keyed by packed address), to share them between ingesters
+        :param domains: An Interner of domain names
+        :param hosts: An Interner of host names
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self.addresses = addresses if addresses is not None else Interner(ipv4_address)
+        self.domains = domains if domains is not None else Interner(domain_name)
+        self.hosts = hosts if hosts is not None else Interner(host_name)
+        self.errors = []
+        self.skipped = 0
+
+    def units(self, paths):
+        """
+        Yield (path, start, end, header) byte ranges of about chunk_size bytes, each ending at a line boundary.
+        """
+        for path in paths:
+            header = read_header(path)
+            if header["path"] not in LOG_FIELDS:
+                self.errors.append(
+                    ValueError(f"{path}: unsupported log {header['path']!r}")
+                )
+                continue
+            size = os.path.getsize(path)
+            with open(path, "rb") as fp:
+                start = header["size"]
+                while start < size:
+                    fp.seek(min(start + self.chunk_size, size))
+                    fp.readline()
+                    end = min(fp.tell(), size)
+                    yield path, start, end, header
+                    start = end
+
+    def iter_records(self, paths):
+        """
+        Yield (kind of log, records) for every unit of the logs, in order (see _parse_unit()).
+        """
+        units = list(self.units(paths))
+        if len(units) <= 1:
+            results = map(_parse_unit, units)
+        else:
+            workers = min(self.workers, len(units))
+            executor = ProcessPoolExecutor(workers, mp_context=self.mp_context)
+            results = bounded_map(
+                executor, _parse_unit, units, PENDING_PER_WORKER * workers
+            )
+        try:
+            for unit, (records, errors) in zip(units, results):
+                self.errors.extend(errors)
+                yield unit[3]["path"], records
+        finally:
+            if len(units) > 1:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _relationship(self, source, target, kind, start, end=None):
+        relationship = ObservableRelationship(
+            None,
+            None,
+            start_time=utc_datetime_us(start),
+            end_time=utc_datetime_us(end),
+            kind_of_relationship=kind,
+            directional=True,
+        )
+        relationship["uco-core:source"] = source
+        relationship["uco-core:target"] = target
+        return relationship
+
+    def _objects(self, kind, record, created):
+        if kind == "conn":
+            ts, originator, responder, duration = record
+            if originator is None or responder is None:
+                self.skipped += 1
+                return []
+            return [
+                self._relationship(
+                    self.addresses.get(originator, created),
+                    self.addresses.get(responder, created),
+                    "Connected_To",
+                    ts,
+                    None if duration is None else ts + duration,
+                )
+            ]
+        if kind == "dns":
+            ts, query, answers = record
+            if query is None:
+                return []
+            source = self.domains.get(query, created)
+            relationships = []
+            for answer in answers:
+                if answer is None:
+                    self.skipped += 1
+                    continue
+                relationships.append(
+                    self._relationship(
+                        source,
+                        self.domains.get(answer, created)
+                        if isinstance(answer, str)
+                        else self.addresses.get(answer, created),
+                        "Resolved_To",
+                        ts,
+                    )
+                )
+            return relationships
+        ts, originator, host = record
+        if originator is None:
+            self.skipped += 1
+            return []
+        if host is None:
+            return []
+        return [
+            self._relationship(
+                self.addresses.get(originator, created),
+                self.hosts.get(host, created),
+                "Connected_To",
+                ts,
+            )
+        ]
+
+    def iter_objects(self, paths):
+        """
+        Yield the relationships of every row, each preceded by the observables it creates.
+        """
+        created = []
+        for kind, records in self.iter_records(paths):
+            for record in records:
+                relationships = self._objects(kind, record, created)
+                if created:
+                    yield from created
+                    created.clear()
+                yield from relationships
+
+    def ingest(self, paths, sink):
+        """
+        Stream the observables and relationships of Zeek logs into a Bundle, BundleWriter or ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects(paths):
+            append(obj)
+            count += 1
+        return count
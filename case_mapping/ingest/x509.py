@@ -0,0 +1,483 @@
+import binascii
+import hashlib
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from ..builder import PENDING_PER_WORKER, bounded_map
+from ..uco.observable import FacetX509Certificate, X509Certificate
+from .common import Interner, sink_function
+
+# The approximate number of bytes of certificate files handed to a worker at a time
+CHUNK_SIZE = 4 << 20
+
+# Names of the object identifiers found in certificates (others are kept in dotted form)
+OIDS = {
+    # Attribute types (RFC 4514 names)
+    "2.5.4.3": "CN",
+    "2.5.4.5": "serialNumber",
+    "2.5.4.6": "C",
+    "2.5.4.7": "L",
+    "2.5.4.8": "ST",
+    "2.5.4.9": "STREET",
+    "2.5.4.10": "O",
+    "2.5.4.11": "OU",
+    "2.5.4.12": "title",
+    "2.5.4.42": "GN",
+    "2.5.4.4": "SN",
+    "0.9.2342.19200300.100.1.1": "UID",
+    "0.9.2342.19200300.100.1.25": "DC",
+    "1.2.840.113549.1.9.1": "emailAddress",
+    # Public key algorithms
+    "1.2.840.113549.1.1.1": "rsaEncryption",
+    "1.2.840.113549.1.1.10": "RSASSA-PSS",
+    "1.2.840.10040.4.1": "dsaEncryption",
+    "1.2.840.10045.2.1": "id-ecPublicKey",
+    "1.3.101.112": "Ed25519",
+    "1.3.101.113": "Ed448",
+    # Signature algorithms
+    "1.2.840.113549.1.1.4": "md5WithRSAEncryption",
+    "1.2.840.113549.1.1.5": "sha1WithRSAEncryption",
+    "1.2.840.113549.1.1.11": "sha256WithRSAEncryption",
+    "1.2.840.113549.1.1.12": "sha384WithRSAEncryption",
+    "1.2.840.113549.1.1.13": "sha512WithRSAEncryption",
+    "1.2.840.10040.4.3": "dsa-with-sha1",
+    "2.16.840.1.101.3.4.3.2": "dsa-with-sha256",
+    "1.2.840.10045.4.1": "ecdsa-with-SHA1",
+    "1.2.840.10045.4.3.2": "ecdsa-with-SHA256",
+    "1.2.840.10045.4.3.3": "ecdsa-with-SHA384",
+    "1.2.840.10045.4.3.4": "ecdsa-with-SHA512",
+}
+
+# The thumbprints computed for every certificate; certificates are deduplicated on the first one
+THUMBPRINT_METHODS = ("SHA256", "SHA1")
+
+_SEQUENCE = 0x30
+_INTEGER = 0x02
+_BIT_STRING = 0x03
+_OID = 0x06
+_UTC_TIME = 0x17
+_VERSION = 0xA0
+
+# ASN.1 string types of attribute values
+_STRING_ENCODINGS = {
+    0x0C: "utf-8",  # UTF8String
+    0x12: "ascii",  # NumericString
+    0x13: "ascii",  # PrintableString
+    0x14: "latin-1",  # TeletexString
+    0x16: "ascii",  # IA5String
+    0x1A: "ascii",  # VisibleString
+    0x1C: "utf-32-be",  # UniversalString
+    0x1E: "utf-16-be",  # BMPString
+}
+
+_PEM = re.compile(
+    rb"-----BEGIN (?:X509 |TRUSTED )?CERTIFICATE-----(.*?)-----END (?:X509 |TRUSTED )?CERTIFICATE-----",
+    re.DOTALL,
+)
+_PEM_MARKER = b"-----BEGIN"
+_ESCAPED = re.compile(r'([,+"\\<>;])')
+
+
+def read_tlv(view, offset, end=None):
+    """
+    Read the header of the DER element at offset.
+    :return: (tag, content start, content end)
+    """
+    end = len(view) if end is None else end
+    if offset + 2 > end:
+        raise ValueError("Truncated DER element")
+    tag = view[offset]
+    length = view[offset + 1]
+    offset += 2
+    if length & 0x80:
+        count = length & 0x7F
+        if not 0 < count <= 4 or offset + count > end:
+            raise ValueError("Unsupported DER length")
+        length = int.from_bytes(view[offset : offset + count], "big")
+        offset += count
+    if offset + length > end:
+        raise ValueError("Truncated DER element")
+    return tag, offset, offset + length
+
+
+def iter_tlv(view, start, end):
+    """
+    Yield (tag, content start, content end) for the elements between start and end (e.g. in a SEQUENCE).
+    """
+    while start < end:
+        tag, content_start, start = read_tlv(view, start, end)
+        yield tag, content_start, start
+
+
+def _expect(view, offset, end, tag):
+    found, start, stop = read_tlv(view, offset, end)
+    if found != tag:
+        raise ValueError(f"Expected DER tag 0x{tag:02x}, found 0x{found:02x}")
+    return start, stop
+
+
+@lru_cache(maxsize=1024)
+def decode_oid(data):
+    """
+    Decode the content of an OBJECT IDENTIFIER into its dotted form.
+    """
+    values = []
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            values.append(value)
+            value = 0
+    if not values:
+        raise ValueError("Empty object identifier")
+    first = min(values[0] // 40, 2)
+    return ".".join(map(str, [first, values[0] - 40 * first] + values[1:]))
+
+
+def _oid_name(view, start, end):
+    oid = decode_oid(bytes(view[start:end]))
+    return OIDS.get(oid, oid)
+
+
+def _algorithm(view, start, end):
+    """
+    The name of the algorithm of an AlgorithmIdentifier.
+    """
+    oid_start, oid_end = _expect(view, start, end, _OID)
+    return _oid_name(view, oid_start, oid_end)
+
+
+def _hex_integer(view, start, end):
+    return format(int.from_bytes(view[start:end], "big"), "x")
+
+
+def _attribute_value(view, tag, start, end):
+    encoding = _STRING_ENCODINGS.get(tag)
+    if encoding is None:
+        return "#" + bytes(view[start:end]).hex()
+    value = _ESCAPED.sub(r"\\\1", str(view[start:end], encoding, "replace"))
+    if value.startswith(("#", " ")):
+        value = "\\" + value
+    if value.endswith(" "):
+        value = value[:-1] + "\\ "
+    return value
+
+
+def decode_name(view, start, end):
+    """
+    The RFC 4514 string of a Name (e.g. "CN=example.com,O=Example,C=US").
+    """
+    rdns = []
+    for _, set_start, set_end in iter_tlv(view, start, end):
+        attributes = []
+        for _, attribute_start, attribute_end in iter_tlv(view, set_start, set_end):
+            oid_start, oid_end = _expect(view, attribute_start, attribute_end, _OID)
+            tag, value_start, value_end = read_tlv(view, oid_end, attribute_end)
+            attributes.append(
+                _oid_name(view, oid_start, oid_end)
+                + "="
+                + _attribute_value(view, tag, value_start, value_end)
+            )
+        rdns.append("+".join(attributes))
+    return ",".join(reversed(rdns))
+
+
+def decode_time(tag, text):
+    """
+    Decode a UTCTime or GeneralizedTime into a UTC datetime.
+    """
+    if tag == _UTC_TIME:
+        year = int(text[:2])
+        year += 1900 if year >= 50 else 2000
+        text = text[2:]
+    else:
+        year = int(text[:4])
+        text = text[4:]
+    seconds = int(text[8:10]) if text[8:10].isdigit() else 0
+    return datetime(
+        year,
+        int(text[0:2]),
+        int(text[2:4]),
+        int(text[4:6]),
+        int(text[6:8]),
+        seconds,
+        tzinfo=timezone.utc,
+    )
+
+
+def parse_certificate(der):
+    """
+    Parse a DER encoded certificate, without copying it, into a plain dictionary: version, serial_number (hex),
+    signature_algorithm, signature (hex), issuer, subject, not_before, not_after, public_key_algorithm,
+    modulus (hex) and exponent (RSA keys only), is_self_signed (same issuer and subject, the signature is not
+    verified), thumbprints ({method: hex digest} of the whole certificate, for THUMBPRINT_METHODS) and
+    issuer_hash/subject_hash (SHA256 hex digests of the DER encoded names).
+    :param der: The certificate (bytes, memoryview, mmap, ...)
+    """
+    view = memoryview(der)
+    tag, start, end = read_tlv(view, 0)
+    if tag != _SEQUENCE:
+        raise ValueError("Not a DER certificate")
+    try:
+        return _parse_certificate(view, start, end)
+    except StopIteration:
+        raise ValueError("Truncated certificate") from None
+
+
+def _parse_certificate(view, start, end):
+    certificate = view[:end]
+    tbs_start, tbs_end = _expect(view, start, end, _SEQUENCE)
+    elements = iter_tlv(view, tbs_start, tbs_end)
+
+    tag, element_start, element_end = next(elements)
+    version = 1
+    if tag == _VERSION:
+        version_start, version_end = _expect(view, element_start, element_end, _INTEGER)
+        version += int.from_bytes(view[version_start:version_end], "big")
+        tag, element_start, element_end = next(elements)
+    if tag != _INTEGER:
+        raise ValueError("Missing certificate serial number")
+    record = {
+        "version": str(version),
+        "serial_number": _hex_integer(view, element_start, element_end),
+    }
+    next(elements)  # The signature algorithm, repeated after tbsCertificate
+    names = []
+    for key in ("issuer", "validity", "subject"):
+        tag, element_start, element_end = next(elements)
+        if key == "validity":
+            times = list(iter_tlv(view, element_start, element_end))
+            record["not_before"], record["not_after"] = [
+                decode_time(tag, str(view[time_start:time_end], "ascii"))
+                for tag, time_start, time_end in times[:2]
+            ]
+            continue
+        names.append(view[element_start:element_end])
+        record[key] = decode_name(view, element_start, element_end)
+        record[f"{key}_hash"] = hashlib.sha256(
+            view[element_start:element_end]
+        ).hexdigest()
+    record["is_self_signed"] = names[0] == names[1]
+
+    _, key_info_start, key_info_end = next(elements)
+    algorithm_start, algorithm_end = _expect(
+        view, key_info_start, key_info_end, _SEQUENCE
+    )
+    record["public_key_algorithm"] = _algorithm(view, algorithm_start, algorithm_end)
+    record["modulus"] = record["exponent"] = None
+    if record["public_key_algorithm"] == "rsaEncryption":
+        key_start, key_end = _expect(view, algorithm_end, key_info_end, _BIT_STRING)
+        rsa_start, rsa_end = _expect(view, key_start + 1, key_end, _SEQUENCE)
+        modulus_start, modulus_end = _expect(view, rsa_start, rsa_end, _INTEGER)
+        exponent_start, exponent_end = _expect(view, modulus_end, rsa_end, _INTEGER)
+        record["modulus"] = _hex_integer(view, modulus_start, modulus_end)
+        record["exponent"] = int.from_bytes(view[exponent_start:exponent_end], "big")
+
+    algorithm_start, algorithm_end = _expect(view, tbs_end, end, _SEQUENCE)
+    record["signature_algorithm"] = _algorithm(view, algorithm_start, algorithm_end)
+    signature_start, signature_end = _expect(view, algorithm_end, end, _BIT_STRING)
+    record["signature"] = bytes(view[signature_start + 1 : signature_end]).hex()
+    record["thumbprints"] = {
+        method: hashlib.new(method, certificate).hexdigest()
+        for method in THUMBPRINT_METHODS
+    }
+    return record
+
+
+def iter_der(data):
+    """
+    Yield the DER encoded certificates of DER data (one or more concatenated certificates) or of PEM data (every
+    CERTIFICATE block, with any text around them).
+    """
+    view = memoryview(data)
+    if view[:1] != b"\x30":
+        for match in _PEM.finditer(data):
+            yield memoryview(binascii.a2b_base64(match.group(1)))
+        return
+    offset = 0
+    while offset < len(view):
+        _, _, end = read_tlv(view, offset)
+        yield view[offset:end]
+        offset = end
+
+
+def _parse_units(units):
+    """
+    Parse the certificates of (path, start, end) byte ranges, dropping duplicates.
+    :return: (records, errors)
+    """
+    records = []
+    errors = []
+    seen = set()
+    for path, start, end in units:
+        try:
+            with open(path, "rb") as fp:
+                fp.seek(start)
+                data = fp.read(end - start)
+        except OSError as error:
+            errors.append(error)
+            continue
+        try:
+            for der in iter_der(data):
+                try:
+                    record = parse_certificate(der)
+                except ValueError as error:
+                    errors.append(ValueError(f"{path}: {error}"))
+                    continue
+                thumbprint = record["thumbprints"][THUMBPRINT_METHODS[0]]
+                if thumbprint not in seen:
+                    seen.add(thumbprint)
+                    record["path"] = os.fspath(path)
+                    records.append(record)
+        except ValueError as error:
+            errors.append(ValueError(f"{path}: {error}"))
+    return records, errors
+
+
+def certificate_facet(record, thumbprint_method="SHA1"):
+    """
+    An X509CertificateFacet from a parsed certificate (see parse_certificate()).
+    :param thumbprint_method: The thumbprint recorded as thumbprintHash (one of THUMBPRINT_METHODS)
+    """
+    return FacetX509Certificate(
+        is_self_signed=record["is_self_signed"],
+        issuer=record["issuer"],
+        serial_number=record["serial_number"],
+        signature=record["signature"],
+        signature_algo=record["signature_algorithm"],
+        subject=record["subject"],
+        subject_pk_algo=record["public_key_algorithm"],
+        subject_pk_exponent=record["exponent"],
+        subject_pk_modulus=record["modulus"],
+        valid_not_before=record["not_before"],
+        validity_not_after=record["not_after"],
+        version=record["version"],
+        issuer_hash=("SHA256", record["issuer_hash"]),
+        subject_hash=("SHA256", record["subject_hash"]),
+        thumbprint_hash=(thumbprint_method, record["thumbprints"][thumbprint_method]),
+    )
+
+
+class CertificateParser:
+    def __init__(
+        self,
+        workers=None,
+        chunk_size=CHUNK_SIZE,
+        mp_context=None,
+        thumbprint_method="SHA1",
+        certificates=None,
+    ):
+        """
+        Maps PEM and DER certificate files (certificate stores, bundles or certificates extracted from network
+        captures) into X509Certificate observables with an X509CertificateFacet, one per distinct certificate.
+        Files are parsed on a pool of processes, chunk_size bytes at a time (large PEM bundles are split between
+        certificates); only plain dictionaries are sent back from the workers and observables are created in the
+        calling process. Certificates are deduplicated on their SHA256 thumbprint.
+        :param workers: The number of worker processes (defaults to the number of CPUs)
+        :param chunk_size: The approximate number of bytes handed to a worker at a time
+        :param mp_context: A multiprocessing context for the pool
+        :param thumbprint_method: The thumbprint recorded as thumbprintHash (one of THUMBPRINT_METHODS)
+        :param certificates: An Interner of certificates (keyed by SHA256 thumbprint), to share certificates between
+                             parsers
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self.thumbprint_method = thumbprint_method
+        self.certificates = (
+            certificates if certificates is not None else Interner(self._certificate)
+        )
+        self.errors = []
+
+    def _certificate(self, thumbprint, record):
+        return X509Certificate(facets=certificate_facet(record, self.thumbprint_method))
+
+    def units(self, paths):
+        """
+        Yield the (path, start, end) byte ranges of certificate files; PEM files larger than chunk_size are split
+        at the beginning of a certificate.
+        """
+        for path in paths:
+            size = os.path.getsize(path)
+            if size <= self.chunk_size:
+                yield path, 0, size
+                continue
+            with open(path, "rb") as fp:
+                buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            with buffer:
+                starts = [0]
+                position = self.chunk_size
+                # DER files (starting with a SEQUENCE) are not split
+                while buffer[:1] != b"\x30" and position < size:
+                    found = buffer.find(_PEM_MARKER, position)
+                    if found == -1:
+                        break
+                    starts.append(found)
+                    position = found + self.chunk_size
+            yield from zip([path] * len(starts), starts, starts[1:] + [size])
+
+    def _batches(self, paths):
+        batch = []
+        batch_size = 0
+        for unit in self.units(paths):
+            batch.append(unit)
+            batch_size += unit[2] - unit[1]
+            if batch_size >= self.chunk_size:
+                yield batch
+                batch = []
+                batch_size = 0
+        if batch:
+            yield batch
+
+    def iter_records(self, paths):
+        """
+        Yield a plain dictionary per certificate (see parse_certificate()), in file order. Duplicates within a
+        batch are dropped by the workers; errors are recorded in errors.
+        """
+        batches = list(self._batches(paths))
+        if len(batches) <= 1:
+            results = map(_parse_units, batches)
+        else:
+            workers = min(self.workers, len(batches))
+            executor = ProcessPoolExecutor(workers, mp_context=self.mp_context)
+            results = bounded_map(
+                executor, _parse_units, batches, PENDING_PER_WORKER * workers
+            )
+        try:
+            for records, errors in results:
+                self.errors.extend(errors)
+                yield from records
+        finally:
+            if len(batches) > 1:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def iter_objects(self, paths):
+        """
+        Yield an X509Certificate observable per distinct certificate; certificates already interned (e.g. by another
+        parser sharing the Interner) are not produced again.
+        """
+        created = []
+        for record in self.iter_records(paths):
+            self.certificates.get(
+                record["thumbprints"][THUMBPRINT_METHODS[0]], created, record
+            )
+            if created:
+                yield from created
+                created.clear()
+
+    def ingest(self, paths, sink):
+        """
+        Stream the X509Certificate observables of certificate files into a Bundle, BundleWriter or
+        ConcurrentAppender.
+        :return: The number of objects produced
+        """
+        append = sink_function(sink)
+        count = 0
+        for obj in self.iter_objects(paths):
+            append(obj)
+            count += 1
+        return count
@@ -0,0 +1,370 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from .base import FacetEntity, LazyValue, json_default
+from .payload import PayloadReference
+from .stream import OBJECT_KEYS, BundleWriter
+
+# The FacetEntity setters timed
+SETTERS = (
+    "_str_vars",
+    "_int_vars",
+    "_float_vars",
+    "_bool_vars",
+    "_datetime_vars",
+    "_nonegative_int_vars",
+    "_node_reference_vars",
+    "_str_list_vars",
+)
+
+_active = None
+_last = None
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+class _CountingFile:
+    """
+    A file wrapper counting the characters written (bytes, since the JSON written is ASCII-escaped).
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.written = 0
+
+    def write(self, text):
+        self.written += len(text)
+        return self.fp.write(text)
+
+
+def _payload_default(extra):
+    """
+    A json.dumps() default hook sizing file-backed payloads from their length rather than reading them.
+    """
+
+    def default(value):
+        if isinstance(value, PayloadReference):
+            extra[0] += 4 * ((value.size() + 2) // 3)
+            return ""
+        if isinstance(value, LazyValue):
+            return value.to_json()
+        return json_default(value)
+
+    return default
+
+
+def _compact_size(value):
+    extra = [0]
+    text = json.dumps(value, separators=(",", ":"), default=_payload_default(extra))
+    return len(text) + extra[0]
+
+
+class Instrumentation:
+    def __init__(self, breakdown=True):
+        """
+        Runtime metrics of the library: the entities constructed per class (counted in FacetEntity.__init__, which
+        every entity goes through) and the time spent in their constructors, the calls of and time spent in the
+        _*_vars setters, and the time spent serializing and the bytes serialized per @type (by str() and
+        stream.BundleWriter).
+        Use enable() to start collecting: the methods are only wrapped while enabled, so that instrumentation costs
+        nothing otherwise. Constructor times include the setters and the entities constructed inside constructors.
+        :param breakdown: Also account the (compact JSON) bytes of the objects of the bundles serialized and of the
+                          facets of the objects serialized
+        """
+        self.breakdown = breakdown
+        self.constructed = dict()
+        self.setters = dict()
+        self.serialized = dict()
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._originals = []
+        self._exporter = None
+        self._stop = threading.Event()
+
+    # Recording
+
+    def _add(self, table, key, seconds, **counts):
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = dict.fromkeys(counts, 0)
+                entry["seconds"] = 0.0
+            for name, count in counts.items():
+                entry[name] = entry.get(name, 0) + count
+            entry["seconds"] += seconds
+
+    def _account_bytes(self, value, size, seconds):
+        """
+        Account a serialized value of size bytes: a top-level object, or a bundle (whose objects are then
+        accounted from their compact JSON).
+        """
+        kind = value.get("@type") if isinstance(value, dict) else None
+        self._add(self.serialized, kind or "(property)", seconds, count=1, bytes=size)
+        if kind is None or not self.breakdown:
+            return
+        for key in OBJECT_KEYS:
+            for obj in value.get(key) or []:
+                if isinstance(obj, dict):
+                    self._add(
+                        self.serialized,
+                        obj.get("@type"),
+                        0.0,
+                        count=1,
+                        bytes=_compact_size(obj),
+                    )
+                    self._account_facets(obj)
+        if not any(value.get(key) for key in OBJECT_KEYS):
+            self._account_facets(value)
+
+    def _account_facets(self, obj):
+        for facet in obj.get("uco-core:hasFacet") or []:
+            if isinstance(facet, dict):
+                self._add(
+                    self.serialized,
+                    facet.get("@type"),
+                    0.0,
+                    count=1,
+                    bytes=_compact_size(facet),
+                )
+
+    # Wrappers
+
+    def _wrap_base_init(self, function):
+        instrumentation = self
+
+        @wraps(function)
+        def __init__(entity, *args, **kwargs):
+            instrumentation._add(
+                instrumentation.constructed, type(entity).__name__, 0.0, count=1
+            )
+            function(entity, *args, **kwargs)
+
+        return __init__
+
+    def _wrap_init(self, function):
+        instrumentation = self
+        local = self._local
+
+        @wraps(function)
+        def __init__(entity, *args, **kwargs):
+            # Only the outermost constructor (not the ones of the base classes it calls) is timed
+            if getattr(local, "constructing", False):
+                return function(entity, *args, **kwargs)
+            local.constructing = True
+            start = time.perf_counter()
+            try:
+                return function(entity, *args, **kwargs)
+            finally:
+                local.constructing = False
+                seconds = time.perf_counter() - start
+                with instrumentation._lock:
+                    entry = instrumentation.constructed.setdefault(
+                        type(entity).__name__, {"count": 0, "seconds": 0.0}
+                    )
+                    entry["seconds"] += seconds
+
+        return __init__
+
+    def _wrap_setter(self, name, function):
+        instrumentation = self
+
+        @wraps(function)
+        def setter(entity, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(entity, **kwargs)
+            finally:
+                instrumentation._add(
+                    instrumentation.setters,
+                    name,
+                    time.perf_counter() - start,
+                    calls=1,
+                )
+
+        return setter
+
+    def _wrap_str(self, function):
+        instrumentation = self
+
+        @wraps(function)
+        def __str__(entity):
+            start = time.perf_counter()
+            text = function(entity)
+            instrumentation._account_bytes(
+                entity, len(text), time.perf_counter() - start
+            )
+            return text
+
+        return __str__
+
+    def _wrap_write_value(self, function):
+        instrumentation = self
+
+        @wraps(function)
+        def _write_value(writer, value, level):
+            fp = writer.fp
+            writer.fp = counting = _CountingFile(fp)
+            start = time.perf_counter()
+            try:
+                return function(writer, value, level)
+            finally:
+                writer.fp = fp
+                instrumentation._account_bytes(
+                    value, counting.written, time.perf_counter() - start
+                )
+
+        return _write_value
+
+    def _wrap_init_subclass(self):
+        instrumentation = self
+
+        def __init_subclass__(cls, **kwargs):
+            super(FacetEntity, cls).__init_subclass__(**kwargs)
+            instrumentation._wrap_class(cls)
+
+        return classmethod(__init_subclass__)
+
+    def _wrap_class(self, cls):
+        if "__init__" in cls.__dict__:
+            self._patch(cls, "__init__", self._wrap_init(cls.__dict__["__init__"]))
+
+    def _patch(self, owner, name, wrapper):
+        # None for the attributes the owner did not define, deleted again by uninstall()
+        self._originals.append((owner, name, owner.__dict__.get(name)))
+        setattr(owner, name, wrapper)
+
+    def install(self):
+        """
+        Wrap the constructors of the entity classes, the setters and the serializers. Entity classes defined while
+        installed are wrapped as they are defined (through FacetEntity.__init_subclass__).
+        """
+        self._patch(FacetEntity, "__init__", self._wrap_base_init(FacetEntity.__init__))
+        for cls in set(_subclasses(FacetEntity)):
+            self._wrap_class(cls)
+        self._patch(FacetEntity, "__init_subclass__", self._wrap_init_subclass())
+        for name in SETTERS:
+            self._patch(
+                FacetEntity, name, self._wrap_setter(name, FacetEntity.__dict__[name])
+            )
+        self._patch(FacetEntity, "__str__", self._wrap_str(FacetEntity.__str__))
+        self._patch(
+            BundleWriter,
+            "_write_value",
+            self._wrap_write_value(BundleWriter._write_value),
+        )
+
+    def uninstall(self):
+        self.stop_snapshots()
+        while self._originals:
+            owner, name, original = self._originals.pop()
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+    # Reporting
+
+    def snapshot(self):
+        """
+        The metrics collected so far: {"time", "elapsed" (seconds since created), "constructed": {class: {"count",
+        "seconds"}}, "setters": {setter: {"calls", "seconds"}}, "serialized": {@type: {"count", "bytes",
+        "seconds"}}}. Serialization times are those of top-level values (objects, or whole bundles).
+        """
+        with self._lock:
+            return {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "elapsed": time.time() - self.started,
+                "constructed": {k: dict(v) for k, v in self.constructed.items()},
+                "setters": {k: dict(v) for k, v in self.setters.items()},
+                "serialized": {str(k): dict(v) for k, v in self.serialized.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self.constructed.clear()
+            self.setters.clear()
+            self.serialized.clear()
+            self.started = time.time()
+
+    def start_snapshots(self, sink, interval=60.0):
+        """
+        Export a snapshot every interval seconds (and a last one when stopped), from a background thread.
+        :param sink: A path, to which the snapshots are appended as JSON lines, or a callable taking a snapshot
+        """
+        self.stop_snapshots()
+        if not callable(sink):
+            path = sink
+
+            def sink(snapshot):
+                with open(path, "a", encoding="utf-8") as fp:
+                    fp.write(json.dumps(snapshot) + "\n")
+
+        def export():
+            while not self._stop.wait(interval):
+                sink(self.snapshot())
+            sink(self.snapshot())
+
+        self._stop.clear()
+        self._exporter = threading.Thread(target=export, daemon=True)
+        self._exporter.start()
+
+    def stop_snapshots(self):
+        if self._exporter is not None:
+            self._stop.set()
+            self._exporter.join()
+            self._exporter = None
+
+
+def enable(breakdown=True):
+    """
+    Start collecting metrics (see Instrumentation), unless already enabled.
+    :return: The active Instrumentation
+    """
+    global _active, _last
+    if _active is None:
+        _active = _last = Instrumentation(breakdown)
+        _active.install()
+    return _active
+
+
+def disable():
+    """
+    Stop collecting metrics; the last Instrumentation remains available through current().
+    """
+    global _active
+    if _active is not None:
+        _active.uninstall()
+        _active = None
+
+
+def current():
+    """
+    The active (or, once disabled, the last) Instrumentation, or None if it was never enabled.
+    """
+    return _last
+
+
+class instrumented:
+    """
+    A context manager enabling the instrumentation, and disabling it on exit if it was not enabled before.
+    """
+
+    def __init__(self, breakdown=True):
+        self.breakdown = breakdown
+        self._enabled = False
+
+    def __enter__(self):
+        self._enabled = _active is None
+        return enable(self.breakdown)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._enabled:
+            disable()
@@ -0,0 +1,159 @@
+import json
+import os
+
+from .base import FacetEntity, GeneratedList, ObjectEntity, json_default
+from .stream import OBJECT_KEYS, BundleWriter
+
+
+def _encode(record):
+    return (
+        json.dumps(record, separators=(",", ":"), default=json_default) + "\n"
+    ).encode("utf-8")
+
+
+class BundleJournal:
+    def __init__(self, bundle, path, fsync=False):
+        """
+        Records the mutations of a Bundle into an append-only journal file (one JSON record per line).
+        Mutations are tracked per top-level object: new objects, appended facets and fields changed through the
+        _*_vars setters mark their object as dirty, and flush() appends the current state of the dirty objects only.
+        The cost of a flush is therefore proportional to what changed since the previous flush, not to the size of
+        the bundle. compact() folds the journal into a full case file.
+        :param bundle: The Bundle to record
+        :param path: The journal file (appended to if it already exists)
+        :param fsync: Force the journal to disk on every flush
+        """
+        self.bundle = bundle
+        self.path = path
+        self.fsync = fsync
+        self._keys = dict()
+        self._dirty = dict()
+        self._fp = open(path, "ab")
+        self._closed = False
+
+        bundle._journal = self
+        bundle._journal_root = bundle
+        self._dirty[id(bundle)] = bundle
+        for key in OBJECT_KEYS:
+            for obj in bundle.get(key) or []:
+                self._attach_object(obj, key)
+
+    def _attach(self, entity, root):
+        entity._journal = self
+        entity._journal_root = root
+        for value in entity.values():
+            if isinstance(value, GeneratedList):
+                continue  # Generated values hold no entities
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, FacetEntity) and item._journal_root is not item:
+                    self._attach(item, root)
+
+    def _attach_object(self, obj, key):
+        self._keys[id(obj)] = key
+        self._attach(obj, obj)
+        self._dirty[id(obj)] = obj
+
+    def changed(self, entity, key=None, children=()):
+        """
+        Called by FacetEntity._changed() whenever an attached entity is mutated.
+        """
+        if self._closed:
+            return
+        if entity is self.bundle and key in OBJECT_KEYS:
+            for child in children:
+                if isinstance(child, ObjectEntity):
+                    self._attach_object(child, key)
+            return
+        root = entity._journal_root
+        if root is not self.bundle and id(root) not in self._keys:
+            return  # Removed from the bundle, or replaced by a copy
+        for child in children:
+            if isinstance(child, FacetEntity) and child._journal_root is not child:
+                self._attach(child, root)
+        self._dirty[id(root)] = root
+
+    def removed(self, obj, key):
+        """
+        Called by Bundle.remove() for every object removed: a removal record is appended to the journal (and forced
+        to disk by the next flush), and the object is not recorded anymore.
+        """
+        if self._closed:
+            return
+        self._keys.pop(id(obj), None)
+        self._dirty.pop(id(obj), None)
+        self._fp.write(_encode({"key": key, "removed": obj.get("@id")}))
+
+    def replaced(self, obj, copy, key):
+        """
+        Called by Bundle.edit() when an object shared with a snapshot is replaced by its copy, which is recorded
+        instead.
+        """
+        if self._closed:
+            return
+        self._keys.pop(id(obj), None)
+        self._dirty.pop(id(obj), None)
+        self._attach_object(copy, key)
+
+    def flush(self):
+        """
+        Append the current state of every object changed since the last flush to the journal.
+        :return: The number of records written
+        """
+        dirty, self._dirty = self._dirty, dict()
+        for root in dirty.values():
+            if root is self.bundle:
+                header = {k: v for k, v in root.items() if k not in OBJECT_KEYS}
+                self._fp.write(_encode({"header": header}))
+            else:
+                self._fp.write(_encode({"key": self._keys[id(root)], "object": root}))
+        self._fp.flush()
+        if self.fsync:
+            os.fsync(self._fp.fileno())
+        return len(dirty)
+
+    def compact(self, destination, indent=None):
+        """
+        Flush the journal and fold it into a full case file.
+        """
+        self.flush()
+        return compact_journal(self.path, destination, indent=indent)
+
+    def close(self):
+        """
+        Flush the journal and stop recording.
+        """
+        if not self._closed:
+            self.flush()
+            self._fp.close()
+            self._closed = True
+            self.bundle._journal = None
+
+
+def compact_journal(journal_path, destination, indent=None):
+    """
+    Fold a journal into a case file: the latest record of every object wins (a removal record drops the object) and
+    objects keep the order in which they first appeared. Only the offsets of the records are held in memory.
+    :return: The number of objects written
+    """
+    header = dict()
+    latest = {key: dict() for key in OBJECT_KEYS}
+    with open(journal_path, "rb") as fp:
+        offset = 0
+        for line in iter(fp.readline, b""):
+            if not line.endswith(b"\n"):
+                break  # Ignore a record truncated by a crash.
+            record = json.loads(line)
+            if "header" in record:
+                header = record["header"]
+            elif "removed" in record:
+                latest[record["key"]].pop(record["removed"], None)
+            else:
+                latest[record["key"]][record["object"]["@id"]] = offset
+            offset += len(line)
+
+        with BundleWriter(destination, header, indent=indent) as writer:
+            for key, offsets in latest.items():
+                for offset in offsets.values():
+                    fp.seek(offset)
+                    writer.write(json.loads(fp.readline())["object"], key=key)
+            return writer.objects_written
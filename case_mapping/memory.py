@@ -0,0 +1,208 @@
+import heapq
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import chain
+
+from .base import GeneratedList, LazyValue
+
+_SEQUENCES = (list, tuple, set, frozenset)
+# The types of the values holding no other objects
+_LEAVES = frozenset(
+    (str, bytes, int, float, complex, bool, type(None), datetime, date, Decimal)
+)
+_getrefcount = getattr(sys, "getrefcount", lambda value: 1 << 30)
+
+
+def _references(value):
+    return _getrefcount(value)
+
+
+def _calibrate():
+    """
+    The reference count of a value held by a single container, as seen by _first_visit() called from a loop over the
+    container: such a value can't be reached twice, so the walk does not need to remember it.
+    """
+    for item in [object()]:
+        return _references(item)
+
+
+_UNSHARED = _calibrate()
+
+
+def _first_visit(value, seen):
+    """
+    Whether a value (the loop variable of a loop over its container) is reached for the first time.
+    """
+    if _getrefcount(value) <= _UNSHARED:
+        return True
+    address = id(value)
+    if address in seen:
+        return False
+    seen.add(address)
+    return True
+
+
+def _attributes(value):
+    """
+    The instance attributes of an object, and its attribute dictionary.
+    """
+    namespace = getattr(value, "__dict__", None)
+    if namespace is not None:
+        yield namespace
+    for cls in type(value).__mro__:
+        slots = cls.__dict__.get("__slots__", ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            attribute = getattr(value, slot, None)
+            if attribute is not None:
+                yield attribute
+
+
+def _walks_attributes(value):
+    # The library's own objects (lazy values, thread graphs...) are walked; others are counted by their size only
+    return isinstance(value, LazyValue) or type(value).__module__.startswith(
+        "case_mapping."
+    )
+
+
+def _is_entity(value):
+    # Typed literals ({"@type": "xsd:dateTime", "@value": ...}) are values, not nodes
+    return isinstance(value.get("@type"), str) and "@value" not in value
+
+
+def memory_report(root, largest=10, allocations=0):
+    """
+    Estimate the memory retained by an entity (usually a Bundle) by walking its object graph once, with
+    sys.getsizeof(). Every Python object is counted once, however many times it is referenced (e.g. strings shared
+    through an ingest.common.Interner, or objects shared with a snapshot), and is attributed to the first node
+    holding it. Lazy values (payload references) are counted by their attributes, not by the data they generate on
+    serialization, and the attributes of entities (e.g. the ThreadGraph of a message thread facet) are counted too.
+    :param root: The entity
+    :param largest: The number of largest top-level objects reported
+    :param allocations: The number of top allocation sites reported from a tracemalloc snapshot (tracemalloc must
+                        have been started before the objects were created)
+    :return: {"seconds", "bytes", "objects" (the number of Python objects), "types": {@type: {"count", "bytes"}},
+             "keys": {key: bytes}, "largest": [{"@id", "@type", "bytes"}], "allocations": [{"file", "line", "bytes",
+             "count"}] or None}. The bytes of a @type are those of its nodes, without the nodes they hold (facets,
+             nested nodes), and the bytes of a key are those of its values, without the nodes they hold; the dict
+             structures of the nodes themselves are accounted as "(node)"
+    """
+    snapshot = None
+    if allocations and tracemalloc.is_tracing():
+        # Taken first, so that it does not include the walk itself
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+    start = time.perf_counter()
+    getsizeof = sys.getsizeof
+    seen = {id(root)}
+    types, keys = dict(), dict()
+    tops = []
+    total = objects = 0
+    # The containers to walk: (container, @type of the node holding it, key holding it, index of the top-level object
+    # holding it). The leaves (strings, numbers...) are counted as their containers are walked.
+    stack = [(root, None, "(node)", None)]
+    while stack:
+        value, kind, key, top = stack.pop()
+        size = getsizeof(value)
+        objects += 1
+        if isinstance(value, dict):
+            if _is_entity(value):
+                kind = value["@type"]
+                entry = types.get(kind)
+                if entry is None:
+                    entry = types[kind] = {"count": 0, "bytes": 0}
+                entry["count"] += 1
+                if top is None and value is not root:
+                    top = len(tops)
+                    tops.append([0, value])
+                keys["(node)"] = keys.get("(node)", 0) + size
+                for name in value:
+                    item = value[name]
+                    held = 0
+                    if _first_visit(name, seen):
+                        held += getsizeof(name)
+                        objects += 1
+                    if type(item) in _LEAVES:
+                        if _first_visit(item, seen):
+                            held += getsizeof(item)
+                            objects += 1
+                    elif _first_visit(item, seen):
+                        stack.append((item, kind, name, top))
+                    if held:
+                        keys[name] = keys.get(name, 0) + held
+                        size += held
+                if type(value) is not dict:
+                    for item in _attributes(value):
+                        if _first_visit(item, seen):
+                            stack.append((item, kind, "(attributes)", top))
+            else:
+                held = size
+                for name in value:
+                    item = value[name]
+                    if _first_visit(name, seen):
+                        held += getsizeof(name)
+                        objects += 1
+                    if type(item) in _LEAVES:
+                        if _first_visit(item, seen):
+                            held += getsizeof(item)
+                            objects += 1
+                    elif _first_visit(item, seen):
+                        stack.append((item, kind, key, top))
+                keys[key] = keys.get(key, 0) + held
+                size = held
+        else:
+            if isinstance(value, GeneratedList):
+                # The storage and state of the list, not the items it would generate
+                items = chain(list.__iter__(value), _attributes(value))
+            elif isinstance(value, _SEQUENCES):
+                items = value
+            elif _walks_attributes(value):
+                items = _attributes(value)
+            else:
+                items = ()
+            held = size
+            for item in items:
+                if type(item) in _LEAVES:
+                    if _first_visit(item, seen):
+                        held += getsizeof(item)
+                        objects += 1
+                elif _first_visit(item, seen):
+                    stack.append((item, kind, key, top))
+            keys[key] = keys.get(key, 0) + held
+            size = held
+
+        total += size
+        if kind is not None:
+            types[kind]["bytes"] += size
+        if top is not None:
+            tops[top][0] += size
+
+    report = {
+        "seconds": time.perf_counter() - start,
+        "bytes": total,
+        "objects": objects,
+        "types": dict(
+            sorted(types.items(), key=lambda item: item[1]["bytes"], reverse=True)
+        ),
+        "keys": dict(sorted(keys.items(), key=lambda item: item[1], reverse=True)),
+        "largest": [
+            {"@id": node.get("@id"), "@type": node["@type"], "bytes": size}
+            for size, node in heapq.nlargest(largest, tops, key=lambda top: top[0])
+        ],
+        "allocations": None,
+    }
+    if snapshot is not None:
+        report["allocations"] = [
+            {
+                "file": statistic.traceback[0].filename,
+                "line": statistic.traceback[0].lineno,
+                "bytes": statistic.size,
+                "count": statistic.count,
+            }
+            for statistic in snapshot.statistics("lineno")[:allocations]
+        ]
+    return report
@@ -0,0 +1,191 @@
+import base64
+import codecs
+import hashlib
+import json
+import os
+import tempfile
+
+from .base import LazyValue
+
+# A multiple of 3 bytes, so that the base64 encodings of consecutive chunks can simply be concatenated
+CHUNK_SIZE = 3 << 18
+
+
+class PayloadReference(LazyValue):
+    """
+    A data payload (uco-observable:dataPayload) left on disk: a whole file or a byte range of a file (e.g. of an
+    evidence image). It is only read, and base64-encoded chunk by chunk straight into the output, when the entity
+    holding it is written by a stream.BundleWriter; str() and the other serializers materialize it whole. Plain
+    json.dumps() does not know about it: pass default=base.json_default.
+    """
+
+    streamed = True
+
+    def __init__(self, path, offset=0, length=None):
+        """
+        :param path: The file holding the payload
+        :param offset: The offset of the payload in the file
+        :param length: The length of the payload (up to the end of the file when None)
+        """
+        self.path = os.fspath(path)
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return f"PayloadReference({self.path!r}, {self.offset}, {self.length})"
+
+    def _key(self):
+        return self.path, self.offset, self.length
+
+    def __eq__(self, other):
+        return isinstance(other, PayloadReference) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def size(self):
+        """
+        The length of the payload in bytes.
+        """
+        available = max(os.path.getsize(self.path) - self.offset, 0)
+        return available if self.length is None else min(self.length, available)
+
+    def iter_bytes(self, chunk_size=CHUNK_SIZE):
+        """
+        Yield the payload in chunks of chunk_size bytes.
+        """
+        remaining = self.length
+        with open(self.path, "rb") as fp:
+            fp.seek(self.offset)
+            while remaining is None or remaining > 0:
+                chunk = fp.read(
+                    chunk_size if remaining is None else min(chunk_size, remaining)
+                )
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def read(self):
+        return b"".join(self.iter_bytes())
+
+    def to_json(self):
+        return base64.b64encode(self.read()).decode("ascii")
+
+    def iter_json(self):
+        yield '"'
+        for chunk in self.iter_bytes():
+            yield base64.b64encode(chunk).decode("ascii")
+        yield '"'
+
+
+class TextReference(PayloadReference):
+    """
+    A text payload (e.g. the body of an email) left on disk, serialized as a JSON string instead of base64.
+    """
+
+    def __init__(self, path, offset=0, length=None, encoding="utf-8"):
+        super().__init__(path, offset, length)
+        self.encoding = encoding
+
+    def to_json(self):
+        return self.read().decode(self.encoding, "replace")
+
+    def iter_json(self):
+        decoder = codecs.getincrementaldecoder(self.encoding)("replace")
+        yield '"'
+        for chunk in self.iter_bytes():
+            yield json.dumps(decoder.decode(chunk))[1:-1]
+        yield json.dumps(decoder.decode(b"", final=True))[1:-1]
+        yield '"'
+
+
+class BlobStore:
+    def __init__(self, root, algorithm="sha256"):
+        """
+        A content-addressed directory of payloads: each blob is stored once, under its hash, however many times it
+        is added, and is referenced through a PayloadReference.
+        :param root: The directory of the store (created if needed)
+        :param algorithm: The hashlib method naming the blobs
+        """
+        self.root = os.fspath(root)
+        self.algorithm = algorithm
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        """
+        The path of the blob with the given hex digest.
+        """
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def _store(self, write):
+        """
+        Write a blob to a temporary file with write(fp, hasher), then move it to its content address unless an
+        identical blob is already stored.
+        """
+        hasher = hashlib.new(self.algorithm)
+        fd, temporary = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                write(fp, hasher)
+            digest = hasher.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                os.remove(temporary)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return digest
+
+    def put_bytes(self, data):
+        """
+        Store a payload held in memory.
+        :return: A PayloadReference to the stored blob
+        """
+        digest = hashlib.new(self.algorithm, data).hexdigest()
+        if digest not in self:
+
+            def write(fp, hasher):
+                fp.write(data)
+                hasher.update(data)
+
+            self._store(write)
+        return PayloadReference(self.path(digest))
+
+    def put_text(self, text, encoding="utf-8"):
+        """
+        Store a text payload.
+        :return: A TextReference to the stored blob
+        """
+        return TextReference(
+            self.put_bytes(text.encode(encoding)).path, encoding=encoding
+        )
+
+    def put_stream(self, chunks):
+        """
+        Store a payload given as an iterable of byte chunks (e.g. PayloadReference.iter_bytes()), hashing it while
+        it is copied.
+        :return: A PayloadReference to the stored blob
+        """
+
+        def write(fp, hasher):
+            for chunk in chunks:
+                fp.write(chunk)
+                hasher.update(chunk)
+
+        return PayloadReference(self.path(self._store(write)))
+
+    def put_file(self, path, offset=0, length=None):
+        """
+        Store (a byte range of) a file.
+        :return: A PayloadReference to the stored blob
+        """
+        return self.put_stream(PayloadReference(path, offset, length).iter_bytes())
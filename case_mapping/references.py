@@ -0,0 +1,100 @@
+from collections import deque
+
+from .base import LazyValue, OrderedSlots
+from .payload import PayloadReference
+from .stream import OBJECT_KEYS
+
+
+def is_reference(node):
+    """
+    Whether a dictionary is a reference to another node ({"@id"} or {"@id", "@type"}) rather than an inline node.
+    """
+    return "@id" in node and len(node) <= 2 and (len(node) == 1 or "@type" in node)
+
+
+def iter_references(value):
+    """
+    Yield the @id of every reference inside a value (an object, facet, list, ...), in document order.
+    """
+    if isinstance(value, OrderedSlots):
+        yield from value.iter_ids()
+    elif isinstance(value, PayloadReference):  # Payloads never hold references
+        return
+    elif isinstance(value, LazyValue):
+        yield from iter_references(value.to_json())
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_references(item)
+    elif isinstance(value, dict):
+        if is_reference(value):
+            yield value["@id"]
+            return
+        for key, item in value.items():
+            if key != "@id":
+                yield from iter_references(item)
+
+
+class ReferenceGraph:
+    def __init__(self, keep_objects=True):
+        """
+        The reverse references between top-level objects: for every @id, the objects referencing it.
+        :param keep_objects: Keep the objects added, so that ids can be resolved (see resolve())
+        """
+        self.referrers = dict()
+        self.objects = dict() if keep_objects else None
+
+    @classmethod
+    def from_objects(cls, objects, keep_objects=True):
+        graph = cls(keep_objects)
+        for obj in objects:
+            graph.add(obj)
+        return graph
+
+    @classmethod
+    def from_bundle(cls, bundle, keep_objects=True):
+        return cls.from_objects(
+            (obj for key in OBJECT_KEYS for obj in bundle.get(key) or []),
+            keep_objects,
+        )
+
+    def add(self, obj):
+        """
+        Record the references of an object.
+        """
+        _id = obj.get("@id")
+        if self.objects is not None:
+            self.objects[_id] = obj
+        for target in set(iter_references(obj)):
+            if target != _id:
+                self.referrers.setdefault(target, []).append(_id)
+
+    def referrers_of(self, _id):
+        """
+        The ids of the objects referencing _id.
+        """
+        return self.referrers.get(_id, [])
+
+    def linked(self, ids, depth=1):
+        """
+        The ids of the objects referencing any of ids, directly (depth=1) or through up to depth references
+        (e.g. the observable referencing a facet's location, then the relationship referencing that observable).
+        """
+        seen = set(ids)
+        found = []
+        queue = deque((_id, 0) for _id in seen)
+        while queue:
+            _id, level = queue.popleft()
+            if level == depth:
+                continue
+            for referrer in self.referrers_of(_id):
+                if referrer not in seen:
+                    seen.add(referrer)
+                    found.append(referrer)
+                    queue.append((referrer, level + 1))
+        return found
+
+    def resolve(self, ids):
+        """
+        The objects of ids (skipping unknown ids); requires keep_objects.
+        """
+        return [self.objects[_id] for _id in ids if _id in self.objects]
@@ -0,0 +1,236 @@
+import math
+
+# NumPy is optional for the package, but required for the spatial index
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .references import ReferenceGraph
+from .stream import OBJECT_KEYS, iter_case_file
+
+# The mean radius of the Earth, in metres
+EARTH_RADIUS = 6371008.8
+
+_METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+LOCATION_FACET = "uco-location:LatLongCoordinatesFacet"
+
+
+def _coordinates(obj):
+    """
+    The (latitude, longitude) of the first LatLongCoordinatesFacet of an object, or None.
+    """
+    for facet in obj.get("uco-core:hasFacet") or []:
+        if isinstance(facet, dict) and facet.get("@type") == LOCATION_FACET:
+            latitude = facet.get("uco-location:latitude")
+            longitude = facet.get("uco-location:longitude")
+            if latitude is not None and longitude is not None:
+                return float(latitude), float(longitude)
+    return None
+
+
+def _distances(latitude, longitude, latitudes, longitudes):
+    """
+    The great-circle distances, in metres, between a point and arrays of points (in degrees).
+    """
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    latitudes, longitudes = numpy.radians(latitudes), numpy.radians(longitudes)
+    a = (
+        numpy.sin((latitudes - latitude) / 2) ** 2
+        + math.cos(latitude)
+        * numpy.cos(latitudes)
+        * numpy.sin((longitudes - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    def __init__(self, objects, latitude, longitude, cell_size=0.01, references=None):
+        """
+        A grid index over the locations of objects (with a LatLongCoordinatesFacet), answering radius,
+        bounding-box and nearest-neighbour queries by only visiting the grid cells around the query.
+        The points are sorted by cell (row-major) once; the points of a row of cells are then a contiguous range
+        found with a binary search. Use from_objects(), from_bundle() or from_case_file() to build an index.
+        :param objects: The objects, one per point
+        :param latitude: Their latitudes in degrees
+        :param longitude: Their longitudes in degrees
+        :param cell_size: The size of the grid cells in degrees
+        :param references: A ReferenceGraph, to find the objects linked to the locations (see linked())
+        """
+        if numpy is None:
+            raise ImportError("NumPy is required for the spatial index")
+        self.cell_size = cell_size
+        self.references = references
+        self._columns = math.ceil(360 / cell_size)
+        latitude = numpy.asarray(latitude, dtype=numpy.float64)
+        longitude = numpy.asarray(longitude, dtype=numpy.float64)
+        keys = self._row(latitude) * self._columns + self._column(longitude)
+        order = numpy.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self.latitude = latitude[order]
+        self.longitude = longitude[order]
+        self.objects = [objects[i] for i in order.tolist()]
+
+    @classmethod
+    def from_objects(cls, objects, cell_size=0.01, references=False):
+        """
+        Index the objects with a LatLongCoordinatesFacet (e.g. Locations) among objects.
+        :param references: Also build the ReferenceGraph of all the objects
+        """
+        located, latitude, longitude = [], [], []
+        graph = ReferenceGraph() if references else None
+        for obj in objects:
+            if graph is not None:
+                graph.add(obj)
+            coordinates = _coordinates(obj)
+            if coordinates is not None:
+                located.append(obj)
+                latitude.append(coordinates[0])
+                longitude.append(coordinates[1])
+        return cls(located, latitude, longitude, cell_size, graph)
+
+    @classmethod
+    def from_bundle(cls, bundle, cell_size=0.01, references=False):
+        return cls.from_objects(
+            (obj for key in OBJECT_KEYS for obj in bundle.get(key) or []),
+            cell_size,
+            references,
+        )
+
+    @classmethod
+    def from_case_file(cls, path, cell_size=0.01, references=False):
+        """
+        Index a CASE file, read incrementally (see stream.iter_case_file()).
+        """
+        return cls.from_objects(
+            (value for event, _, value in iter_case_file(path) if event == "object"),
+            cell_size,
+            references,
+        )
+
+    def __len__(self):
+        return len(self.objects)
+
+    def _row(self, latitude):
+        rows = numpy.floor((numpy.asarray(latitude) + 90) / self.cell_size)
+        return numpy.clip(rows, 0, math.ceil(180 / self.cell_size) - 1).astype(
+            numpy.int64
+        )
+
+    def _column(self, longitude):
+        columns = numpy.floor((numpy.asarray(longitude) + 180) / self.cell_size)
+        return numpy.clip(columns, 0, self._columns - 1).astype(numpy.int64)
+
+    def _box(self, south, west, north, east):
+        """
+        The indexes of the points in the cells overlapping a bounding box (not crossing the antimeridian).
+        """
+        rows = numpy.arange(int(self._row(south)), int(self._row(north)) + 1)
+        first = rows * self._columns + int(self._column(west))
+        last = rows * self._columns + int(self._column(east))
+        starts = numpy.searchsorted(self._keys, first, "left")
+        ends = numpy.searchsorted(self._keys, last, "right")
+        ranges = [numpy.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not ranges:
+            return numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate(ranges)
+
+    def _box_indexes(self, south, west, north, east):
+        if west <= east:
+            candidates = self._box(south, west, north, east)
+            inside = (self.longitude[candidates] >= west) & (
+                self.longitude[candidates] <= east
+            )
+        else:  # Crossing the antimeridian
+            candidates = numpy.concatenate(
+                (
+                    self._box(south, west, north, 180.0),
+                    self._box(south, -180.0, north, east),
+                )
+            )
+            inside = (self.longitude[candidates] >= west) | (
+                self.longitude[candidates] <= east
+            )
+        latitudes = self.latitude[candidates]
+        return candidates[inside & (latitudes >= south) & (latitudes <= north)]
+
+    def _radius_indexes(self, latitude, longitude, radius):
+        """
+        The indexes and distances of the points within radius metres of a point.
+        """
+        angle = radius / EARTH_RADIUS
+        south = latitude - math.degrees(angle)
+        north = latitude + math.degrees(angle)
+        if angle >= math.pi / 2 or south <= -90 or north >= 90:
+            boxes = [(max(south, -90.0), -180.0, min(north, 90.0), 180.0)]
+        else:
+            spread = math.degrees(
+                math.asin(min(1.0, math.sin(angle) / math.cos(math.radians(latitude))))
+            )
+            west, east = longitude - spread, longitude + spread
+            if spread >= 180:
+                boxes = [(south, -180.0, north, 180.0)]
+            elif west < -180:
+                boxes = [
+                    (south, west + 360, north, 180.0),
+                    (south, -180.0, north, east),
+                ]
+            elif east > 180:
+                boxes = [
+                    (south, west, north, 180.0),
+                    (south, -180.0, north, east - 360),
+                ]
+            else:
+                boxes = [(south, west, north, east)]
+        candidates = numpy.unique(numpy.concatenate([self._box(*box) for box in boxes]))
+        distances = _distances(
+            latitude, longitude, self.latitude[candidates], self.longitude[candidates]
+        )
+        within = distances <= radius
+        candidates, distances = candidates[within], distances[within]
+        order = numpy.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def bounding_box(self, south, west, north, east):
+        """
+        The objects located within a bounding box, in degrees; west > east for boxes crossing the antimeridian.
+        """
+        return [
+            self.objects[i]
+            for i in numpy.sort(self._box_indexes(south, west, north, east)).tolist()
+        ]
+
+    def radius(self, latitude, longitude, radius):
+        """
+        The objects located within radius metres of a point, nearest first.
+        """
+        indexes, _ = self._radius_indexes(latitude, longitude, radius)
+        return [self.objects[i] for i in indexes.tolist()]
+
+    def nearest(self, latitude, longitude, count=1):
+        """
+        The count objects nearest to a point, as (distance in metres, object) pairs, nearest first.
+        The search radius starts at about a cell and doubles until enough objects are found.
+        """
+        radius = self.cell_size * _METRES_PER_DEGREE
+        while True:
+            indexes, distances = self._radius_indexes(latitude, longitude, radius)
+            if len(indexes) >= count or radius >= math.pi * EARTH_RADIUS:
+                break
+            radius *= 2
+        return [
+            (distance, self.objects[i])
+            for distance, i in zip(distances[:count].tolist(), indexes[:count].tolist())
+        ]
+
+    def linked(self, objects, depth=1):
+        """
+        The objects referencing any of objects (e.g. the result of a query), directly or through up to depth
+        references; the index must have been built with references=True.
+        """
+        if self.references is None:
+            raise ValueError("The index was built without references")
+        return self.references.resolve(
+            self.references.linked([obj["@id"] for obj in objects], depth)
+        )
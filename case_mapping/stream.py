@@ -0,0 +1,250 @@
+import json
+import os
+import re
+from uuid import uuid4
+
+from .base import LazyValue, json_default, unpack_args_array
+
+OBJECT_KEYS = ("uco-core:object", "@graph")
+
+_WHITESPACE = " \t\n\r"
+
+
+def _open(fp_or_path, mode):
+    """
+    Return (file object, owned) for either an already opened file object or a path.
+    """
+    if isinstance(fp_or_path, (str, bytes, os.PathLike)):
+        return open(fp_or_path, mode, encoding="utf-8"), True
+    return fp_or_path, False
+
+
+class _Scanner:
+    """
+    A minimal incremental JSON tokenizer over a text stream, decoding one value at a time with
+    json.JSONDecoder.raw_decode and refilling its buffer when a value crosses the buffer's end.
+    """
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ("" at end of input)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(
+                f"Malformed case file: expected {char!r} at offset {self.pos}"
+            )
+        self.pos += 1
+
+    def decode(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill(size):
+                    raise
+            else:
+                # A number ending exactly at the buffer's end may continue in the next chunk.
+                if end < len(self.buf) or self.eof or not self._fill(size):
+                    self.pos = end
+                    return value
+            size *= 2
+
+
+def iter_case_file(fp_or_path, chunk_size=1 << 20):
+    """
+    Incrementally read a CASE file without loading it as a whole.
+    Yields ("property", key, value) for each top-level property of the bundle and ("object", key, item) for each
+    item of the object lists (uco-core:object, @graph), so that memory use is bounded by the largest single object.
+    :param fp_or_path: A path or an opened text file
+    :param chunk_size: The number of characters read from the file at a time
+    """
+    fp, owned = _open(fp_or_path, "r")
+    try:
+        scanner = _Scanner(fp, chunk_size)
+        scanner.expect("{")
+        while scanner.peek() != "}":
+            if scanner.peek() == ",":
+                scanner.pos += 1
+            key = scanner.decode()
+            scanner.expect(":")
+            if key in OBJECT_KEYS and scanner.peek() == "[":
+                scanner.pos += 1
+                while scanner.peek() != "]":
+                    if scanner.peek() == ",":
+                        scanner.pos += 1
+                    yield "object", key, scanner.decode()
+                scanner.pos += 1
+            else:
+                yield "property", key, scanner.decode()
+    finally:
+        if owned:
+            fp.close()
+
+
+def read_case_header(fp_or_path):
+    """
+    Return the top-level properties of a CASE file (everything except its object lists).
+    """
+    return {
+        key: value
+        for event, key, value in iter_case_file(fp_or_path)
+        if event == "property"
+    }
+
+
+class BundleWriter:
+    def __init__(self, fp_or_path, bundle=None, indent=None):
+        """
+        Writes a bundle to a file incrementally: the bundle's own properties are written first and objects are then
+        streamed into its object list one at a time, so the bundle never needs to be held in memory as a whole.
+        :param fp_or_path: A path or an opened text file
+        :param bundle: A Bundle (or any dict) providing the top-level properties. Objects it already holds are
+                       written straight away.
+        :param indent: Pretty-print with this indentation level (compact output when None)
+        """
+        self.fp, self._owned = _open(fp_or_path, "w")
+        self.indent = indent
+        self.separators = (",", ":") if indent is None else (",", ": ")
+        self.objects_written = 0
+        self._list_key = None
+        self._first_item = True
+        self._closed = False
+        self._nl = "" if indent is None else "\n"
+        self._pad = "" if indent is None else " " * indent
+        self._first_property = True
+        # Streamed LazyValues are encoded as placeholder strings, which are replaced by their pieces on output
+        self._placeholder = f"\0{uuid4().hex}:"
+        self._placeholders = re.compile(
+            re.escape(json.dumps(self._placeholder)[:-1]) + r'(\d+)"'
+        )
+
+        self.fp.write("{")
+        header = bundle or dict()
+        for key, value in header.items():
+            if key not in OBJECT_KEYS:
+                self.write_property(key, value)
+        for key in OBJECT_KEYS:
+            if header.get(key):
+                self.write(header[key], key=key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _dumps(self, value, level, default=json_default):
+        text = json.dumps(
+            value, indent=self.indent, separators=self.separators, default=default
+        )
+        if self.indent is not None and level:
+            text = text.replace("\n", "\n" + self._pad * level)
+        return text
+
+    def _write_value(self, value, level):
+        streamed = []
+
+        def default(item):
+            if isinstance(item, LazyValue) and item.streamed:
+                streamed.append(item)
+                return f"{self._placeholder}{len(streamed) - 1}"
+            return json_default(item)
+
+        text = self._dumps(value, level, default)
+        if not streamed:
+            self.fp.write(text)
+            return
+        # The split alternates between literal text and placeholder indexes
+        for i, piece in enumerate(self._placeholders.split(text)):
+            if i % 2:
+                for chunk in streamed[int(piece)].iter_json():
+                    self.fp.write(chunk)
+            else:
+                self.fp.write(piece)
+
+    def _start_property(self, key):
+        if not self._first_property:
+            self.fp.write(",")
+        self._first_property = False
+        self.fp.write(f"{self._nl}{self._pad}{json.dumps(key)}{self.separators[1]}")
+
+    def _close_list(self):
+        if self._list_key is not None:
+            self.fp.write(f"{self._nl}{self._pad}]" if not self._first_item else "]")
+            self._list_key = None
+
+    def write_property(self, key, value):
+        """
+        Write a top-level property of the bundle.
+        """
+        self._close_list()
+        self._start_property(key)
+        self._write_value(value, 1)
+
+    def _start_item(self, key):
+        if self._list_key != key:
+            self._close_list()
+            self._start_property(key)
+            self.fp.write("[")
+            self._list_key = key
+            self._first_item = True
+        if not self._first_item:
+            self.fp.write(",")
+        self._first_item = False
+        self.fp.write(f"{self._nl}{self._pad * 2}")
+        self.objects_written += 1
+
+    @unpack_args_array
+    def write(self, *args, key="uco-core:object"):
+        """
+        Append a single/tuple of objects to the bundle's object list.
+        :param args: Objects (dicts) to be written
+        :param key: The object list to write to
+        """
+        for item in args:
+            self._start_item(key)
+            self._write_value(item, 2)
+
+    def write_raw(self, text, key="uco-core:object"):
+        """
+        Append an object that is already encoded as JSON text.
+        """
+        self._start_item(key)
+        self.fp.write(text)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._close_list()
+        self.fp.write(f"{self._nl}}}{self._nl}")
+        if self._owned:
+            self.fp.close()
+        else:
+            self.fp.flush()
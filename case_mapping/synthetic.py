@@ -0,0 +1,311 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from .uco import core, identity, observable
+
+# The relative frequency of each kind of record generated
+DEFAULT_MIX = {
+    "file": 30,
+    "picture": 15,
+    "email": 15,
+    "call": 15,
+    "message": 20,
+    "relationship": 5,
+}
+
+_START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+_EXTENSIONS = ("txt", "pdf", "docx", "xlsx", "zip", "db", "log", "html")
+_CAMERAS = (("Canon", "EOS 80D"), ("Nikon", "D750"), ("Apple", "iPhone 12"))
+_WORDS = (
+    "meeting",
+    "invoice",
+    "tomorrow",
+    "package",
+    "account",
+    "call",
+    "transfer",
+    "report",
+    "address",
+    "delivery",
+)
+
+
+class CaseGenerator:
+    def __init__(
+        self, seed=0, mix=None, accounts=None, devices=8, open_threads=16, max_thread=50
+    ):
+        """
+        Generates realistic synthetic case objects from the library's classes: files (FileFacet, ContentDataFacet
+        with several hashes), pictures (with RasterPictureFacet and EXIFFacet), emails between email accounts,
+        calls between phone accounts, chat messages grouped into message threads, and relationships between files
+        and devices (with their manufacturers). The values are drawn from a seeded random generator, so that a seed
+        always produces the same objects (up to their random @ids, which all have the same length).
+        :param seed: The seed of the random generator
+        :param mix: The relative frequency of each kind of record ({"file": 30, ...}, see DEFAULT_MIX)
+        :param accounts: The number of distinct phone and email accounts (one per 50 objects when None)
+        :param devices: The number of devices files are related to
+        :param open_threads: The number of message threads receiving messages at a time
+        :param max_thread: The maximum number of messages of a thread
+        """
+        self.seed = seed
+        self.mix = dict(DEFAULT_MIX if mix is None else mix)
+        self.accounts = accounts
+        self.devices = devices
+        self.open_threads = open_threads
+        self.max_thread = max_thread
+
+    def _time(self):
+        return _START + timedelta(seconds=self._random.randrange(3 * 365 * 86400))
+
+    def _hex(self, bits):
+        return format(self._random.getrandbits(bits), f"0{bits // 4}x")
+
+    def _text(self, words):
+        return " ".join(self._random.choice(_WORDS) for _ in range(words))
+
+    def _account(self, kind, created):
+        """
+        An account of a pool of self._pool_size accounts of a kind ("phone" or "email"), appending the objects
+        created for a new account to created.
+        """
+        pool = self._pools[kind]
+        index = self._random.randrange(self._pool_size)
+        if index < len(pool):
+            return pool[index]
+        if kind == "phone":
+            account = observable.ObservableObject()
+            account.append_facets(
+                observable.FacetPhoneAccount(
+                    phone_number=f"+47{self._random.randrange(10**8):08d}"
+                )
+            )
+            created.append(account)
+        else:
+            address = observable.ObservableObject()
+            address.append_facets(
+                observable.FacetEmailAddress(
+                    email_address_value=f"user{len(pool)}@example.com",
+                    display_name=f"User {len(pool)}",
+                )
+            )
+            account = observable.ObservableObject()
+            account.append_facets(observable.FacetEmailAccount(email_address=address))
+            created.extend((address, account))
+        pool.append(account)
+        return account
+
+    def _file(self, created):
+        extension = self._random.choice(_EXTENSIONS)
+        size = int(self._random.lognormvariate(10, 2))
+        obj = observable.ObservableObject()
+        obj.append_facets(
+            observable.FacetFile(
+                file_name=f"{self._hex(32)}.{extension}",
+                file_path=f"/data/{self._hex(16)}/{self._hex(32)}.{extension}",
+                file_extension=extension,
+                size_bytes=size,
+                created_time=self._time(),
+                modified_time=self._time(),
+                accessed_time=self._time(),
+            ),
+            observable.FacetContentData(
+                size_bytes=size,
+                hashes={
+                    "MD5": self._hex(128),
+                    "SHA1": self._hex(160),
+                    "SHA256": self._hex(256),
+                },
+            ),
+        )
+        created.append(obj)
+        self._files.append(obj)
+        if len(self._files) > 1000:
+            del self._files[: len(self._files) // 2]
+
+    def _picture(self, created):
+        make, model = self._random.choice(_CAMERAS)
+        width, height = self._random.choice(((4000, 3000), (3024, 4032), (1920, 1080)))
+        taken = self._time()
+        obj = observable.ObservableObject()
+        obj.append_facets(
+            observable.FacetFile(
+                file_name=f"IMG_{self._random.randrange(10000):04d}.jpg",
+                file_extension="jpg",
+                size_bytes=self._random.randrange(1 << 20, 8 << 20),
+                modified_time=taken,
+            ),
+            observable.FacetContentData(
+                mime_type="image/jpeg", hash_method="SHA256", hash_value=self._hex(256)
+            ),
+            observable.FacetRasterPicture(
+                picture_type="jpg", picture_width=width, picture_height=height
+            ),
+            observable.FacetEXIF(
+                Make=make,
+                Model=model,
+                DateTimeOriginal=taken.strftime("%Y:%m:%d %H:%M:%S"),
+                ExposureTime=f"1/{self._random.choice((60, 125, 250, 500))}",
+                FNumber=str(self._random.choice((1.8, 2.8, 4.0, 5.6))),
+                ISOSpeedRatings=str(self._random.choice((100, 200, 400, 800))),
+                GPSLatitude=f"{self._random.uniform(-80, 80):.6f}",
+                GPSLongitude=f"{self._random.uniform(-180, 180):.6f}",
+            ),
+        )
+        created.append(obj)
+        self._files.append(obj)
+
+    def _email(self, created):
+        sender = self._account("email", created)
+        recipients = [
+            self._account("email", created) for _ in range(self._random.randint(1, 3))
+        ]
+        sent = self._time()
+        obj = observable.ObservableObject()
+        obj.append_facets(
+            observable.FacetEmailMessage(
+                msg_from=sender,
+                msg_to=recipients,
+                subject=self._text(4),
+                body=self._text(self._random.randint(10, 200)),
+                sent_time=sent,
+                received_time=sent + timedelta(seconds=self._random.randrange(600)),
+                message_id=f"<{self._hex(64)}@example.com>",
+                content_type="text/plain",
+            )
+        )
+        created.append(obj)
+
+    def _call(self, created):
+        caller = self._account("phone", created)
+        callee = self._account("phone", created)
+        start = self._time()
+        duration = self._random.randrange(3600)
+        obj = observable.ObservableObject()
+        obj.append_facets(
+            observable.FacetCall(
+                call_type=self._random.choice(("incoming", "outgoing", "missed")),
+                start_time=start,
+                end_time=start + timedelta(seconds=duration),
+                call_from=caller,
+                call_to=callee,
+                call_duration=duration,
+            )
+        )
+        created.append(obj)
+
+    def _message(self, created):
+        thread = None
+        if len(self._threads) >= self.open_threads:
+            thread = self._random.choice(self._threads)
+        if thread is None:
+            thread = {
+                "facet": observable.FacetMessagethread(
+                    display_name=self._text(2), visibility=True
+                ),
+                "participants": [
+                    self._account("phone", created)
+                    for _ in range(self._random.randint(2, 4))
+                ],
+                "last": None,
+                "size": self._random.randint(2, self.max_thread),
+                "messages": 0,
+            }
+            thread["facet"].append_participants(*thread["participants"])
+            self._threads.append(thread)
+        obj = observable.ObservableObject()
+        obj.append_facets(
+            observable.FacetMessage(
+                msg_from=self._random.choice(thread["participants"]),
+                msg_to=thread["participants"],
+                message_text=self._text(self._random.randint(3, 30)),
+                sent_time=self._time(),
+            )
+        )
+        created.append(obj)
+        return thread, obj
+
+    def _relationship(self, created):
+        if not self._files:
+            self._file(created)
+            return
+        if len(self._devices) < self.devices:
+            make, model = self._random.choice(_CAMERAS)
+            manufacturer = self._manufacturers.get(make)
+            if manufacturer is None:
+                manufacturer = self._manufacturers[make] = identity.Organization(
+                    name=make
+                )
+                created.append(manufacturer)
+            device = observable.ObservableObject()
+            device.append_facets(
+                observable.FacetDevice(
+                    manufacturer=manufacturer, model=model, serial=self._hex(48)
+                )
+            )
+            created.append(device)
+            self._devices.append(device)
+        created.append(
+            observable.ObservableRelationship(
+                source=self._random.choice(self._files),
+                target=self._random.choice(self._devices),
+                kind_of_relationship="Contained_Within",
+                directional=True,
+            )
+        )
+
+    @staticmethod
+    def _thread_object(thread):
+        return observable.MessageThread(facets=thread["facet"])
+
+    def iter_objects(self, count):
+        """
+        Yield count top-level objects; every object is yielded after the objects it references, so that they can
+        be streamed to a stream.BundleWriter. Message threads are yielded once complete, after their messages.
+        """
+        self._random = random.Random(self.seed)
+        self._pool_size = self.accounts or max(10, count // 50)
+        self._pools = {"phone": [], "email": []}
+        self._files, self._devices, self._threads = [], [], []
+        self._manufacturers = dict()
+        kinds = list(self.mix)
+        weights = [self.mix[kind] for kind in kinds]
+        emitted = 0
+        while emitted < count:
+            # Room is kept for the open threads, which are all completed at the end
+            room = count - emitted - len(self._threads)
+            if room <= 0:
+                for thread in self._threads[: count - emitted]:
+                    yield self._thread_object(thread)
+                break
+            kind = self._random.choices(kinds, weights)[0]
+            created = []
+            thread = None
+            if kind == "message":
+                thread, message = self._message(created)
+            else:
+                getattr(self, f"_{kind}")(created)
+            created = created[:room]
+            yield from created
+            emitted += len(created)
+            if thread is not None and created and created[-1] is message:
+                messages = {message.get_id(): []}
+                if thread["last"] is not None:
+                    messages = {thread["last"]: [message.get_id()]}
+                thread["facet"].append_messages(messages)
+                thread["last"] = message.get_id()
+                thread["messages"] += 1
+                if thread["messages"] >= thread["size"]:
+                    self._threads.remove(thread)
+                    yield self._thread_object(thread)
+                    emitted += 1
+            elif thread is not None and not thread["messages"]:
+                self._threads.remove(thread)
+
+    def bundle(self, count, **kwargs):
+        """
+        A Bundle of count generated objects.
+        :param kwargs: The arguments of the Bundle
+        """
+        bundle = core.Bundle(**kwargs)
+        bundle.append_to_uco_object(list(self.iter_objects(count)))
+        return bundle
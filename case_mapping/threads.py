@@ -0,0 +1,315 @@
+from array import array
+from hashlib import sha1
+from uuid import NAMESPACE_URL
+
+from .base import GeneratedList
+
+
+class ThreadGraph:
+    def __init__(self, thread_id, single_terminus=False):
+        """
+        The messages of a thread and their next-message links, kept as a directed acyclic graph in id-indexed arrays
+        (a forward star in each direction), so that appending a message or a link is O(1) amortized.
+        Cycles are detected as links are added by maintaining a topological order of the messages (Pearce-Kelly):
+        a link from an earlier to a later message, the usual case for messages arriving in chronological order, is
+        accepted in constant time, and only links against the current order cause a search, bounded to the
+        messages between their two ends.
+        :param thread_id: The @id of the uco-types:Thread, from which the ThreadItem @ids are derived
+        :param single_terminus: Whether the thread must end with a single message (without next message)
+        """
+        self.thread_id = thread_id
+        self.single_terminus = single_terminus
+        self.ids = []
+        self._index = dict()
+        # Per message: position in the topological order, first outgoing/incoming link (-1 if none), degrees
+        self._order = array("i")
+        self._first_out = array("i")
+        self._first_in = array("i")
+        self._in_degree = array("i")
+        self._out_degree = array("i")
+        # Per link: both ends, and the next link from the same source/to the same target
+        self._source = array("i")
+        self._target = array("i")
+        self._next_out = array("i")
+        self._next_in = array("i")
+        # Messages without previous/next message
+        self.origins = 0
+        self.termini = 0
+        # (message, previous position) for the reorderings of the current append(), undone on failure
+        self._reordered = []
+        self._item_hasher = None
+
+    @classmethod
+    def from_items(cls, thread_id, items, single_terminus=False):
+        """
+        Rebuild the graph of a thread from its co:item ThreadItems (e.g. of a loaded or copied facet).
+        """
+        graph = cls(thread_id, single_terminus)
+        contents = {item["@id"]: item["co:itemContent"]["@id"] for item in items}
+        graph.append(
+            {
+                contents[item["@id"]]: [
+                    contents[following["@id"]]
+                    for following in item.get("uco-types:threadNextItem") or []
+                ]
+                for item in items
+            }
+        )
+        return graph
+
+    def copy(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.ids = list(self.ids)
+        clone._index = dict(self._index)
+        for name in (
+            "_order",
+            "_first_out",
+            "_first_in",
+            "_in_degree",
+            "_out_degree",
+            "_source",
+            "_target",
+            "_next_out",
+            "_next_in",
+        ):
+            setattr(clone, name, array("i", getattr(self, name)))
+        clone._reordered = []
+        return clone
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def links(self):
+        return len(self._source)
+
+    def _message(self, message_id):
+        index = self._index.get(message_id)
+        if index is None:
+            index = self._index[message_id] = len(self.ids)
+            self.ids.append(message_id)
+            self._order.append(index)
+            self._first_out.append(-1)
+            self._first_in.append(-1)
+            self._in_degree.append(0)
+            self._out_degree.append(0)
+            self.origins += 1
+            self.termini += 1
+        return index
+
+    def _next_messages(self, index):
+        link = self._first_out[index]
+        while link != -1:
+            yield self._target[link]
+            link = self._next_out[link]
+
+    def _previous_messages(self, index):
+        link = self._first_in[index]
+        while link != -1:
+            yield self._source[link]
+            link = self._next_in[link]
+
+    def _reorder(self, source, target):
+        """
+        Restore the topological order for a new link from source to target, where target comes first.
+        """
+        lower, upper = self._order[target], self._order[source]
+        forward, stack, seen = [], [target], {target}
+        while stack:
+            index = stack.pop()
+            forward.append(index)
+            for following in self._next_messages(index):
+                if following == source:
+                    raise ValueError(
+                        f"Linking {self.ids[source]} to {self.ids[target]} would create a cycle"
+                    )
+                if self._order[following] < upper and following not in seen:
+                    seen.add(following)
+                    stack.append(following)
+        backward, stack, seen = [], [source], {source}
+        while stack:
+            index = stack.pop()
+            backward.append(index)
+            for preceding in self._previous_messages(index):
+                if self._order[preceding] > lower and preceding not in seen:
+                    seen.add(preceding)
+                    stack.append(preceding)
+        # Everything reaching source now precedes everything reachable from target, in the same positions
+        moved = sorted(backward, key=self._order.__getitem__) + sorted(
+            forward, key=self._order.__getitem__
+        )
+        positions = sorted(self._order[index] for index in moved)
+        for index, position in zip(moved, positions):
+            self._reordered.append((index, self._order[index]))
+            self._order[index] = position
+
+    def _link(self, source, target):
+        if source == target:
+            raise ValueError(f"{self.ids[source]} cannot follow itself")
+        if self._order[source] > self._order[target]:
+            self._reorder(source, target)
+        link = len(self._source)
+        self._source.append(source)
+        self._target.append(target)
+        self._next_out.append(self._first_out[source])
+        self._next_in.append(self._first_in[target])
+        self._first_out[source] = link
+        self._first_in[target] = link
+        self._out_degree[source] += 1
+        if self._out_degree[source] == 1:
+            self.termini -= 1
+        self._in_degree[target] += 1
+        if self._in_degree[target] == 1:
+            self.origins -= 1
+
+    def append(self, messages):
+        """
+        Add messages and links from an adjacency dictionary {message @id: iterable of next message @ids}.
+        The graph is left unchanged when a link would create a cycle (or, with single_terminus, when the thread
+        would not end with a single message), in which case a ValueError is raised.
+        """
+        mark = (len(self.ids), len(self._source), self.origins, self.termini)
+        self._reordered = []
+        try:
+            for message_id, next_ids in messages.items():
+                source = self._message(message_id)
+                for next_id in next_ids:
+                    self._link(source, self._message(next_id))
+            if self.single_terminus and self.termini != 1:
+                raise ValueError(
+                    f"The thread has {self.termini} termini instead of a single one"
+                )
+        except Exception:
+            self._rollback(*mark)
+            raise
+        finally:
+            self._reordered = []
+
+    def _rollback(self, messages, links, origins, termini):
+        for link in reversed(range(links, len(self._source))):
+            source, target = self._source[link], self._target[link]
+            self._first_out[source] = self._next_out[link]
+            self._first_in[target] = self._next_in[link]
+            self._out_degree[source] -= 1
+            self._in_degree[target] -= 1
+        for values in (self._source, self._target, self._next_out, self._next_in):
+            del values[links:]
+        for index, position in reversed(self._reordered):
+            self._order[index] = position
+        for message_id in self.ids[messages:]:
+            del self._index[message_id]
+        del self.ids[messages:]
+        for values in (
+            self._order,
+            self._first_out,
+            self._first_in,
+            self._in_degree,
+            self._out_degree,
+        ):
+            del values[messages:]
+        self.origins, self.termini = origins, termini
+
+    def rename(self, resolve):
+        """
+        Replace the message @ids by resolve(@id) (e.g. their survivors after a deduplication).
+        """
+        ids = [resolve(message_id) for message_id in self.ids]
+        if ids != self.ids:
+            self.ids = ids
+            self._index = {message_id: index for index, message_id in enumerate(ids)}
+
+    def topological_order(self):
+        """
+        The message indexes, each message before the messages following it.
+        """
+        ordered = array("i", [0]) * len(self.ids)
+        for index, position in enumerate(self._order):
+            ordered[position] = index
+        return ordered
+
+    def item_id(self, index):
+        """
+        The @id of the ThreadItem of a message, stable across serializations: the name-based UUID (version 5, as
+        uuid.uuid5() would compute it) of "<thread @id>#<message @id>" in the URL namespace.
+        """
+        if self._item_hasher is None:
+            self._item_hasher = sha1(
+                NAMESPACE_URL.bytes + f"{self.thread_id}#".encode()
+            )
+        hasher = self._item_hasher.copy()
+        hasher.update(self.ids[index].encode())
+        digest = bytearray(hasher.digest()[:16])
+        digest[6] = digest[6] & 0x0F | 0x50
+        digest[8] = digest[8] & 0x3F | 0x80
+        h = digest.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+    def iter_elements(self):
+        for index in self.topological_order():
+            yield {"@id": self.ids[index]}
+
+    def iter_items(self):
+        """
+        Yield the ThreadItem node of every message, in topological order.
+        """
+        # The @ids of items referenced by an item already yielded, each computed once
+        referenced = dict()
+        for index in self.topological_order():
+            item_id = referenced.pop(index, None) or self.item_id(index)
+            item = {
+                "@id": item_id,
+                "@type": "uco-types:ThreadItem",
+                "co:itemContent": {"@id": self.ids[index]},
+            }
+            following = sorted(
+                set(self._next_messages(index)), key=self._order.__getitem__
+            )
+            if following:
+                for next_index in following:
+                    if next_index not in referenced:
+                        referenced[next_index] = self.item_id(next_index)
+                item["uco-types:threadNextItem"] = [
+                    {"@id": referenced[next_index]} for next_index in following
+                ]
+            yield item
+
+    def iter_origins(self):
+        for index in self.topological_order():
+            if not self._in_degree[index]:
+                yield {"@id": self.item_id(index)}
+
+
+class ThreadNodes(GeneratedList):
+    """
+    The co:element, co:item or uco-types:threadOriginItem list of a thread, generated from its ThreadGraph when
+    serialized: appending messages to the graph costs nothing here, and every serialization sees the current
+    topological order.
+    """
+
+    generators = {
+        "co:element": "iter_elements",
+        "co:item": "iter_items",
+        "uco-types:threadOriginItem": "iter_origins",
+    }
+
+    def __init__(self, graph, key):
+        super().__init__()
+        self.graph = graph
+        self.key = key
+
+    def __len__(self):
+        return (
+            self.graph.origins
+            if self.key == "uco-types:threadOriginItem"
+            else len(self.graph)
+        )
+
+    def __iter__(self):
+        return getattr(self.graph, self.generators[self.key])()
+
+    def __reduce__(self):
+        return self.__class__, (self.graph, self.key)
+
+    def rewrite_references(self, resolve):
+        self.graph.rename(resolve)
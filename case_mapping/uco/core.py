@@ -1,7 +1,66 @@
-from ..base import ObjectEntity, unpack_args_array
+from ..base import (
+    FacetEntity,
+    GeneratedList,
+    LazyValue,
+    ObjectEntity,
+    unpack_args_array,
+)
+from ..concurrency import ConcurrentAppender
+from ..instrumentation import current as current_instrumentation
+from ..journal import BundleJournal
+from ..memory import memory_report
+from ..stream import OBJECT_KEYS
+
+
+# The attributes tying an entity to its bundle (the journal recording it, the concurrent appender) or caching its
+# content (the digest of validation.content_hash(), which refers to the original's facets), not copied
+_UNCOPIED_ATTRIBUTES = frozenset(
+    ("_journal", "_journal_root", "_appender", "_content_digest")
+)
+
+
+def _copy_entity(entity):
+    """
+    Copy an entity together with its facets and inline nodes, stopping at (and sharing) embedded objects. The
+    attributes of the entity (e.g. the ThreadGraph of a message thread facet) are copied too, except those tying it
+    to its bundle and caches: Bundle.edit() attaches the copy to the journal of the bundle holding it, if any.
+    """
+    clone = entity.__class__.__new__(entity.__class__)
+    for key, value in entity.items():
+        clone[key] = _copy_value(value)
+    for name, attribute in vars(entity).items():
+        if name in _UNCOPIED_ATTRIBUTES:
+            continue
+        setattr(
+            clone, name, attribute.copy() if hasattr(attribute, "copy") else attribute
+        )
+    return clone
+
+
+def _copy_value(value):
+    if isinstance(value, ObjectEntity):
+        return value
+    if isinstance(value, FacetEntity):
+        return _copy_entity(value)
+    if isinstance(value, dict):
+        return {key: _copy_value(item) for key, item in value.items()}
+    if isinstance(value, GeneratedList):
+        return value.copy()
+    if isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    if isinstance(value, LazyValue):
+        return value.copy()
+    return value
 
 
 class Bundle(ObjectEntity):
+    # Copy-on-write state (see snapshot()): whether the objects may be shared with a snapshot, and the objects
+    # copied by edit() since then (by Python id)
+    _shared = False
+    _private = None
+    _index = None
+    _appender = None
+
     def __init__(
         self,
         case_identifier=None,
@@ -43,6 +102,120 @@ class Bundle(ObjectEntity):
         if case_identifier:
             self["@id"] = case_identifier
 
+    def __str__(self):
+        if self._appender is not None:
+            self._appender.flush()
+        return super().__str__()
+
+    def items(self):
+        # Also how json.dumps() and stream.BundleWriter read a bundle: the pending concurrent appends are merged first
+        if self._appender is not None:
+            self._appender.flush()
+        return super().items()
+
+    @staticmethod
+    def stats():
+        """
+        A snapshot of the runtime metrics collected by the instrumentation (see instrumentation.enable()), or None
+        if it was never enabled. The metrics are those of the whole process, not of this bundle only.
+        """
+        instrumentation = current_instrumentation()
+        return None if instrumentation is None else instrumentation.snapshot()
+
+    def memory_report(self, largest=10, allocations=0):
+        """
+        Estimate the memory retained by this bundle per @type and per key, walking its objects once (see
+        memory.memory_report()).
+        :param largest: The number of largest objects reported
+        :param allocations: The number of top allocation sites reported, when tracemalloc is tracing
+        """
+        if self._appender is not None:
+            self._appender.flush()
+        return memory_report(self, largest, allocations)
+
+    def concurrent_appends(self):
+        """
+        Return the ConcurrentAppender of this bundle, through which many threads can append objects and facets
+        without contention. Buffered items are merged when the appender is flushed (or used as a context manager and
+        exited), and before the bundle is serialized (by str(), json.dumps() or a BundleWriter), snapshotted or
+        measured. Reading the object lists directly (e.g. bundle["uco-core:object"]) does not merge them.
+        """
+        if self._appender is None:
+            self._appender = ConcurrentAppender(self)
+        return self._appender
+
+    def snapshot(self):
+        """
+        Return a copy-on-write copy of this bundle. Objects and facets are shared between the bundle and its
+        snapshots, and an object is only duplicated when it is obtained through edit() to be modified, so that many
+        variants of a large case (redacted, per investigation, per recipient) cost little more than their differences.
+        Shared objects must not be modified in place on either side: modify the object returned by edit() instead.
+        Objects embedded whole in other objects (rather than referenced by @id) are not redirected to their copies.
+        """
+        if self._appender is not None:
+            self._appender.flush()
+        snapshot = self.__class__.__new__(self.__class__)
+        for key, value in self.items():
+            snapshot[key] = value.copy() if isinstance(value, (dict, list)) else value
+        snapshot.build = list(self.build)
+        for bundle in (self, snapshot):
+            bundle._shared = True
+            bundle._private = dict()
+        return snapshot
+
+    def _locate(self, _id):
+        if self._index is None or _id not in self._index:
+            self._index = {
+                obj.get("@id"): (key, i)
+                for key in OBJECT_KEYS
+                for i, obj in enumerate(self.get(key) or [])
+            }
+        return self._index[_id]
+
+    def edit(self, obj):
+        """
+        Return a version of an object of this bundle that can be modified without affecting the snapshots sharing it.
+        :param obj: An object of this bundle, or its @id
+        """
+        key, i = self._locate(obj if isinstance(obj, str) else obj.get_id())
+        current = self[key][i]
+        if not self._shared or id(current) in self._private:
+            return current
+        clone = _copy_entity(current)
+        self[key][i] = clone
+        self._private[id(clone)] = clone
+        if self._journal is not None:
+            self._journal.replaced(current, clone, key)
+        return clone
+
+    @unpack_args_array
+    def remove(self, *args):
+        """
+        Remove a single/tuple of objects (or their @ids) from this bundle, e.g. to redact a snapshot.
+        """
+        ids = {item if isinstance(item, str) else item.get_id() for item in args}
+        for key in OBJECT_KEYS:
+            if self.get(key):
+                kept = []
+                for obj in self[key]:
+                    if obj.get("@id") not in ids:
+                        kept.append(obj)
+                    elif self._journal is not None:
+                        self._journal.removed(obj, key)
+                self[key] = kept
+        self._index = None
+
+    def enable_journal(self, path, fsync=False):
+        """
+        Record the mutations of this bundle (new objects, appended facets, changed fields) into an append-only
+        journal file, so that snapshots can be written incrementally.
+        :param path: The journal file
+        :param fsync: Force the journal to disk on every flush
+        :return: The BundleJournal; call its flush() to append the changes made since the last flush, and its
+                 compact() to fold the journal into a full case file
+        """
+        return BundleJournal(self, path, fsync=fsync)
+
     @unpack_args_array
     def append_to_case_graph(self, *args):
         self._append_observable_objects("@graph", *args)
@@ -2,9 +2,15 @@ from ..base import FacetEntity, ObjectEntity
 
 
 class Location(ObjectEntity):
-    def __init__(self, facets=None):
+    def __init__(self, facets=None, created_time=None):
+        """
+        :param facets: The facets of the location (e.g. a FacetLocation)
+        :param created_time: The uco-core:objectCreatedTime of the location, as a datetime. UCO has no observation time
+                             on locations, so the ingesters record the time of a GPS fix here.
+        """
         super().__init__()
         self["@type"] = "uco-location:Location"
+        self._datetime_vars(**{"uco-core:objectCreatedTime": created_time})
         self.append_facets(facets)
 
 
@@ -4,7 +4,9 @@ from uuid import uuid4
 
 from pytz import timezone
 
-from ..base import FacetEntity, ObjectEntity, unpack_args_array
+from ..base import FacetEntity, LazyValue, ObjectEntity, unpack_args_array
+from ..content import DEFAULT_HASH_ALGORITHMS, digest_buffer, digest_file
+from ..threads import ThreadGraph, ThreadNodes
 
 
 class ObservableDomainName(ObjectEntity):
@@ -156,21 +158,26 @@ class FacetX509Certificate(FacetEntity):
         valid_not_before=None,
         validity_not_after=None,
         version=None,
+        signature_algo=None,
+        issuer_hash=None,
+        subject_hash=None,
+        thumbprint_hash=None,
     ):
         """
         Used to represent aspects of X509 Certificate Properties
         :param is_self_signed: Is the certificate self-signed
         :param issuer: the name of the certificate authority who issued the certificate
-        :param issuer_hash: (NI) A hash calculated on the certificate issuer name. (type:Hash)
+        :param issuer_hash: A (hash method, hex value) pair calculated on the certificate issuer name
         :param serial_number: The serial number of the certificate
-        :param signature: The signature of the
+        :param signature: The signature of the certificate
         :param signature_algo: Algorithm used for the signature of the certificate
         :param subject: Subject of the certificate
-        :param subject_hash: (NI) A hash calculated on the certificate subject name. (type:Hash)
+        :param subject_hash: A (hash method, hex value) pair calculated on the certificate subject name
         :param subject_pk_algo: The public key algorithm used in the generation of the certificate
         :param subject_pk_exponent: The public key exponent used in the generation of the certificate
         :param subject_pk_modulus: The public key modulus used in the generation of the certificate
-        :param thumbprint_hash: (NI) A hash calculated on the entire certificate including signature. (type:Hash)
+        :param thumbprint_hash: A (hash method, hex value) pair calculated on the entire certificate including
+                                signature
         :param valid_not_before: A date at which a certificate becomes valid
         :param validity_not_after: A date at which a certificate becomes expired
         :param version: the version of the certificate
@@ -178,19 +185,17 @@ class FacetX509Certificate(FacetEntity):
         """
         super().__init__()
         self["@type"] = "uco-observable:X509CertificateFacet"
+        self._bool_vars(**{"uco-observable:isSelfSigned": is_self_signed})
         self._int_vars(
-            **{
-                "uco-observable:isSelfSigned": is_self_signed,
-                "uco-observable:subjectPublicKeyExponent": subject_pk_exponent,
-            }
+            **{"uco-observable:subjectPublicKeyExponent": subject_pk_exponent}
         )
         self._str_vars(
             **{
                 "uco-observable:issuer": issuer,
                 "uco-observable:serialNumber": serial_number,
                 "uco-observable:signature": signature,
-                "uco-observable:signatureAlgorithm": signature,
-                "uco-observable-subject": subject,
+                "uco-observable:signatureAlgorithm": signature_algo,
+                "uco-observable:subject": subject,
                 "uco-observable:subjectPublicKeyAlgorithm": subject_pk_algo,
                 "uco-observable:subjectPublicKeyModulus": subject_pk_modulus,
                 "uco-observable:version": version,
@@ -202,6 +207,13 @@ class FacetX509Certificate(FacetEntity):
                 "uco-observable:validityNotAfter": validity_not_after,
             }
         )
+        for key, value in (
+            ("uco-observable:issuerHash", issuer_hash),
+            ("uco-observable:subjectHash", subject_hash),
+            ("uco-observable:thumbprintHash", thumbprint_hash),
+        ):
+            if value is not None:
+                self[key] = FacetContentData._hash(*value)
 
 
 class FacetAccount(FacetEntity):
@@ -236,6 +248,7 @@ class FacetContentData(FacetEntity):
         is_encrypted=None,
         hash_method=None,
         hash_value=None,
+        hashes=None,
     ):
         """
         The characteristics of a block of digital data.
@@ -243,11 +256,15 @@ class FacetContentData(FacetEntity):
         :param magic_number: The magic phone_number of a file
         :param mime_type: The mime type of a file. Example - "image/jpg"
         :param size_bytes: A phone_number representing the size of the content
-        :param data_payload: A base64 representation of the data
-        :param entropy: The entropy value for the data
+        :param data_payload: A base64 representation of the data, or a payload.PayloadReference to data left on disk.
+                             A PayloadReference is not a JSON value: serialize the facet with str(), a
+                             stream.BundleWriter or json.dumps(..., default=base.json_default), as plain
+                             json.dumps() raises TypeError on it
+        :param entropy: The entropy value for the data (a float, in bits per byte)
         :param is_encrypted: A boolean True/False, if encrypted or not.
         :param hash_method: The algorithm used to calculate the hash value
         :param hash_value: The cryptographic hash of this content
+        :param hashes: A dictionary of further hashes of this content (e.g., {"MD5": "...", "SHA1": "..."})
         """
         super().__init__()
         self["@type"] = "uco-observable:ContentDataFacet"
@@ -255,10 +272,16 @@ class FacetContentData(FacetEntity):
             **{
                 "uco-observable:magicNumber": magic_number,
                 "uco-observable:mimeType": mime_type,
-                "uco-observable:dataPayload": data_payload,
-                "uco-observable:entropy": entropy,
             }
         )
+        if isinstance(data_payload, LazyValue):
+            self["uco-observable:dataPayload"] = data_payload
+        else:
+            self._str_vars(**{"uco-observable:dataPayload": data_payload})
+        if isinstance(entropy, str):
+            self._str_vars(**{"uco-observable:entropy": entropy})
+        else:
+            self._float_vars(**{"uco-observable:entropy": entropy})
         self._int_vars(**{"uco-observable:sizeInBytes": size_bytes})
         self._bool_vars(**{"uco-observable:isEncrypted": is_encrypted})
 
@@ -268,16 +291,60 @@ class FacetContentData(FacetEntity):
                 "@value": byte_order,
             }
 
-        if hash_method is not None or hash_value is not None or hash_value != "-":
-            data = {"@id": str(uuid4()), "@type": "uco-types:Hash"}
-            if hash_method is not None:
-                data["uco-types:hashMethod"] = hash_method
-            if hash_value is not None:
-                data["uco-types:hashValue"] = {
-                    "@type": "xsd:hexBinary",
-                    "@value": hash_value,
-                }
-            self["uco-observable:hash"] = [data]
+        hash_list = []
+        if (hash_method is not None or hash_value is not None) and hash_value != "-":
+            hash_list.append(self._hash(hash_method, hash_value))
+        for method, value in (hashes or {}).items():
+            hash_list.append(self._hash(method, value))
+        if hash_list:
+            self["uco-observable:hash"] = hash_list
+
+    @staticmethod
+    def _hash(hash_method, hash_value):
+        data = {"@id": str(uuid4()), "@type": "uco-types:Hash"}
+        if hash_method is not None:
+            data["uco-types:hashMethod"] = hash_method
+        if hash_value is not None:
+            data["uco-types:hashValue"] = {
+                "@type": "xsd:hexBinary",
+                "@value": hash_value,
+            }
+        return data
+
+    @classmethod
+    def from_buffer(
+        cls, buffer, algorithms=DEFAULT_HASH_ALGORITHMS, entropy=True, **kwargs
+    ):
+        """
+        Create a ContentDataFacet from in-memory content, computing its size, magic number, entropy and one hash per
+        algorithm in a single pass over the data.
+        :param buffer: The content (bytes, memoryview, mmap, ...)
+        :param algorithms: The hash methods to compute (e.g., ("MD5", "SHA1", "SHA256"))
+        :param entropy: Whether to compute the Shannon entropy of the content
+        :param kwargs: Further arguments of the facet (e.g., mime_type)
+        """
+        return cls._from_digest(
+            digest_buffer(buffer, algorithms=algorithms, entropy=entropy), kwargs
+        )
+
+    @classmethod
+    def from_path(
+        cls, path, algorithms=DEFAULT_HASH_ALGORITHMS, entropy=True, **kwargs
+    ):
+        """
+        Like from_buffer(), over a memory-mapped file, so that each file is read only once.
+        :param path: The path of the file
+        """
+        return cls._from_digest(
+            digest_file(path, algorithms=algorithms, entropy=entropy), kwargs
+        )
+
+    @classmethod
+    def _from_digest(cls, digest, kwargs):
+        kwargs.setdefault("size_bytes", digest["size"])
+        kwargs.setdefault("magic_number", digest["magic_number"])
+        kwargs.setdefault("entropy", digest["entropy"])
+        return cls(hashes=digest["hashes"], **kwargs)
 
 
 class FacetApplication(FacetEntity):
@@ -1083,6 +1150,7 @@ class ObservableRelationship(ObjectEntity):
             "@type": "xsd:dateTime",
             "@value": time.isoformat(),
         }
+        self._changed()
 
 
 class FacetApplicationAccount(FacetEntity):
@@ -1200,11 +1268,13 @@ class FacetMessagethread(FacetEntity):
         visibility=None,
         participants=None,
         messages=None,
+        single_terminus=False,
     ):
         """
         A message thread facet is a grouping of characteristics unique to a running commentary of electronic messages
         pertaining to one topic or question.
         :param messages: Adjacency matrix, encoded as a dictionary.  Key: IRI of Message ObservableObject.  Value: Set of IRIs of Message ObservableObjects.
+        :param single_terminus: Whether the thread must end with a single message (see threads.ThreadGraph)
         """
         super().__init__()
         self["@type"] = "uco-observable:MessageThreadFacet"
@@ -1215,42 +1285,58 @@ class FacetMessagethread(FacetEntity):
         self["uco-observable:messageThread"] = {
             "@id": str(uuid4()),
             "@type": "uco-types:Thread",
+            "co:size": {"@type": "xsd:nonNegativeInteger", "@value": "0"},
         }
+        self._thread = ThreadGraph(
+            self["uco-observable:messageThread"]["@id"], single_terminus
+        )
+        if messages:
+            self.append_messages(messages)
 
-        # How many messages are there?
-        _message_ids = set()
-        if messages is not None:
-            for message_id in messages:
-                _message_ids.add(message_id)
-                for next_message_id in messages[message_id]:
-                    _message_ids.add(next_message_id)
-        self["uco-observable:messageThread"]["co:size"] = {
-            "@type": "xsd:nonNegativeInteger",
-            "@value": str(len(_message_ids)),
-        }
-        if len(_message_ids) > 0:
-            _element_list = []
-            # TODO - Need to implement checker for thread having only one terminus.
-            # _item_list = []
-            for message_id in sorted(_message_ids):
-                _element = {"@id": message_id}
-                _element_list.append(_element)
-                _item = {
-                    "@id": message_id,
-                    "@type": "uco-types:ThreadItem",
-                    "co:itemContent": {"@id": message_id},
-                }
-                if message_id in messages and len(messages[message_id]) > 0:
-                    _next_items = []
-                    for next_message_id in sorted(messages[message_id]):
-                        _next_items.append({"@id": next_message_id})
-                    _item["uco-types:threadNextItem"] = _next_items
-            self["uco-observable:messageThread"]["co:element"] = _element_list
+    def _graph(self):
+        """
+        The ThreadGraph of the thread, rebuilt from its ThreadItems for facets created without the constructor
+        (loaded from a case file, or copied).
+        """
+        graph = self.__dict__.get("_thread")
+        if graph is None:
+            thread = self["uco-observable:messageThread"]
+            graph = self._thread = ThreadGraph.from_items(
+                thread["@id"], thread.get("co:item") or []
+            )
+        return graph
 
     def append_messages(self, messages):
-        raise NotImplementedError(
-            "TODO - Need to implement checker for thread having only one terminus."
+        """
+        Add messages to the thread. The elements (messages) and items (ThreadItems) of the thread are generated from
+        its ThreadGraph when serialized (see threads.ThreadNodes), in an order where every message precedes the
+        messages following it, so appending costs no more than adding the messages and links to the graph.
+        :param messages: Adjacency matrix, encoded as a dictionary.  Key: IRI of Message ObservableObject.  Value: Set of IRIs of Message ObservableObjects.
+                         Message ObservableObjects may be given instead of the IRIs of the set.
+        :raises ValueError: If the messages would make the thread cyclic (the thread is then left unchanged)
+        """
+
+        def message_id(message):
+            return message.get_id() if isinstance(message, FacetEntity) else message
+
+        graph = self._graph()
+        graph.append(
+            {
+                message: [message_id(item) for item in next_messages]
+                for message, next_messages in messages.items()
+            }
         )
+        thread = self["uco-observable:messageThread"]
+        thread["co:size"] = {
+            "@type": "xsd:nonNegativeInteger",
+            "@value": str(len(graph)),
+        }
+        if len(graph):
+            for key in ThreadNodes.generators:
+                nodes = thread.get(key)
+                if not isinstance(nodes, ThreadNodes) or nodes.graph is not graph:
+                    thread[key] = ThreadNodes(graph, key)
+        self._changed()
 
     def append_participants(self, *args):
         self._append_refs("uco-observable:participant", *args)
@@ -0,0 +1,476 @@
+import ast
+import inspect
+import json
+import re
+import textwrap
+import warnings
+from collections import namedtuple
+from functools import lru_cache
+from hashlib import blake2b
+
+from .base import FacetEntity, GeneratedList, LazyValue, ObjectEntity, json_default
+from .directory import directory
+from .payload import PayloadReference
+from .references import is_reference
+from .stream import OBJECT_KEYS, iter_case_file
+
+# The kind of value set by each of the FacetEntity setters: _*_vars(**{key: value}) and _append_*(key, *values)
+VAR_SETTERS = {
+    "_str_vars": "str",
+    "_int_vars": "int",
+    "_float_vars": "float",
+    "_bool_vars": "bool",
+    "_datetime_vars": "datetime",
+    "_nonegative_int_vars": "nonnegative_int",
+    "_node_reference_vars": "reference",
+    "_str_list_vars": "str_list",
+}
+APPEND_SETTERS = {
+    "_append_refs": "references",
+    "_append_observable_objects": "objects",
+    "_append_strings": "str_list",
+}
+
+_DATETIME = re.compile(
+    r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?\Z"
+)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_reference(value):
+    return (
+        isinstance(value, dict)
+        and is_reference(value)
+        and isinstance(value["@id"], str)
+    )
+
+
+# The check of each kind of value, the cardinality included (single values, lists, or either)
+CHECKS = {
+    "str": lambda value: isinstance(value, str),
+    "int": _is_int,
+    "nonnegative_int": lambda value: _is_int(value) and value >= 0,
+    "float": lambda value: _is_int(value) or isinstance(value, float),
+    "bool": lambda value: isinstance(value, bool),
+    "datetime": lambda value: isinstance(value, dict)
+    and value.get("@type") == "xsd:dateTime"
+    and isinstance(value.get("@value"), str)
+    and _DATETIME.match(value["@value"]) is not None,
+    "str_list": lambda value: isinstance(value, list)
+    and all(isinstance(item, str) for item in value),
+    "reference": lambda value: _is_reference(value)
+    or isinstance(value, list)
+    and all(_is_reference(item) for item in value),
+    "references": lambda value: isinstance(value, list)
+    and all(_is_reference(item) for item in value),
+    "objects": lambda value: isinstance(value, list)
+    and all(isinstance(item, dict) and "@id" in item for item in value),
+    "any": lambda value: True,
+}
+
+Issue = namedtuple("Issue", ["id", "type", "key", "message"])
+
+# The kinds accepted for the keys missing from the shape of a class whose source (or a base's) was not available
+ANY_KEY = "*"
+
+
+class _KeyCollector(ast.NodeVisitor):
+    """
+    Collects the keys set on self by the methods of a class: through the FacetEntity setters, and through
+    self[key] = ... with a literal key (or a loop variable over a literal list of keys).
+    """
+
+    def __init__(self):
+        self.keys = dict()
+        # Loop variables over literal keys, and local dictionaries of keyword arguments, by name
+        self._bound = dict()
+        self._locals = dict()
+
+    def _add(self, key, kind):
+        kinds = self.keys.setdefault(key, [])
+        if kind not in kinds:
+            kinds.append(kind)
+
+    def _literal_keys(self, node):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            return [node.value]
+        if isinstance(node, ast.Name):
+            return self._bound.get(node.id, [])
+        return []
+
+    @staticmethod
+    def _constants(nodes):
+        values = [
+            node.value
+            for node in nodes
+            if isinstance(node, ast.Constant) and isinstance(node.value, str)
+        ]
+        return values if len(values) == len(nodes) else None
+
+    def visit_For(self, node):
+        # for key in ("a", "b"): ... and for key, value in (("a", a), ("b", b)): ...
+        names = []
+        if isinstance(node.iter, (ast.List, ast.Tuple)):
+            if isinstance(node.target, ast.Name):
+                keys = self._constants(node.iter.elts)
+                if keys is not None:
+                    names.append(node.target.id)
+                    self._bound[node.target.id] = keys
+            elif isinstance(node.target, ast.Tuple) and all(
+                isinstance(item, ast.Tuple) for item in node.iter.elts
+            ):
+                for position, target in enumerate(node.target.elts):
+                    if isinstance(target, ast.Name):
+                        keys = self._constants(
+                            [item.elts[position] for item in node.iter.elts]
+                        )
+                        if keys is not None:
+                            names.append(target.id)
+                            self._bound[target.id] = keys
+        self.generic_visit(node)
+        for name in names:
+            self._bound.pop(name, None)
+
+    def visit_Assign(self, node):
+        for target in node.targets:
+            if isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name):
+                keys = self._literal_keys(target.slice)
+                if target.value.id == "self":
+                    for key in keys:
+                        self._add(key, "any")
+                else:
+                    self._locals.setdefault(target.value.id, []).extend(keys)
+            elif isinstance(target, ast.Name) and isinstance(node.value, ast.Dict):
+                self._locals[target.id] = [
+                    key for item in node.value.keys for key in self._literal_keys(item)
+                ]
+        self.generic_visit(node)
+
+    def visit_AnnAssign(self, node):
+        if isinstance(node.target, ast.Name) and isinstance(node.value, ast.Dict):
+            self._locals[node.target.id] = [
+                key for item in node.value.keys for key in self._literal_keys(item)
+            ]
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        function = node.func
+        if (
+            isinstance(function, ast.Attribute)
+            and isinstance(function.value, ast.Name)
+            and function.value.id == "self"
+        ):
+            if function.attr in VAR_SETTERS:
+                for keyword in node.keywords:
+                    if keyword.arg is not None:
+                        continue
+                    if isinstance(keyword.value, ast.Dict):
+                        keys = [
+                            key
+                            for item in keyword.value.keys
+                            for key in self._literal_keys(item)
+                        ]
+                    elif isinstance(keyword.value, ast.Name):
+                        keys = self._locals.get(keyword.value.id, [])
+                    else:
+                        keys = []
+                    for key in keys:
+                        self._add(key, VAR_SETTERS[function.attr])
+            elif function.attr in APPEND_SETTERS and node.args:
+                for key in self._literal_keys(node.args[0]):
+                    self._add(key, APPEND_SETTERS[function.attr])
+        self.generic_visit(node)
+
+
+@lru_cache(maxsize=None)
+def _class_keys(cls):
+    """
+    The keys set by the methods defined in a class (not inherited), with their kinds; None if the source of the
+    class is not available (e.g. in a frozen build).
+    """
+    try:
+        source = textwrap.dedent(inspect.getsource(cls))
+    except (OSError, TypeError) as error:
+        warnings.warn(
+            f"Cannot compile the shape of {cls.__module__}.{cls.__qualname__} without its source ({error}): "
+            "its keys are not checked; compile the shapes where the source is available (compile_shapes()) and "
+            "pass them to the Validator to check them",
+            RuntimeWarning,
+        )
+        return None
+    collector = _KeyCollector()
+    collector.visit(ast.parse(source))
+    return {key: tuple(kinds) for key, kinds in collector.keys.items()}
+
+
+def compile_shape(cls):
+    """
+    The constraint table of an entity class: {key: (allowed kinds, ...)}, merged over the class and its bases.
+    Keys set both as objects and as references (e.g. uco-core:object) accept either. When the source of one of the
+    classes is not available, any other key is accepted too (with the kinds of ANY_KEY).
+    """
+    shape = dict()
+    for base in reversed(cls.__mro__):
+        if isinstance(base, type) and issubclass(base, FacetEntity):
+            keys = _class_keys(base)
+            if keys is None:
+                shape[ANY_KEY] = ["any"]
+                continue
+            for key, kinds in keys.items():
+                merged = list(shape.get(key, ()))
+                merged.extend(kind for kind in kinds if kind not in merged)
+                shape[key] = merged
+    for key, kinds in shape.items():
+        # Keys also assigned directly (e.g. a LazyValue or a time set by a method) keep the kinds of their setters
+        typed = tuple(kind for kind in kinds if kind != "any")
+        shape[key] = typed or ("any",)
+    shape["@id"] = shape["@type"] = ("str",)
+    return shape
+
+
+def compile_shapes(classes=None):
+    """
+    The constraint tables of the classes of a directory ({@type: class}, defaulting to the library's directory).
+    :return: {@type: (is an object (rather than a facet), {key: allowed kinds})}
+    """
+    classes = directory if classes is None else classes
+    return {
+        kind: (issubclass(cls, ObjectEntity), compile_shape(cls))
+        for kind, cls in classes.items()
+    }
+
+
+def _hash_default(value):
+    # File-backed payloads stand for their location rather than being read
+    if isinstance(value, PayloadReference):
+        return repr(value)
+    return json_default(value)
+
+
+def _digest(value):
+    text = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), default=_hash_default
+    )
+    return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _without_entities(value, entities):
+    """
+    A copy of a value where the entities (facets, embedded objects) are replaced by a placeholder and collected.
+    """
+    if isinstance(value, FacetEntity):
+        entities.append(value)
+        return {"@entity": len(entities)}
+    if isinstance(value, dict):
+        return {key: _without_entities(item, entities) for key, item in value.items()}
+    if isinstance(value, list) and not isinstance(value, GeneratedList):
+        return [_without_entities(item, entities) for item in value]
+    return value
+
+
+def content_hash(entity):
+    """
+    A digest of the JSON serialization of an entity (with sorted keys).
+    The digest of the entity's own properties, without the entities embedded in it, is cached on the entity until
+    a setter reports a change (FacetEntity._changed()); the digest of the entity combines it with the digests of the
+    embedded entities. Hashing a bundle again thus only serializes the entities changed since, as long as they are
+    changed through the setters (or report direct changes with _changed()).
+    """
+    if not isinstance(entity, FacetEntity):  # E.g. read from a case file
+        return _digest(entity)
+    cached = entity.__dict__.get("_content_digest")
+    if cached is None:
+        entities = []
+        value = {key: _without_entities(item, entities) for key, item in entity.items()}
+        cached = entity._content_digest = (_digest(value), entities)
+    digest, entities = cached
+    if not entities:
+        return digest
+    hasher = blake2b(digest, digest_size=16)
+    for embedded in entities:
+        hasher.update(content_hash(embedded))
+    return hasher.digest()
+
+
+class Validator:
+    def __init__(self, shapes=None, check_references=True):
+        """
+        An in-process conformance checker of CASE/UCO entities against the classes of the library: every key must
+        be one set by the entity's class, holding the kind of value (literal type and cardinality) its setter
+        produces, facets must be facet classes, top-level objects object classes, and references must point to
+        an object of the bundle with the @type they state.
+        The results of every top-level object are cached by content hash, so that validating a bundle again only
+        checks the objects that changed, and only serializes the entities that changed to compute the hashes (see
+        content_hash()); the references are resolved anew on every run.
+        :param shapes: The constraint tables (see compile_shapes(); compiled from the directory when None)
+        :param check_references: Report references to objects missing from the bundle
+        """
+        self.shapes = compile_shapes() if shapes is None else shapes
+        self.check_references = check_references
+        self.checked = 0
+        self.cached = 0
+        self._cache = dict()
+
+    def clear(self):
+        self._cache.clear()
+
+    def _check_value(self, owner, key, value, kinds, result):
+        issues, references, defined = result
+        if isinstance(value, LazyValue):  # Only checked once serialized
+            return
+        if not any(CHECKS[kind](value) for kind in kinds):
+            issues.append(
+                Issue(
+                    owner.get("@id"),
+                    owner.get("@type"),
+                    key,
+                    f"expected {' or '.join(kinds)}, found {type(value).__name__}",
+                )
+            )
+            return
+        if "reference" in kinds or "references" in kinds or "objects" in kinds:
+            for item in value if isinstance(value, list) else [value]:
+                # An embedded facet without properties looks like a reference: references target objects
+                shape = (
+                    self.shapes.get(item.get("@type")) if "objects" in kinds else None
+                )
+                if _is_reference(item) and (shape is None or shape[0]):
+                    references.append(
+                        (
+                            owner.get("@id"),
+                            owner.get("@type"),
+                            key,
+                            item["@id"],
+                            item.get("@type"),
+                        )
+                    )
+                elif isinstance(item, dict) and "objects" in kinds:
+                    # Facets must be facets; other embedded nodes (e.g. history entries) may be either
+                    role = False if key == "uco-core:hasFacet" else None
+                    self._check_entity(item, role, result, skip=())
+
+    def _check_entity(self, entity, is_object, result, skip=OBJECT_KEYS):
+        """
+        Check an entity and the nodes embedded in it; is_object tells whether it must be an object (True) or a
+        facet (False), or may be either (None).
+        """
+        issues, _, defined = result
+        _id, kind = entity.get("@id"), entity.get("@type")
+        if not isinstance(_id, str):
+            issues.append(Issue(_id, kind, "@id", "missing or invalid @id"))
+        shape = self.shapes.get(kind)
+        if shape is None:
+            issues.append(Issue(_id, kind, "@type", "unknown type"))
+            return
+        entity_is_object, keys = shape
+        if is_object is not None and entity_is_object != is_object:
+            expected = "an object" if is_object else "a facet"
+            issues.append(Issue(_id, kind, "@type", f"{kind} is not {expected} type"))
+        if isinstance(_id, str):
+            defined.append((_id, kind, content_hash(entity)))
+        for key, value in entity.items():
+            if key in skip:
+                continue
+            kinds = keys.get(key) or keys.get(ANY_KEY)
+            if kinds is None:
+                issues.append(Issue(_id, kind, key, "unexpected key"))
+            else:
+                self._check_value(entity, key, value, kinds, result)
+
+    def _check_object(self, obj, cache):
+        """
+        The (issues, references, (@id, @type, content hash) of its nodes) of a top-level object, from the cache when
+        unchanged.
+        """
+        digest = content_hash(obj)
+        result = self._cache.get(digest)
+        if result is None:
+            result = ([], [], [])
+            self._check_entity(obj, True, result, skip=())
+            self.checked += 1
+        else:
+            self.cached += 1
+        cache[digest] = result
+        return result
+
+    def _validate(self, objects, header=None):
+        """
+        Validate objects, then the bundle's own properties (header() returns them once the objects are consumed),
+        then resolve the references.
+        """
+        self.checked = self.cached = 0
+        issues, references, types, digests = [], [], dict(), dict()
+        cache = dict()
+        for obj in objects:
+            object_issues, object_references, defined = self._check_object(obj, cache)
+            issues.extend(object_issues)
+            references.extend(object_references)
+            for _id, kind, digest in defined:
+                # A node may be defined more than once (e.g. embedded both at top level and in an investigation),
+                # as long as the definitions agree
+                if digests.setdefault(_id, digest) != digest:
+                    issues.append(
+                        Issue(_id, kind, "@id", "duplicate @id with different content")
+                    )
+                types[_id] = kind
+        # Only the objects seen by this run are kept, so the cache does not outgrow the bundle
+        self._cache = cache
+        header = header() if header is not None else None
+        if header:
+            result = ([], references, [])
+            self._check_entity(header, True, result)
+            issues.extend(result[0])
+            types[header.get("@id")] = header.get("@type")
+        for _id, kind, key, target, target_type in references:
+            if target not in types:
+                if self.check_references:
+                    issues.append(
+                        Issue(_id, kind, key, f"reference to a missing object {target}")
+                    )
+            elif target_type is not None and types[target] != target_type:
+                issues.append(
+                    Issue(
+                        _id,
+                        kind,
+                        key,
+                        f"reference to {target} as {target_type}, which is a {types[target]}",
+                    )
+                )
+        return issues
+
+    def validate_objects(self, objects):
+        """
+        Validate top-level objects (without a bundle).
+        :return: A list of Issues (id, type, key, message), empty when the objects conform
+        """
+        return self._validate(objects)
+
+    def validate_bundle(self, bundle):
+        """
+        Validate a Bundle and its objects.
+        :return: A list of Issues (id, type, key, message), empty when the bundle conforms
+        """
+        return self._validate(
+            (obj for key in OBJECT_KEYS for obj in bundle.get(key) or []),
+            lambda: bundle,
+        )
+
+    def validate_case_file(self, path):
+        """
+        Validate a CASE file, read incrementally (see stream.iter_case_file()); memory use is bounded by the
+        largest object and the references to resolve.
+        :return: A list of Issues (id, type, key, message), empty when the file conforms
+        """
+        header = dict()
+
+        def objects():
+            for event, key, value in iter_case_file(path):
+                if event == "object":
+                    yield value
+                else:
+                    header[key] = value
+
+        return self._validate(objects(), lambda: header)
@@ -235,15 +235,17 @@ message_thread_facet = uco.observable.FacetMessagethread(
 
 message_thread_object.append_facets(message_thread_facet)
 
-# TODO Restore from list-style demo.
-# Append more messages to MessageThread
-# message_thread_facet.append_messages(messages=message_3)
+# Append more messages to MessageThread: a 4th message follows the 3rd one.
+message_4 = uco.observable.Message()
+message_4.append_facets(uco.observable.FacetMessage())
+message_thread_facet.append_messages({message_3["@id"]: [message_4]})
 
 # Add all objects to bundle
 objs = (
     message_1,
     message_2,
     message_3,
+    message_4,
     message_thread_object,
 )
 bundle.append_to_uco_object(objs)
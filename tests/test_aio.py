@@ -0,0 +1,40 @@
+import asyncio
+import json
+import time
+
+from case_mapping import uco
+from case_mapping.aio import AsyncBundleWriter
+
+
+def test_async_writer(tmp_path) -> None:
+    path = tmp_path / "case.json"
+    lags = []
+
+    async def probe(stop):
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - start)
+
+    async def main():
+        stop = asyncio.Event()
+        probe_task = asyncio.ensure_future(probe(stop))
+        async with AsyncBundleWriter(
+            path, uco.core.Bundle(), max_queue=16, batch_size=8
+        ) as writer:
+            for i in range(2000):
+                obj = uco.observable.ObservableObject()
+                obj.append_facets(uco.observable.FacetFile(file_name=f"{i}.jpg"))
+                await writer.append(obj)
+                assert writer._queue.qsize() <= 16
+        stop.set()
+        await probe_task
+        return writer.objects_written
+
+    assert asyncio.run(main()) == 2000
+    objects = json.loads(path.read_text())["uco-core:object"]
+    assert [
+        obj["uco-core:hasFacet"][0]["uco-observable:fileName"] for obj in objects
+    ] == [f"{i}.jpg" for i in range(2000)]
+    # Serialization runs off the event loop, which keeps running while the objects are written
+    assert lags and max(lags) < 0.5
@@ -0,0 +1,73 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from case_mapping import uco
+from case_mapping.builder import (
+    ParallelBundleBuilder,
+    bounded_map,
+    chunked,
+    row_ranges,
+)
+from case_mapping.stream import BundleWriter
+
+
+def _map_files(unit):
+    objects = []
+    for name, content in unit:
+        file_object = uco.observable.ObservableObject()
+        file_object.append_facets(
+            uco.observable.FacetFile(file_name=name, size_bytes=len(content)),
+            uco.observable.FacetContentData(
+                size_bytes=len(content),
+                hash_method="SHA256",
+                hash_value=hashlib.sha256(content).hexdigest(),
+            ),
+        )
+        objects.append(file_object)
+    return objects
+
+
+FILES = [(f"file{i}.bin", bytes([i % 256]) * i) for i in range(200)]
+
+
+def test_partitioning() -> None:
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(row_ranges(5, 2)) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_bounded_map() -> None:
+    consumed = []
+
+    def items():
+        for i in range(20):
+            consumed.append(i)
+            yield i
+
+    with ThreadPoolExecutor(2) as executor:
+        results = bounded_map(executor, lambda i: i * i, items(), 3)
+        assert next(results) == 0
+        # The input is only read ahead by the window
+        assert len(consumed) == 3
+        assert list(results) == [i * i for i in range(1, 20)]
+
+
+def test_build_bundle_in_order() -> None:
+    builder = ParallelBundleBuilder(_map_files, max_workers=2, max_pending=3)
+    bundle = builder.build(chunked(FILES, 16), uco.core.Bundle())
+
+    objects = bundle["uco-core:object"]
+    assert [
+        obj["uco-core:hasFacet"][0]["uco-observable:fileName"] for obj in objects
+    ] == [name for name, _ in FILES]
+    assert isinstance(
+        objects[0]["uco-core:hasFacet"][1], uco.observable.FacetContentData
+    )
+
+
+def test_write_to_writer(tmp_path) -> None:
+    builder = ParallelBundleBuilder(_map_files, max_workers=2)
+    with BundleWriter(tmp_path / "case.json", uco.core.Bundle()) as writer:
+        assert builder.write(chunked(FILES, 50), writer) == len(FILES)
+    case = json.loads((tmp_path / "case.json").read_text())
+    assert len(case["uco-core:object"]) == len(FILES)
@@ -0,0 +1,57 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from case_mapping import uco
+from case_mapping.stream import BundleWriter
+
+ITEMS = 4000
+
+
+def _extract(appender, shared, index):
+    obj = uco.observable.ObservableObject()
+    appender.append_facets(
+        obj, uco.observable.FacetPhoneAccount(phone_number=str(index))
+    )
+    appender.append_to_uco_object(obj, order=index)
+    # Direct (unbuffered) appends to one shared object must not lose items either.
+    shared.append_facets(uco.observable.FacetAccount(identifier=str(index)))
+
+
+def test_concurrent_appends_lose_nothing_and_are_ordered() -> None:
+    for threads in (1, 2, 4, 8):
+        bundle = uco.core.Bundle()
+        shared = uco.observable.ObservableObject()
+        with bundle.concurrent_appends() as appender:
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(lambda i: _extract(appender, shared, i), range(ITEMS)))
+
+        objects = bundle["uco-core:object"]
+        assert len(objects) == ITEMS
+        assert len(shared["uco-core:hasFacet"]) == ITEMS
+        numbers = [
+            obj["uco-core:hasFacet"][0]["uco-observable:phoneNumber"] for obj in objects
+        ]
+        assert numbers == [str(i) for i in range(ITEMS)]
+
+
+def test_pending_appends_are_merged_on_serialization() -> None:
+    bundle = uco.core.Bundle()
+    appender = bundle.concurrent_appends()
+    appender.append_to_uco_object(uco.observable.ObservableObject(), order=2)
+    appender.append_to_uco_object(uco.identity.Organization(name="Nikon"), order=1)
+    assert '"uco-core:name": "Nikon"' in str(bundle)
+    assert bundle["uco-core:object"][0]["@type"] == "uco-identity:Organization"
+
+
+def test_pending_appends_are_merged_by_every_serializer() -> None:
+    bundle = uco.core.Bundle()
+    appender = bundle.concurrent_appends()
+    appender.append_to_uco_object(uco.observable.ObservableObject(), order=1)
+    assert len(json.loads(json.dumps(bundle))["uco-core:object"]) == 1
+
+    appender.append_to_uco_object(uco.observable.ObservableObject(), order=2)
+    output = io.StringIO()
+    with BundleWriter(output, bundle):
+        pass
+    assert len(json.loads(output.getvalue())["uco-core:object"]) == 2
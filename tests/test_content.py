@@ -0,0 +1,57 @@
+import hashlib
+import math
+
+from case_mapping import content, uco
+from case_mapping.content import digest_buffer
+
+CONTENT = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 64
+
+
+def test_from_path_hashes_in_one_pass(tmp_path) -> None:
+    path = tmp_path / "IMG_0123.jpg"
+    path.write_bytes(CONTENT)
+    facet = uco.observable.FacetContentData.from_path(path, mime_type="image/jpg")
+
+    hashes = {
+        h["uco-types:hashMethod"]: h["uco-types:hashValue"]["@value"]
+        for h in facet["uco-observable:hash"]
+    }
+    assert hashes == {
+        "MD5": hashlib.md5(CONTENT).hexdigest(),
+        "SHA1": hashlib.sha1(CONTENT).hexdigest(),
+        "SHA256": hashlib.sha256(CONTENT).hexdigest(),
+    }
+    assert facet["uco-observable:sizeInBytes"] == len(CONTENT)
+    assert facet["uco-observable:magicNumber"] == "/9j/4A=="
+    assert facet["uco-observable:mimeType"] == "image/jpg"
+    assert math.isclose(facet["uco-observable:entropy"], 8.0, abs_tol=0.01)
+
+
+def test_from_buffer_and_empty_content(tmp_path) -> None:
+    facet = uco.observable.FacetContentData.from_buffer(b"aaaa", algorithms=["SHA256"])
+    assert len(facet["uco-observable:hash"]) == 1
+    assert facet["uco-observable:entropy"] == 0.0
+
+    (tmp_path / "empty").write_bytes(b"")
+    facet = uco.observable.FacetContentData.from_path(tmp_path / "empty", entropy=False)
+    assert facet["uco-observable:sizeInBytes"] == 0
+    assert "uco-observable:entropy" not in facet
+
+
+def test_chunking_does_not_change_digest() -> None:
+    assert digest_buffer(CONTENT, chunk_size=1000) == digest_buffer(CONTENT)
+
+
+def test_no_hash_node_without_hash() -> None:
+    assert "uco-observable:hash" not in uco.observable.FacetContentData(size_bytes=1)
+    assert "uco-observable:hash" not in uco.observable.FacetContentData(hash_value="-")
+
+
+def test_without_numpy(monkeypatch) -> None:
+    # The pure Python histogram used without the "fast" extra gives the same results as NumPy's
+    expected = digest_buffer(CONTENT + b"\0" * 1000, chunk_size=4096)
+    monkeypatch.setattr(content, "numpy", None)
+    digest = digest_buffer(CONTENT + b"\0" * 1000, chunk_size=4096)
+    assert math.isclose(digest.pop("entropy"), expected.pop("entropy"))
+    assert digest == expected
+    assert digest_buffer(b"")["entropy"] == 0.0
@@ -0,0 +1,82 @@
+import json
+
+from case_mapping import uco
+from case_mapping.dedup import Deduplicator
+
+
+def _phone(number):
+    phone = uco.observable.ObservableObject()
+    phone.append_facets(uco.observable.FacetPhoneAccount(phone_number=number))
+    return phone
+
+
+def _email_account(address):
+    address_object = uco.observable.ObservableObject()
+    address_object.append_facets(
+        uco.observable.FacetEmailAddress(email_address_value=address)
+    )
+    account_object = uco.observable.ObservableObject()
+    account_object.append_facets(
+        uco.observable.FacetEmailAccount(email_address=address_object)
+    )
+    return account_object, address_object
+
+
+def _build_bundle():
+    bundle = uco.core.Bundle(description="dedup")
+    nikon_1 = uco.identity.Organization(name="Nikon")
+    nikon_2 = uco.identity.Organization(name="Nikon")
+    device = uco.observable.ObservableObject()
+    device.append_facets(uco.observable.FacetDevice(manufacturer=nikon_2, model="D750"))
+    phone_1, phone_2, phone_3 = _phone("123456"), _phone("123456"), _phone("987654")
+    message = uco.observable.ObservableObject()
+    message.append_facets(
+        uco.observable.FacetMessage(msg_to=[phone_2, phone_3], msg_from=phone_2)
+    )
+    # Accounts are listed before the addresses they reference, so they only become identical in a later pass.
+    account_1, address_1 = _email_account("info@example.com")
+    account_2, address_2 = _email_account("info@example.com")
+    bundle.append_to_uco_object(
+        nikon_1, nikon_2, device, phone_1, phone_2, phone_3, message
+    )
+    bundle.append_to_uco_object(account_1, address_1, account_2, address_2)
+    return bundle, locals()
+
+
+def test_deduplicate_bundle() -> None:
+    bundle, objs = _build_bundle()
+    removed = Deduplicator().deduplicate_bundle(bundle)
+
+    assert removed == 4
+    ids = [obj["@id"] for obj in bundle["uco-core:object"]]
+    for name in ("nikon_2", "phone_2", "account_2", "address_2"):
+        assert objs[name]["@id"] not in ids
+    facet = objs["device"]["uco-core:hasFacet"][0]
+    assert facet["uco-observable:manufacturer"]["@id"] == objs["nikon_1"]["@id"]
+    message_facet = objs["message"]["uco-core:hasFacet"][0]
+    assert message_facet["uco-observable:from"]["@id"] == objs["phone_1"]["@id"]
+    assert [ref["@id"] for ref in message_facet["uco-observable:to"]] == [
+        objs["phone_1"]["@id"],
+        objs["phone_3"]["@id"],
+    ]
+
+
+def test_deduplicate_case_file(tmp_path) -> None:
+    bundle, objs = _build_bundle()
+    source, destination = tmp_path / "in.json", tmp_path / "out.json"
+    source.write_text(str(bundle))
+
+    removed = Deduplicator(work_dir=tmp_path).deduplicate_case_file(source, destination)
+
+    Deduplicator().deduplicate_bundle(bundle)
+    assert removed == 4
+    assert json.loads(destination.read_text()) == json.loads(str(bundle))
+
+
+def test_objects_without_keys_are_kept() -> None:
+    bundle = uco.core.Bundle()
+    bundle.append_to_uco_object(
+        uco.observable.Message(), uco.observable.Message(), _phone(None)
+    )
+    assert Deduplicator().deduplicate_bundle(bundle) == 0
+    assert len(bundle["uco-core:object"]) == 3
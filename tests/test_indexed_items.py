@@ -0,0 +1,69 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.base import OrderedSlots
+from case_mapping.directory import load_entity
+from case_mapping.stream import BundleWriter
+
+ITEMS = 100000
+
+
+def _allocated(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def test_slots() -> None:
+    items = [uco.observable.ObservableObject() for _ in range(5)]
+    message = uco.observable.Message(indexed_items=items[:3])
+    message.append_indexed_items(items[3], items[4])
+
+    slots = message["olo:slot"]
+    assert message["olo:length"] == "5"
+    assert len(slots) == 5
+    assert slots[0] == {"olo:index": "1", "olo:item": {"@id": items[0]["@id"]}}
+    assert slots[-1]["olo:item"]["@id"] == items[4]["@id"]
+    assert [slot["olo:index"] for slot in slots[1:3]] == ["2", "3"]
+    with pytest.raises(IndexError):
+        slots[5]
+
+    # Serialized as a list, whatever the serializer
+    assert isinstance(slots, list)
+    encoded = json.loads(str(message))["olo:slot"]
+    assert encoded == slots == json.loads(json.dumps(message))["olo:slot"]
+    output = io.StringIO()
+    with BundleWriter(output) as writer:
+        writer.write(message)
+    assert json.loads(output.getvalue())["uco-core:object"][0]["olo:slot"] == encoded
+
+    # Loaded messages keep accepting items
+    loaded = load_entity(json.loads(str(message)))
+    loaded.append_indexed_items(uco.observable.ObservableObject())
+    assert loaded["olo:length"] == "6"
+    assert loaded["olo:slot"][:5] == encoded
+    assert isinstance(loaded["olo:slot"], OrderedSlots)
+
+
+def test_empty_slots() -> None:
+    message = uco.observable.Message()
+    assert message["olo:slot"] is None and message["olo:length"] is None
+
+
+def test_memory_saved() -> None:
+    ids = [str(i).zfill(36) for i in range(ITEMS)]
+
+    def legacy():
+        return [
+            {"olo:index": str(i + 1), "olo:item": {"@id": _id}}
+            for i, _id in enumerate(ids)
+        ]
+
+    assert _allocated(lambda: OrderedSlots(ids)) * 10 < _allocated(legacy)
@@ -0,0 +1,144 @@
+import json
+import sqlite3
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.base import json_default
+from case_mapping.ingest.browser import WEBKIT_EPOCH_OFFSET, BrowserHistoryIngester
+from case_mapping.stream import BundleWriter
+
+# 2021-03-04T05:06:07Z
+TIMESTAMP = 1614834367000000
+
+
+def _chromium(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE urls (id INTEGER PRIMARY KEY, url TEXT, title TEXT, visit_count INTEGER,
+                           typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER);
+        CREATE TABLE visits (id INTEGER PRIMARY KEY, url INTEGER, visit_time INTEGER, from_visit INTEGER);
+        """
+    )
+    webkit = TIMESTAMP + WEBKIT_EPOCH_OFFSET
+    connection.executemany(
+        "INSERT INTO urls VALUES (?, ?, ?, ?, ?, ?, 0)",
+        [
+            (
+                1,
+                "https://example.com:8443/a?q=1#top",
+                "Example",
+                2,
+                1,
+                webkit + 60000000,
+            ),
+            (2, "https://example.org/", "", 0, 0, 0),
+        ]
+        + [(i, f"https://example.net/{i}", None, 1, 0, webkit) for i in range(3, 26)],
+    )
+    connection.executemany(
+        "INSERT INTO visits (url, visit_time) VALUES (?, ?)",
+        [(1, webkit), (1, webkit + 60000000)],
+    )
+    connection.commit()
+    connection.close()
+
+
+def _firefox(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url TEXT, title TEXT, visit_count INTEGER,
+                                 typed INTEGER, last_visit_date INTEGER);
+        CREATE TABLE moz_historyvisits (id INTEGER PRIMARY KEY, place_id INTEGER, visit_date INTEGER);
+        """
+    )
+    connection.execute(
+        "INSERT INTO moz_places VALUES (1, 'https://example.com:8443/a?q=1#top', 'Example', 1, 0, ?)",
+        (TIMESTAMP,),
+    )
+    connection.execute("INSERT INTO moz_historyvisits VALUES (1, 1, ?)", (TIMESTAMP,))
+    connection.commit()
+    connection.close()
+
+
+def test_chromium_history(tmp_path) -> None:
+    path = tmp_path / "History"
+    _chromium(path)
+    bundle = uco.core.Bundle()
+    ingester = BrowserHistoryIngester(path, batch_size=10)
+    assert ingester.ingest(bundle) == 25
+    assert ingester.browser == "chromium"
+
+    objects = bundle["uco-core:object"]
+    assert len(objects) == 26
+    url = objects[0]["uco-core:hasFacet"][0]
+    assert url["uco-observable:host"] == "example.com"
+    assert url["uco-observable:port"] == 8443
+    entries = objects[-1]["uco-core:hasFacet"][0]["uco-observable:urlHistoryEntry"]
+    assert len(entries) == 25
+    assert entries[0]["uco-observable:url"]["@id"] == objects[0]["@id"]
+    assert (
+        entries[0]["uco-observable:firstVisit"]["@value"] == "2021-03-04T05:06:07+00:00"
+    )
+    assert (
+        entries[0]["uco-observable:lastVisit"]["@value"] == "2021-03-04T05:07:07+00:00"
+    )
+    assert entries[0]["uco-observable:manuallyEnteredCount"] == 1
+    assert "uco-observable:lastVisit" not in entries[1]
+    assert "uco-observable:pageTitle" not in entries[1]
+
+
+def test_urls_are_interned_across_databases(tmp_path) -> None:
+    _chromium(tmp_path / "History")
+    _firefox(tmp_path / "places.sqlite")
+    bundle = uco.core.Bundle()
+    chromium = BrowserHistoryIngester(tmp_path / "History")
+    chromium.ingest(bundle)
+    firefox = BrowserHistoryIngester(tmp_path / "places.sqlite", urls=chromium.urls)
+    assert firefox.ingest(bundle) == 1
+    assert firefox.browser == "firefox"
+    # Only the history observable is added for the second database
+    assert len(bundle["uco-core:object"]) == 27
+    entry = bundle["uco-core:object"][-1]["uco-core:hasFacet"][0][
+        "uco-observable:urlHistoryEntry"
+    ][0]
+    assert entry["uco-observable:url"]["@id"] == bundle["uco-core:object"][0]["@id"]
+    assert entry["uco-observable:firstVisit"]["@value"] == "2021-03-04T05:06:07+00:00"
+
+
+def test_streamed_entries(tmp_path) -> None:
+    path = tmp_path / "History"
+    _chromium(path)
+    case_path = tmp_path / "case.json"
+    with BundleWriter(case_path, indent=2) as writer:
+        assert BrowserHistoryIngester(path, batch_size=7).ingest(writer) == 25
+    objects = json.loads(case_path.read_text())["uco-core:object"]
+    entries = objects[-1]["uco-core:hasFacet"][0]["uco-observable:urlHistoryEntry"]
+    assert len(entries) == 25
+    assert [entry["uco-observable:url"]["@id"] for entry in entries] == [
+        obj["@id"] for obj in objects[:-1]
+    ]
+
+
+def test_streamed_facet_json_dumps(tmp_path) -> None:
+    path = tmp_path / "History"
+    _chromium(path)
+    written = []
+
+    class Writer(BundleWriter):
+        def write(self, *args, key="uco-core:object"):
+            written.extend(args)
+            super().write(*args, key=key)
+
+    with Writer(tmp_path / "case.json") as writer:
+        BrowserHistoryIngester(path).ingest(writer)
+    facet = written[-1]["uco-core:hasFacet"][0]
+    # As documented: the lazily read entries need the default hook
+    with pytest.raises(TypeError):
+        json.dumps(facet)
+    entries = json.loads(json.dumps(facet, default=json_default))[
+        "uco-observable:urlHistoryEntry"
+    ]
+    assert len(entries) == 25
@@ -0,0 +1,188 @@
+import multiprocessing
+import struct
+import uuid
+import zlib
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.ingest.disk import DiskImageIngester, read_partition_table
+
+LINUX_GUID = uuid.UUID("0fc63daf-8483-4772-8e79-3d69d8477de4")
+EFI_GUID = uuid.UUID("c12a7328-f81f-11d2-ba4b-00a0c93ec93b")
+
+
+def _table(entries):
+    """
+    A 512 byte MBR/EBR with (status, type, first LBA, number of sectors) entries.
+    """
+    sector = bytearray(512)
+    for index, (status, kind, first, count) in enumerate(entries):
+        struct.pack_into(
+            "<B3sB3sII", sector, 446 + 16 * index, status, b"", kind, b"", first, count
+        )
+    sector[510:512] = b"\x55\xaa"
+    return sector
+
+
+def _mbr_image(path, size=64 << 20):
+    with open(path, "wb") as fp:
+        fp.truncate(size)
+        # Two primary partitions and an extended partition (LBA 10000) with two logical partitions
+        fp.write(
+            _table(
+                [
+                    (0x80, 0x0C, 2048, 4096),
+                    (0, 0x83, 6144, 2048),
+                    (0, 0x0F, 10000, 20000),
+                ]
+            )
+        )
+        fp.seek(10000 * 512)
+        fp.write(_table([(0, 0x83, 63, 1000), (0, 0x05, 2000, 3000)]))
+        fp.seek(12000 * 512)
+        fp.write(_table([(0, 0x82, 63, 500)]))
+    return path
+
+
+def _gpt_image(path, sector_size=512, size=16 << 20):
+    entries = bytearray(128 * 128)
+    for index, (type_guid, first, last, name) in enumerate(
+        [(EFI_GUID, 34, 2081, "EFI"), (LINUX_GUID, 2082, 8000, "root")]
+    ):
+        struct.pack_into(
+            "<16s16sQQQ72s",
+            entries,
+            index * 128,
+            type_guid.bytes_le,
+            uuid.UUID(int=index + 1).bytes_le,
+            first,
+            last,
+            0,
+            name.encode("utf-16-le"),
+        )
+    header = bytearray(
+        struct.pack(
+            "<8sIIIIQQQQ16sQIII",
+            b"EFI PART",
+            0x10000,
+            92,
+            0,
+            0,
+            1,
+            size // sector_size - 1,
+            34,
+            size // sector_size - 34,
+            uuid.UUID(int=99).bytes_le,
+            2,
+            128,
+            128,
+            zlib.crc32(entries),
+        )
+    )
+    struct.pack_into("<I", header, 16, zlib.crc32(header))
+    with open(path, "wb") as fp:
+        fp.truncate(size)
+        fp.write(_table([(0, 0xEE, 1, size // sector_size - 1)]))
+        fp.seek(sector_size)
+        fp.write(header)
+        fp.seek(2 * sector_size)
+        fp.write(entries)
+    return path
+
+
+def test_mbr_with_extended_partitions(tmp_path) -> None:
+    table = read_partition_table(_mbr_image(tmp_path / "mbr.img"))
+    assert table["scheme"] == "mbr"
+    assert [
+        (p["number"], p["type"], p["offset"] // 512, p["size"] // 512)
+        for p in table["partitions"]
+    ] == [
+        (1, "FAT32 (LBA)", 2048, 4096),
+        (2, "Linux", 6144, 2048),
+        (3, "Extended (LBA)", 10000, 20000),
+        (5, "Linux", 10063, 1000),
+        (6, "Linux swap", 12063, 500),
+    ]
+    assert table["partitions"][0]["bootable"]
+
+
+def test_gpt(tmp_path) -> None:
+    table = read_partition_table(_gpt_image(tmp_path / "gpt.img"))
+    assert table["scheme"] == "gpt"
+    assert table["disk_guid"] == str(uuid.UUID(int=99))
+    efi, root = table["partitions"]
+    assert (efi["type"], efi["offset"], efi["size"]) == (
+        "EFI System",
+        34 * 512,
+        2048 * 512,
+    )
+    assert (root["type"], root["name"]) == ("Linux filesystem", "root")
+    assert root["guid"] == str(uuid.UUID(int=2))
+
+    path = _gpt_image(tmp_path / "gpt4k.img", sector_size=4096)
+    table = read_partition_table(path)
+    assert table["sector_size"] == 4096
+    assert table["partitions"][1]["offset"] == 2082 * 4096
+
+
+def test_directory_of_images(tmp_path) -> None:
+    _mbr_image(tmp_path / "a.img")
+    _gpt_image(tmp_path / "b.img")
+    (tmp_path / "notes.txt").write_text("not a disk image")
+    ingester = DiskImageIngester(
+        workers=2, chunk_size=1, mp_context=multiprocessing.get_context("spawn")
+    )
+    bundle = uco.core.Bundle()
+    assert ingester.ingest([tmp_path], bundle) == 5 + 1 + 2 + 1
+    assert len(ingester.errors) == 1
+
+    objects = bundle["uco-core:object"]
+    disk = objects[5]["uco-core:hasFacet"]
+    assert disk[0]["uco-observable:fileName"] == "a.img"
+    assert disk[1]["@type"] == "uco-observable:DiskFacet"
+    assert disk[1]["uco-observable:diskSize"] == 64 << 20
+    assert [ref["@id"] for ref in disk[1]["uco-observable:partition"]] == [
+        obj["@id"] for obj in objects[:5]
+    ]
+    partition = objects[4]["uco-core:hasFacet"][0]
+    assert partition["uco-observable:diskPartitionType"] == "Linux swap"
+    assert partition["uco-observable:partitionOffset"] == 12063 * 512
+    assert partition["uco-observable:totalSpace"] == 500 * 512
+    gpt_partition = objects[6]["uco-core:hasFacet"][0]
+    assert gpt_partition["uco-observable:serialNumber"] == str(uuid.UUID(int=1))
+
+
+def test_partitionless_volumes(tmp_path) -> None:
+    # FAT32 and NTFS volume boot records end in 55AA too, but are not partition tables
+    fat32 = _table([])
+    fat32[0:3] = b"\xeb\x58\x90"
+    fat32[3:11] = b"MSDOS5.0"
+    struct.pack_into("<HB", fat32, 11, 512, 8)
+    fat32[82:90] = b"FAT32   "
+    ntfs = _table([])
+    ntfs[0:11] = b"\xeb\x52\x90NTFS    "
+    # Garbage in the partition entries
+    garbage = _table([(0x80, 0x83, 2048, 4096)])
+    garbage[446 + 16] = 0x17
+    for name, sector, message in [
+        ("fat32", fat32, "FAT32 volume boot record"),
+        ("ntfs", ntfs, "NTFS volume boot record"),
+        ("garbage", garbage, "status 0x17"),
+        ("outside", _table([(0, 0x83, 2048, 1 << 30)]), "outside the image"),
+    ]:
+        path = tmp_path / f"{name}.img"
+        with open(path, "wb") as fp:
+            fp.truncate(8 << 20)
+            fp.write(sector)
+        with pytest.raises(ValueError, match=message):
+            read_partition_table(path)
+
+    # A boot loader starting with a jump but without a BIOS parameter block is still an MBR
+    path = tmp_path / "grub.img"
+    sector = _table([(0x80, 0x83, 2048, 4096)])
+    sector[0:3] = b"\xeb\x63\x90"
+    with open(path, "wb") as fp:
+        fp.truncate(8 << 20)
+        fp.write(sector)
+    assert len(read_partition_table(path)["partitions"]) == 1
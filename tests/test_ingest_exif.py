@@ -0,0 +1,135 @@
+import struct
+
+from case_mapping import uco
+from case_mapping.ingest.exif import ExifExtractor, image_facets, read_image_header
+
+
+def _tiff(endian, entries, sub_entries=()):
+    """
+    TIFF data with one IFD0 (entries) and an optional Exif IFD (sub_entries), as lists of (tag, type, count, data).
+    """
+
+    def ifd(offset, items):
+        table = struct.pack(endian + "H", len(items))
+        extra = b""
+        data_offset = offset + 2 + 12 * len(items) + 4
+        for tag, field_type, count, data in items:
+            if len(data) <= 4:
+                table += struct.pack(endian + "HHI", tag, field_type, count)
+                table += data.ljust(4, b"\0")
+            else:
+                table += struct.pack(
+                    endian + "HHII", tag, field_type, count, data_offset + len(extra)
+                )
+                extra += data
+        return table + b"\0\0\0\0" + extra
+
+    order = b"II" if endian == "<" else b"MM"
+    head = order + struct.pack(endian + "HI", 42, 8)
+    if sub_entries:
+        first = ifd(8, entries + [(0x8769, 4, 1, b"\0" * 4)])
+        sub_offset = 8 + len(first)
+        first = ifd(
+            8, entries + [(0x8769, 4, 1, struct.pack(endian + "I", sub_offset))]
+        )
+        return head + first + ifd(sub_offset, sub_entries)
+    return head + ifd(8, entries)
+
+
+def _ascii(text):
+    return text.encode() + b"\0"
+
+
+def _jpeg(tmp_path):
+    tiff = _tiff(
+        ">",
+        [
+            (0x010F, 2, 6, _ascii("Canon")),
+            (0x0110, 2, 13, _ascii("Canon EOS 5D")),
+            (0x0112, 3, 1, struct.pack(">H", 1)),
+        ],
+        [
+            (0x9003, 2, 20, _ascii("2021:03:04 05:06:07")),
+            (0x829D, 5, 1, struct.pack(">II", 28, 10)),
+        ],
+    )
+    app1 = b"Exif\0\0" + tiff
+    sof0 = struct.pack(">BHHB", 8, 480, 640, 3) + b"\0" * 9
+    data = (
+        b"\xff\xd8"
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xc0"
+        + struct.pack(">H", len(sof0) + 2)
+        + sof0
+        + b"\xff\xda\x00\x02"
+        + b"\x55" * 100000
+        + b"\xff\xd9"
+    )
+    path = tmp_path / "picture.jpg"
+    path.write_bytes(data)
+    return path
+
+
+def test_jpeg_header(tmp_path) -> None:
+    header = read_image_header(_jpeg(tmp_path))
+    assert header["picture_type"] == "jpg"
+    assert (header["width"], header["height"], header["bits_per_pixel"]) == (
+        640,
+        480,
+        24,
+    )
+    assert header["compression"] == "Baseline DCT"
+    assert header["tags"] == {
+        "Make": "Canon",
+        "Model": "Canon EOS 5D",
+        "Orientation": "1",
+        "DateTimeOriginal": "2021:03:04 05:06:07",
+        "FNumber": "2.8",
+    }
+
+    exif, picture = image_facets(header)
+    entries = exif["uco-observable:exifData"]["uco-types:entry"]
+    assert {entry["uco-types:key"] for entry in entries} >= {"Make", "FNumber"}
+    assert picture["uco-observable:pictureWidth"] == 640
+
+
+def test_tiff_header(tmp_path) -> None:
+    path = tmp_path / "scan.tif"
+    path.write_bytes(
+        _tiff(
+            "<",
+            [
+                (0x0100, 3, 1, struct.pack("<H", 20)),
+                (0x0101, 4, 1, struct.pack("<I", 10)),
+                (0x0102, 3, 3, struct.pack("<HHH", 8, 8, 8)),
+                (0x0103, 3, 1, struct.pack("<H", 5)),
+            ],
+        )
+    )
+    header = read_image_header(path)
+    assert (header["width"], header["height"], header["bits_per_pixel"]) == (
+        20,
+        10,
+        24,
+    )
+    assert header["compression"] == "LZW"
+
+
+def test_extractor(tmp_path) -> None:
+    jpeg = _jpeg(tmp_path)
+    other = tmp_path / "notes.txt"
+    other.write_text("not a picture")
+    paths = [jpeg, other, tmp_path / "missing.jpg"] + [jpeg] * 4
+
+    extractor = ExifExtractor(workers=2, chunk_size=2)
+    bundle = uco.core.Bundle()
+    assert extractor.ingest(paths, bundle) == 5
+    assert len(extractor.errors) == 1
+    facets = bundle["uco-core:object"][0]["uco-core:hasFacet"]
+    assert [facet["@type"] for facet in facets] == [
+        "uco-observable:FileFacet",
+        "uco-observable:EXIFFacet",
+        "uco-observable:RasterPictureFacet",
+    ]
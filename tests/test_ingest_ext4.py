@@ -0,0 +1,178 @@
+import struct
+from datetime import datetime, timezone
+
+import pytest
+
+from case_mapping import uco
+
+numpy = pytest.importorskip("numpy")
+
+from case_mapping.ingest.ext4 import Ext4Reader, ExtInodeIngester  # noqa: E402
+
+BLOCK_SIZE = 1024
+INODES_PER_GROUP = 32
+INODE_SIZE = 256
+CHANGED = 1700000000
+
+
+def _inode(image, group_table, number, **fields):
+    offset = group_table * BLOCK_SIZE + ((number - 1) % INODES_PER_GROUP) * INODE_SIZE
+    struct.pack_into(
+        "<HHIiiiIHH",
+        image,
+        offset,
+        fields.get("mode", 0),
+        fields.get("uid", 0),
+        fields.get("size", 0),
+        fields.get("atime", 0),
+        fields.get("ctime", 0),
+        fields.get("mtime", 0),
+        fields.get("dtime", 0),
+        fields.get("gid", 0),
+        fields.get("links", 0),
+    )
+    struct.pack_into("<I", image, offset + 32, fields.get("flags", 0))
+    struct.pack_into("<HH", image, offset + 120, fields.get("uid_high", 0), 0)
+    # i_extra_isize, i_ctime_extra, i_mtime_extra, i_atime_extra, i_crtime, i_crtime_extra
+    struct.pack_into(
+        "<HHIIIiI",
+        image,
+        offset + 128,
+        32,
+        0,
+        fields.get("ctime_ns", 0) << 2,
+        0,
+        0,
+        fields.get("crtime", 0),
+        0,
+    )
+
+
+def _image(path, uninit_second_group=False):
+    """
+    A tiny two-group ext4 file system: 1 KiB blocks, 32 inodes of 256 bytes per group, the group descriptors in
+    block 2, and the inode bitmaps and tables of the groups at blocks 3/4 and 13/14.
+    """
+    image = bytearray(64 * BLOCK_SIZE)
+    struct.pack_into("<II", image, 1024, 2 * INODES_PER_GROUP, 64)
+    struct.pack_into("<III", image, 1024 + 20, 1, 0, 0)
+    struct.pack_into("<I", image, 1024 + 32, 32)
+    struct.pack_into("<I", image, 1024 + 40, INODES_PER_GROUP)
+    struct.pack_into("<H", image, 1024 + 56, 0xEF53)
+    struct.pack_into("<I", image, 1024 + 76, 1)
+    struct.pack_into("<IH", image, 1024 + 84, 11, INODE_SIZE)
+    struct.pack_into("<I", image, 1024 + 100, 0x10 if uninit_second_group else 0)
+    image[1024 + 120 : 1024 + 125] = b"cases"
+    for group, (bitmap, table) in enumerate(((3, 4), (13, 14))):
+        flags = 1 if uninit_second_group and group else 0
+        struct.pack_into("<III", image, 2 * BLOCK_SIZE + 32 * group, 0, bitmap, table)
+        struct.pack_into("<H", image, 2 * BLOCK_SIZE + 32 * group + 18, flags)
+    # Inodes 1 to 12 are allocated
+    image[3 * BLOCK_SIZE : 3 * BLOCK_SIZE + 2] = b"\xff\x0f"
+    # Inodes 33 and 34
+    image[13 * BLOCK_SIZE] = 0b01
+    _inode(image, 4, 2, mode=0o40755, links=3, ctime=CHANGED)
+    _inode(
+        image,
+        4,
+        12,
+        mode=0o104755,
+        uid=1000,
+        uid_high=1,
+        gid=100,
+        links=1,
+        size=5000,
+        atime=CHANGED + 20,
+        ctime=CHANGED,
+        ctime_ns=250000000,
+        mtime=CHANGED + 10,
+        crtime=CHANGED - 10,
+        flags=0x80000,
+    )
+    # Deleted: unallocated with a deletion time
+    _inode(image, 4, 13, mode=0o100600, links=0, ctime=CHANGED, dtime=CHANGED + 60)
+    _inode(image, 14, 33, mode=0o120777, links=1, ctime=CHANGED)
+    _inode(image, 14, 34, mode=0o100644, links=0, dtime=CHANGED + 1)
+    path.write_bytes(bytes(image))
+    return path
+
+
+def _facets(obj):
+    ext, file = obj["uco-core:hasFacet"]
+    return ext, file
+
+
+def test_reader(tmp_path) -> None:
+    with Ext4Reader(_image(tmp_path / "ext4.img")) as reader:
+        assert reader.superblock["block_size"] == 1024
+        assert reader.superblock["volume_name"] == "cases"
+        assert [group["inode_table"] for group in reader.groups] == [4096, 14336]
+        tables = list(reader.iter_tables())
+        assert [table["inode"].tolist() for table in tables] == [[2, 12, 13], [33, 34]]
+        assert tables[0]["allocated"].tolist() == [True, True, False]
+        assert tables[0]["uid"].tolist() == [0, 65536 + 1000, 0]
+        assert [
+            table["inode"].tolist() for table in reader.iter_tables(deleted=False)
+        ] == [[2, 12], [33]]
+
+
+def test_ingest(tmp_path) -> None:
+    bundle = uco.core.Bundle()
+    ingester = ExtInodeIngester(_image(tmp_path / "ext4.img"))
+    assert ingester.ingest(bundle) == 5
+    objects = bundle["uco-core:object"]
+
+    ext, file = _facets(objects[1])
+    assert ext["@type"] == "uco-observable:ExtInodeFacet"
+    assert ext["uco-observable:extInodeID"] == 12
+    assert ext["uco-observable:extFileType"] == 0o10
+    assert ext["uco-observable:extPermissions"] == 0o4755
+    assert ext["uco-observable:extHardLinkCount"] == 1
+    assert ext["uco-observable:extFlags"] == 0x80000
+    assert ext["uco-observable:extSUID"] == 65536 + 1000
+    assert ext["uco-observable:extSGID"] == 100
+    assert ext["uco-observable:extInodeChangeTime"]["@value"] == (
+        datetime.fromtimestamp(CHANGED + 0.25, timezone.utc).isoformat()
+    )
+    assert "uco-observable:extDeletionTime" not in ext
+    assert file["uco-observable:sizeInBytes"] == 5000
+    assert file["uco-observable:observableCreatedTime"]["@value"] == (
+        datetime.fromtimestamp(CHANGED - 10, timezone.utc).isoformat()
+    )
+
+    ext, file = _facets(objects[2])
+    assert ext["uco-observable:extHardLinkCount"] == 0
+    assert ext["uco-observable:extDeletionTime"]["@value"] == (
+        datetime.fromtimestamp(CHANGED + 60, timezone.utc).isoformat()
+    )
+    assert "uco-observable:accessedTime" not in file
+
+
+def test_uninitialized_group(tmp_path) -> None:
+    ingester = ExtInodeIngester(_image(tmp_path / "ext4.img", uninit_second_group=True))
+    ids = [
+        _facets(obj)[0]["uco-observable:extInodeID"] for obj in ingester.iter_objects()
+    ]
+    assert ids == [2, 12, 13]
+    with pytest.raises(ValueError):
+        Ext4Reader(_image(tmp_path / "other.img"), offset=512)
+
+
+def test_truncated_image(tmp_path) -> None:
+    image = _image(tmp_path / "ext4.img")
+    content = image.read_bytes()
+    # The second inode table cut inside its second inode
+    image.write_bytes(content[: 14 * BLOCK_SIZE + INODE_SIZE + 10])
+    with Ext4Reader(image) as reader:
+        tables = list(reader.iter_tables())
+        assert [table["inode"].tolist() for table in tables] == [[2, 12, 13], [33]]
+        assert reader.truncated == [1]
+    # Without group descriptors
+    image.write_bytes(content[: 2 * BLOCK_SIZE + 10])
+    with Ext4Reader(image) as reader:
+        assert list(reader.iter_tables()) == []
+        assert reader.truncated == [0, 1]
+    # Without superblock
+    image.write_bytes(content[:1500])
+    with pytest.raises(ValueError, match="truncated"):
+        Ext4Reader(image)
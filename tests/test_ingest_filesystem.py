@@ -0,0 +1,56 @@
+import hashlib
+
+from case_mapping import uco
+from case_mapping.ingest.filesystem import FilesystemIngester
+
+
+def _facet(obj, _type):
+    return next(f for f in obj["uco-core:hasFacet"] if f["@type"] == _type)
+
+
+def test_filesystem_ingest(tmp_path) -> None:
+    (tmp_path / "sdcard" / "DCIM").mkdir(parents=True)
+    (tmp_path / "sdcard" / "DCIM" / "IMG_0123.jpg").write_bytes(b"\xff\xd8jpeg")
+    (tmp_path / "sdcard" / "notes.txt").write_bytes(b"notes")
+    (tmp_path / "empty").mkdir()
+
+    bundle = uco.core.Bundle()
+    ingester = FilesystemIngester(tmp_path, file_system_type="EXT4", workers=4)
+    assert ingester.ingest(bundle) == 11  # 4 directories, 2 files and 5 relationships
+    assert ingester.errors == []
+
+    objects = bundle["uco-core:object"]
+    observables = {
+        _facet(obj, "uco-observable:FileFacet")["uco-observable:filePath"]: obj
+        for obj in objects
+        if obj["@type"] == "uco-observable:ObservableObject"
+    }
+    assert list(observables) == [
+        "/",
+        "/empty",
+        "/sdcard",
+        "/sdcard/DCIM",
+        "/sdcard/notes.txt",
+        "/sdcard/DCIM/IMG_0123.jpg",
+    ]
+    image = observables["/sdcard/DCIM/IMG_0123.jpg"]
+    assert (
+        _facet(image, "uco-observable:FileFacet")["uco-observable:extension"] == "jpg"
+    )
+    content = _facet(image, "uco-observable:ContentDataFacet")
+    assert {"SHA256": hashlib.sha256(b"\xff\xd8jpeg").hexdigest()}.items() <= {
+        h["uco-types:hashMethod"]: h["uco-types:hashValue"]["@value"]
+        for h in content["uco-observable:hash"]
+    }.items()
+
+    containment = {
+        obj["uco-core:source"]["@id"]: obj["uco-core:target"]["@id"]
+        for obj in objects
+        if obj["@type"] == "uco-observable:ObservableRelationship"
+    }
+    assert containment[image["@id"]] == observables["/sdcard/DCIM"]["@id"]
+    assert (
+        containment[observables["/sdcard/notes.txt"]["@id"]]
+        == observables["/sdcard"]["@id"]
+    )
+    assert containment[observables["/sdcard"]["@id"]] == observables["/"]["@id"]
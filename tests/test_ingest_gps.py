@@ -0,0 +1,116 @@
+import re
+
+import pytest
+
+from case_mapping import uco
+
+numpy = pytest.importorskip("numpy")
+
+from case_mapping.ingest.gps import (  # noqa: E402
+    NO_TIME,
+    Track,
+    TrackIngester,
+    _iso_time,
+    _microseconds,
+    haversine,
+    read_csv,
+    read_gpx,
+)
+
+GPX = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="61.185055" lon="9.468836"><name>Start</name></wpt>
+  <trk><trkseg>
+{points}
+  </trkseg></trk>
+</gpx>
+"""
+
+
+def _gpx(path, count=100):
+    # About 11 metres north every 10 seconds
+    points = "\n".join(
+        f'    <trkpt lat="{61.0 + i * 0.0001:.6f}" lon="9.5"><ele>{100 + i}</ele>'
+        f"<time>2021-03-04T05:{i // 6:02d}:{i % 6 * 10:02d}Z</time></trkpt>"
+        for i in range(count)
+    )
+    path.write_text(GPX.format(points=points))
+    return path
+
+
+def test_read_gpx(tmp_path) -> None:
+    track = read_gpx(_gpx(tmp_path / "track.gpx"))
+    assert len(track) == 101
+    assert track.latitude[0] == 61.185055
+    assert numpy.isnan(track.altitude[0]) and track.time[0] == NO_TIME
+    assert track.altitude[1] == 100
+    # 2021-03-04T05:00:10Z
+    assert track.time[2] == 1614834010000000
+
+
+def test_iso_times() -> None:
+    # The only fractions and zones datetime.fromisoformat() accepts on Python 3.9
+    accepted = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d{6})?[+-]\d\d:\d\d$")
+    for value, microseconds in (
+        ("2020-01-01T00:00:00Z", 1577836800000000),
+        ("2020-01-01T00:00:00.5Z", 1577836800500000),
+        ("2020-01-01T00:00:00.1234567z", 1577836800123456),
+        ("2020-01-01T01:30:00.25+0130", 1577836800250000),
+        ("2019-12-31T19:00:00-05", 1577836800000000),
+    ):
+        assert accepted.match(_iso_time(value))
+        assert _microseconds(value) == microseconds
+
+
+def test_read_csv(tmp_path) -> None:
+    path = tmp_path / "fixes.csv"
+    path.write_text(
+        "lat;lon;ts\n61.0;9.5;1614834000000\n61.001;9.5;\n61.002;9.5;2021-03-04T05:00:20Z\n"
+    )
+    track = read_csv(
+        path, latitude="lat", longitude="lon", time="ts", time_scale=1000, delimiter=";"
+    )
+    assert track.latitude.tolist() == [61.0, 61.001, 61.002]
+    assert track.time.tolist() == [1614834000000000, NO_TIME, 1614834020000000]
+
+
+def test_downsample() -> None:
+    latitude = 61.0 + numpy.arange(101) * 0.0001
+    track = Track(latitude, numpy.full(101, 9.5), time=numpy.arange(101) * 10000000)
+    step = haversine(latitude[0], 9.5, latitude[1], 9.5)
+    assert 11.1 < step < 11.2
+    # A fix every 100 metres (about every 9 fixes), plus the last one
+    retained = track.downsample(min_distance=100)
+    assert len(retained) == 13
+    assert numpy.all(numpy.diff(retained.latitude[:-1]) > 0.0008)
+    # A fix a minute
+    assert len(track.downsample(min_interval=60)) == 18
+    assert track.downsample() is track
+
+
+def test_snap() -> None:
+    # Back and forth between two cells
+    track = Track([0.1, 0.2, 1.1, 1.2, 0.3, 0.4], [0.1] * 6)
+    assert track.snap(1.0).latitude.tolist() == [0.1, 1.1, 0.3]
+    assert track.snap(1.0, unique=True).latitude.tolist() == [0.1, 1.1]
+    assert track.snap(1.0, centers=True).latitude.tolist() == [0.5, 1.5, 0.5]
+
+
+def test_ingest(tmp_path) -> None:
+    path = _gpx(tmp_path / "track.gpx")
+    bundle = uco.core.Bundle()
+    ingester = TrackIngester(min_distance=100)
+    assert ingester.ingest([path], bundle) == ingester.retained
+    assert ingester.points == 101 and ingester.retained < 20
+    locations = bundle["uco-core:object"]
+    facet = locations[0]["uco-core:hasFacet"][0]
+    assert locations[0]["@type"] == "uco-location:Location"
+    assert facet["uco-location:latitude"] == 61.185055
+    assert "uco-location:altitude" not in facet
+    assert locations[1]["uco-core:hasFacet"][0]["uco-location:altitude"] == 100.0
+    # The time of a fix is carried, when known (the waypoint has none)
+    assert "uco-core:objectCreatedTime" not in locations[0]
+    assert locations[1]["uco-core:objectCreatedTime"] == {
+        "@type": "xsd:dateTime",
+        "@value": "2021-03-04T05:00:00+00:00",
+    }
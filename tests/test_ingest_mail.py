@@ -0,0 +1,165 @@
+import base64
+import json
+import multiprocessing
+
+from case_mapping import uco
+from case_mapping.ingest.mail import MailIngester, split_mbox
+from case_mapping.payload import BlobStore, TextReference
+from case_mapping.stream import BundleWriter
+
+ATTACHMENT = b"%PDF-1.4 not really a PDF"
+
+MULTIPART = f"""From alice@example.com Thu Mar  4 05:06:07 2021
+From: =?utf-8?q?Alice_M=C3=BCller?= <Alice@Example.com>
+To: bob@example.org, Carol <carol@example.net>
+Subject: =?utf-8?q?Caf=C3=A9?= agenda
+Date: Thu, 04 Mar 2021 05:06:07 +0000
+Message-ID: <1@example.com>
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="XYZ"
+
+--XYZ
+Content-Type: text/plain; charset=utf-8
+
+See the attached agenda.
+>From the team
+--XYZ
+Content-Type: application/pdf
+Content-Disposition: attachment; filename="agenda.pdf"
+Content-Transfer-Encoding: base64
+
+{base64.b64encode(ATTACHMENT).decode()}
+--XYZ--
+"""
+
+
+def _plain(index):
+    return f"""From bob@example.org Thu Mar  4 06:00:00 2021
+From: Bob <bob@example.org>
+To: alice@example.com
+Subject: Re: {index}
+Date: Thu, 04 Mar 2021 06:00:{index:02d} +0000
+
+Reply {index}
+"""
+
+
+def _mbox(path, count=5):
+    path.write_text(MULTIPART + "".join(_plain(i) for i in range(count)))
+    return path
+
+
+def _facets(objects, facet_type):
+    return [
+        obj["uco-core:hasFacet"][0]
+        for obj in objects
+        if obj.get("uco-core:hasFacet")
+        and obj["uco-core:hasFacet"][0]["@type"] == facet_type
+    ]
+
+
+def test_split_mbox(tmp_path) -> None:
+    path = _mbox(tmp_path / "inbox.mbox")
+    data = path.read_bytes()
+    units = split_mbox(path, chunk_size=100)
+    assert units[0][1] == 0 and units[-1][2] == len(data)
+    for (_, _, end), (_, start, _) in zip(units, units[1:]):
+        assert end == start and data[start : start + 5] == b"From "
+    assert len(units) > 2
+    assert split_mbox(path) == [(path, 0, len(data))]
+
+
+def test_mbox_and_eml(tmp_path) -> None:
+    path = _mbox(tmp_path / "inbox.mbox")
+    eml = tmp_path / "message.eml"
+    eml.write_text(_plain(9).split("\n", 1)[1])
+    bundle = uco.core.Bundle()
+    ingester = MailIngester(workers=1, chunk_size=100)
+    ingester.ingest([path, eml], bundle)
+
+    objects = bundle["uco-core:object"]
+    messages = _facets(objects, "uco-observable:EmailMessageFacet")
+    assert len(messages) == 7
+    # Three distinct addresses, each with an account
+    addresses = {
+        facet["uco-observable:addressValue"]: obj["@id"]
+        for obj in objects
+        for facet in obj.get("uco-core:hasFacet", [])
+        if facet["@type"] == "uco-observable:EmailAddressFacet"
+    }
+    assert set(addresses) == {
+        "alice@example.com",
+        "bob@example.org",
+        "carol@example.net",
+    }
+    assert len(_facets(objects, "uco-observable:EmailAccountFacet")) == 3
+    assert len(ingester.addresses) == 3
+
+    first = messages[0]
+    assert first["uco-observable:subject"] == "Café agenda"
+    assert first["uco-observable:body"] == "See the attached agenda.\n>From the team"
+    assert first["uco-observable:from"]["@id"] == addresses["alice@example.com"]
+    assert [to["@id"] for to in first["uco-observable:to"]] == [
+        addresses["bob@example.org"],
+        addresses["carol@example.net"],
+    ]
+    assert first["uco-observable:sentTime"]["@value"] == "2021-03-04T05:06:07+00:00"
+    assert first["uco-observable:isMultipart"] is True
+    assert messages[-1]["uco-observable:subject"] == "Re: 9"
+
+    attachment = _facets(objects, "uco-observable:FileFacet")[0]
+    assert attachment["uco-observable:fileName"] == "agenda.pdf"
+    relationship = [
+        obj
+        for obj in objects
+        if obj["@type"] == "uco-observable:ObservableRelationship"
+    ][0]
+    assert relationship["uco-core:kindOfRelationship"] == "Attached_To"
+
+
+def test_dates_without_time_zone(tmp_path) -> None:
+    paths = []
+    for index, date in enumerate(
+        ("Thu, 04 Mar 2021 05:06:07 -0000", "Thu, 04 Mar 2021 05:06:07")
+    ):
+        paths.append(tmp_path / f"{index}.eml")
+        paths[-1].write_text(f"From: bob@example.org\nDate: {date}\n\nBody\n")
+    bundle = uco.core.Bundle()
+    MailIngester(workers=1).ingest(paths, bundle)
+    messages = _facets(bundle["uco-core:object"], "uco-observable:EmailMessageFacet")
+    # Assumed to be UTC
+    assert [facet["uco-observable:sentTime"]["@value"] for facet in messages] == [
+        "2021-03-04T05:06:07+00:00"
+    ] * 2
+
+
+def test_lazy_payloads_on_a_process_pool(tmp_path) -> None:
+    path = _mbox(tmp_path / "inbox.mbox", count=20)
+    store = BlobStore(tmp_path / "blobs")
+    ingester = MailIngester(
+        workers=2,
+        store=store,
+        chunk_size=200,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    records = list(ingester.iter_records([path]))
+    assert len(records) == 21
+    assert [record["subject"] for record in records[1:]] == [
+        f"Re: {i}" for i in range(20)
+    ]
+    assert isinstance(records[0]["body"], TextReference)
+
+    case_path = tmp_path / "case.json"
+    with BundleWriter(case_path, indent=2) as writer:
+        ingester.ingest([path], writer)
+    objects = json.loads(case_path.read_text())["uco-core:object"]
+    messages = _facets(objects, "uco-observable:EmailMessageFacet")
+    assert messages[1]["uco-observable:body"] == "Reply 0\n"
+    content = [
+        facet
+        for obj in objects
+        for facet in obj.get("uco-core:hasFacet", [])
+        if facet["@type"] == "uco-observable:ContentDataFacet"
+    ][0]
+    assert base64.b64decode(content["uco-observable:dataPayload"]) == ATTACHMENT
+    assert content["uco-observable:sizeInBytes"] == len(ATTACHMENT)
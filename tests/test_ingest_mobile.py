@@ -0,0 +1,118 @@
+import sqlite3
+
+from case_mapping import uco
+from case_mapping.ingest.mobile import (
+    ANDROID_CALLS,
+    ANDROID_SMS,
+    PhoneRecordIngester,
+    TableMapping,
+    normalize_phone_number,
+)
+
+# 2021-03-04T05:06:07Z, in milliseconds
+TIMESTAMP = 1614834367000
+
+
+def _database(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE sms (_id INTEGER PRIMARY KEY, thread_id INTEGER, address TEXT, date INTEGER,
+                          type INTEGER, body TEXT);
+        CREATE TABLE calls (_id INTEGER PRIMARY KEY, number TEXT, date INTEGER, duration INTEGER,
+                            type INTEGER);
+        CREATE TABLE chat (msg_id INTEGER, sender TEXT, sent INTEGER, content TEXT);
+        """
+    )
+    connection.executemany(
+        "INSERT INTO sms VALUES (?, 1, ?, ?, ?, ?)",
+        [
+            (1, "+44 7700 900123", TIMESTAMP, 1, "Are you free this weekend?"),
+            (2, "07700-900123", TIMESTAMP + 60000, 2, "Yes"),
+            (3, "0044 7700 900999", 0, 3, "Draft"),
+            (4, "VODAFONE", TIMESTAMP, 1, "Your bill"),
+        ],
+    )
+    connection.executemany(
+        "INSERT INTO calls VALUES (?, ?, ?, ?, ?)",
+        [
+            (1, "(07700) 900123", TIMESTAMP, 90, 2),
+            (2, "+447700900999", TIMESTAMP, 0, 3),
+        ],
+    )
+    connection.execute("INSERT INTO chat VALUES (7, '+447700900123', 1614834367, 'Hi')")
+    connection.commit()
+    connection.close()
+
+
+def test_normalize_phone_number() -> None:
+    assert normalize_phone_number("0044 7700-900.123") == "+447700900123"
+    assert normalize_phone_number("07700 900123", "44") == "+447700900123"
+    assert normalize_phone_number("07700 900123") == "07700900123"
+    assert normalize_phone_number(" VODAFONE ") == "VODAFONE"
+    assert normalize_phone_number("") is None
+
+
+def test_sms_and_calls_share_accounts(tmp_path) -> None:
+    path = tmp_path / "mmssms.db"
+    _database(path)
+    bundle = uco.core.Bundle()
+    sms = PhoneRecordIngester(
+        path, ANDROID_SMS, owner_number="07700 900000", country_code="44", batch_size=3
+    )
+    # 4 messages, the owner and 3 other accounts
+    assert sms.ingest(bundle) == 8
+    calls = PhoneRecordIngester(
+        path, ANDROID_CALLS, country_code="44", accounts=sms.accounts
+    )
+    assert calls.ingest(bundle) == 2
+    assert len(sms.accounts) == 4
+
+    objects = bundle["uco-core:object"]
+    accounts = {
+        obj["uco-core:hasFacet"][0]["uco-observable:phoneNumber"]: obj["@id"]
+        for obj in objects
+        if obj["uco-core:hasFacet"][0]["@type"] == "uco-observable:PhoneAccountFacet"
+    }
+    assert set(accounts) == {
+        "+447700900000",
+        "+447700900123",
+        "+447700900999",
+        "VODAFONE",
+    }
+    messages = [obj for obj in objects if obj["@type"] == "uco-observable:Message"]
+    received, sent, draft, _ = [obj["uco-core:hasFacet"][0] for obj in messages]
+    assert received["@type"] == "uco-observable:SMSMessageFacet"
+    assert received["uco-observable:from"]["@id"] == accounts["+447700900123"]
+    assert received["uco-observable:to"][0]["@id"] == accounts["+447700900000"]
+    assert sent["uco-observable:to"][0]["@id"] == accounts["+447700900123"]
+    assert sent["uco-observable:messageType"] == "sent"
+    assert sent["uco-observable:sentTime"]["@value"] == "2021-03-04T05:07:07+00:00"
+    assert "uco-observable:sentTime" not in draft
+
+    outgoing, missed = [obj["uco-core:hasFacet"][0] for obj in objects[-2:]]
+    assert outgoing["uco-observable:to"]["@id"] == accounts["+447700900123"]
+    assert outgoing["uco-observable:duration"] == 90
+    assert outgoing["uco-observable:endTime"]["@value"] == "2021-03-04T05:07:37+00:00"
+    assert missed["uco-observable:callType"] == "missed"
+    assert missed["uco-observable:from"]["@id"] == accounts["+447700900999"]
+
+
+def test_custom_mapping(tmp_path) -> None:
+    path = tmp_path / "chat.db"
+    _database(path)
+    mapping = TableMapping(
+        "chat",
+        "message",
+        {"id": "msg_id", "address": "sender", "time": "sent", "text": "content"},
+        types={None: ("chat", True)},
+        time_scale=1000000,
+        order="msg_id",
+    )
+    bundle = uco.core.Bundle()
+    assert PhoneRecordIngester(path, mapping).ingest(bundle) == 2
+    message = bundle["uco-core:object"][1]["uco-core:hasFacet"][0]
+    assert message["@type"] == "uco-observable:MessageFacet"
+    assert message["uco-observable:messageID"] == "7"
+    assert message["uco-observable:sentTime"]["@value"] == "2021-03-04T05:06:07+00:00"
+    assert message["uco-observable:from"]["@id"] == bundle["uco-core:object"][0]["@id"]
@@ -0,0 +1,165 @@
+import multiprocessing
+
+from case_mapping import uco
+from case_mapping.ingest.network import (
+    NetworkLogIngester,
+    dns_answer,
+    pack_ipv4,
+    unpack_ipv4,
+)
+
+FIELDS = {
+    "conn": "ts uid id.orig_h id.orig_p id.resp_h id.resp_p proto duration",
+    "dns": "ts uid id.orig_h id.resp_h query qtype_name answers TTLs",
+    "http": "ts uid id.orig_h id.resp_h method host uri",
+}
+
+
+def _log(path, kind, rows):
+    lines = [
+        r"#separator \x09",
+        "#set_separator\t,",
+        "#empty_field\t(empty)",
+        "#unset_field\t-",
+        f"#path\t{kind}",
+        "#fields\t" + FIELDS[kind].replace(" ", "\t"),
+    ]
+    lines += ["\t".join(row) for row in rows]
+    lines.append("#close\t2021-03-04-06-00-00")
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def test_pack_ipv4() -> None:
+    assert pack_ipv4("10.0.0.1") == 0x0A000001
+    assert unpack_ipv4(0x0A000001) == "10.0.0.1"
+    assert pack_ipv4("fe80::1") is None
+    assert pack_ipv4("10.0.1") is None
+
+
+def test_dns_answers() -> None:
+    assert dns_answer("93.184.216.34") == 0x5DB8D822
+    assert dns_answer("Mail.Example.com.") == "mail.example.com"
+    assert dns_answer("_sip._tcp.example.com") == "_sip._tcp.example.com"
+    for answer in ("2001:db8::1", "TXT 12 v=spf1 -all", "a..b", "-bad.example.com"):
+        assert dns_answer(answer) is None
+
+
+def test_interned_observables(tmp_path) -> None:
+    conn = _log(
+        tmp_path / "conn.log",
+        "conn",
+        [
+            [
+                "1614834367.5",
+                f"C{i}",
+                "10.0.0.1",
+                "5000",
+                f"93.184.216.{i % 3}",
+                "443",
+                "tcp",
+                "1.25",
+            ]
+            for i in range(300)
+        ]
+        + [["1614834367.5", "C", "fe80::1", "1", "fe80::2", "2", "udp", "-"]],
+    )
+    dns = _log(
+        tmp_path / "dns.log",
+        "dns",
+        [
+            [
+                "1614834367.0",
+                "D1",
+                "10.0.0.1",
+                "10.0.0.53",
+                "WWW.Example.com",
+                "A",
+                "example.com,93.184.216.0",
+                "60",
+            ],
+            [
+                "1614834368.0",
+                "D2",
+                "10.0.0.1",
+                "10.0.0.53",
+                "example.org",
+                "A",
+                "-",
+                "-",
+            ],
+            # An IPv6 address and a TXT record are skipped, not mapped to domain names
+            [
+                "1614834369.0",
+                "D3",
+                "10.0.0.1",
+                "10.0.0.53",
+                "example.net",
+                "AAAA",
+                "2001:db8::1,TXT 12 v=spf1 -all",
+                "60,60",
+            ],
+        ],
+    )
+    http = _log(
+        tmp_path / "http.log",
+        "http",
+        [
+            [
+                "1614834369.0",
+                "H1",
+                "10.0.0.1",
+                "93.184.216.1",
+                "GET",
+                "www.example.com",
+                "/",
+            ]
+        ],
+    )
+    bundle = uco.core.Bundle()
+    ingester = NetworkLogIngester(
+        workers=2, chunk_size=4096, mp_context=multiprocessing.get_context("spawn")
+    )
+    assert len([unit for unit in ingester.units([conn]) if unit[0] == conn]) > 1
+    ingester.ingest([conn, dns, http], bundle)
+    assert ingester.errors == []
+    assert ingester.skipped == 3
+
+    objects = bundle["uco-core:object"]
+    by_type = {}
+    for obj in objects:
+        by_type.setdefault(obj["@type"], []).append(obj)
+    # 10.0.0.1 and three 93.184.216.x addresses
+    assert len(by_type["uco-observable:IPv4Address"]) == 4
+    # Queried domains are recorded even without answers
+    assert len(by_type["uco-observable:DomainName"]) == 4
+    assert len(by_type["uco-observable:HostName"]) == 1
+    relationships = by_type["uco-observable:ObservableRelationship"]
+    assert len(relationships) == 300 + 2 + 1
+
+    ids = {
+        obj["uco-core:hasFacet"][0].get("uco-observable:addressValue")
+        or obj["uco-core:hasFacet"][0].get("uco-observable:value"): obj["@id"]
+        for obj in objects
+        if obj.get("uco-core:hasFacet")
+    }
+    first = relationships[0]
+    assert first["uco-core:kindOfRelationship"] == "Connected_To"
+    assert first["uco-core:source"]["@id"] == ids["10.0.0.1"]
+    assert first["uco-core:target"]["@id"] == ids["93.184.216.0"]
+    assert (
+        first["uco-observable:startTime"]["@value"]
+        == "2021-03-04T05:06:07.500000+00:00"
+    )
+    assert (
+        first["uco-observable:endTime"]["@value"] == "2021-03-04T05:06:08.750000+00:00"
+    )
+
+    cname, address = relationships[300:302]
+    assert cname["uco-core:source"]["@id"] == ids["www.example.com"]
+    assert cname["uco-core:target"]["@id"] == ids["example.com"]
+    assert address["uco-core:target"]["@id"] == ids["93.184.216.0"]
+    assert address["uco-core:kindOfRelationship"] == "Resolved_To"
+    host = by_type["uco-observable:HostName"][0]
+    assert host["uco-observable:value"] == "www.example.com"
+    assert relationships[-1]["uco-core:target"]["@id"] == host["@id"]
@@ -0,0 +1,146 @@
+import base64
+import hashlib
+import multiprocessing
+
+from case_mapping import uco
+from case_mapping.ingest.x509 import CertificateParser, parse_certificate
+from case_mapping.uco.observable import FacetX509Certificate
+
+RSA_OID = bytes.fromhex("2a864886f70d010101")
+SHA256_RSA_OID = bytes.fromhex("2a864886f70d01010b")
+CN_OID = bytes.fromhex("550403")
+O_OID = bytes.fromhex("55040a")
+C_OID = bytes.fromhex("550406")
+
+
+def _tlv(tag, content):
+    length = len(content)
+    if length < 0x80:
+        header = bytes([tag, length])
+    else:
+        size = (length.bit_length() + 7) // 8
+        header = bytes([tag, 0x80 | size]) + length.to_bytes(size, "big")
+    return header + content
+
+
+def _integer(value):
+    return _tlv(0x02, value.to_bytes((value.bit_length() + 8) // 8, "big"))
+
+
+def _name(*attributes):
+    return _tlv(
+        0x30,
+        b"".join(
+            _tlv(0x31, _tlv(0x30, _tlv(0x06, oid) + _tlv(tag, value.encode("utf-8"))))
+            for oid, tag, value in attributes
+        ),
+    )
+
+
+def _certificate(serial, subject, issuer, modulus=(1 << 2047) + 12345):
+    algorithm = _tlv(0x30, _tlv(0x06, SHA256_RSA_OID) + b"\x05\x00")
+    public_key = _tlv(0x30, _integer(modulus) + _integer(65537))
+    tbs = _tlv(
+        0x30,
+        _tlv(0xA0, _integer(2))
+        + _integer(serial)
+        + algorithm
+        + issuer
+        + _tlv(
+            0x30,
+            _tlv(0x17, b"210304050607Z") + _tlv(0x18, b"20510304050607Z"),
+        )
+        + subject
+        + _tlv(
+            0x30,
+            _tlv(0x30, _tlv(0x06, RSA_OID) + b"\x05\x00")
+            + _tlv(0x03, b"\x00" + public_key),
+        ),
+    )
+    return _tlv(0x30, tbs + algorithm + _tlv(0x03, b"\x00" + bytes(range(64))))
+
+
+CA = _name((C_OID, 0x13, "US"), (O_OID, 0x0C, "Example, Inc."), (CN_OID, 0x0C, "Root"))
+LEAF = _name((CN_OID, 0x0C, "www.example.com"))
+
+
+def _pem(der):
+    encoded = base64.encodebytes(der).decode()
+    return f"-----BEGIN CERTIFICATE-----\n{encoded}-----END CERTIFICATE-----\n"
+
+
+def test_parse_certificate() -> None:
+    der = _certificate(0x1234ABCD, LEAF, CA)
+    record = parse_certificate(der)
+    assert record["version"] == "3"
+    assert record["serial_number"] == "1234abcd"
+    assert record["issuer"] == r"CN=Root,O=Example\, Inc.,C=US"
+    assert record["subject"] == "CN=www.example.com"
+    assert not record["is_self_signed"]
+    assert record["not_before"].isoformat() == "2021-03-04T05:06:07+00:00"
+    assert record["not_after"].isoformat() == "2051-03-04T05:06:07+00:00"
+    assert record["public_key_algorithm"] == "rsaEncryption"
+    assert record["modulus"] == format((1 << 2047) + 12345, "x")
+    assert record["exponent"] == 65537
+    assert record["signature_algorithm"] == "sha256WithRSAEncryption"
+    assert record["signature"] == bytes(range(64)).hex()
+    assert record["thumbprints"]["SHA1"] == hashlib.sha1(der).hexdigest()
+    assert record["thumbprints"]["SHA256"] == hashlib.sha256(der).hexdigest()
+    assert parse_certificate(_certificate(1, CA, CA))["is_self_signed"]
+
+
+def test_facet_keys() -> None:
+    facet = FacetX509Certificate(
+        signature="00ff",
+        signature_algo="sha256WithRSAEncryption",
+        subject="CN=www.example.com",
+        thumbprint_hash=("SHA1", "ab" * 20),
+    )
+    assert facet["uco-observable:signature"] == "00ff"
+    assert facet["uco-observable:signatureAlgorithm"] == "sha256WithRSAEncryption"
+    assert facet["uco-observable:subject"] == "CN=www.example.com"
+    assert "uco-observable-subject" not in facet
+    assert facet["uco-observable:isSelfSigned"] is False
+    assert facet["uco-observable:thumbprintHash"]["uco-types:hashMethod"] == "SHA1"
+
+
+def test_deduplicated_certificates(tmp_path) -> None:
+    root = _certificate(1, CA, CA)
+    leaves = [_certificate(serial, LEAF, CA) for serial in range(2, 40)]
+    bundle_path = tmp_path / "bundle.pem"
+    bundle_path.write_text(
+        "Certificates\n" + "".join(_pem(der) for der in [root] + leaves + [root])
+    )
+    der_path = tmp_path / "root.der"
+    der_path.write_bytes(root + leaves[0])
+    broken_path = tmp_path / "broken.der"
+    broken_path.write_bytes(root[:100])
+
+    parser = CertificateParser(
+        workers=2, chunk_size=4096, mp_context=multiprocessing.get_context("spawn")
+    )
+    assert len(list(parser.units([bundle_path]))) > 1
+    bundle = uco.core.Bundle()
+    assert parser.ingest([bundle_path, der_path, broken_path], bundle) == 39
+    assert len(parser.certificates) == 39
+    assert len(parser.errors) == 1
+
+    objects = bundle["uco-core:object"]
+    assert objects[0]["@type"] == "uco-observable:X509Certificate"
+    facet = objects[0]["uco-core:hasFacet"][0]
+    assert facet["uco-observable:isSelfSigned"] is True
+    assert facet["uco-observable:serialNumber"] == "1"
+    assert facet["uco-observable:validityNotBefore"]["@value"] == (
+        "2021-03-04T05:06:07+00:00"
+    )
+    assert facet["uco-observable:thumbprintHash"]["uco-types:hashValue"] == {
+        "@type": "xsd:hexBinary",
+        "@value": hashlib.sha1(root).hexdigest(),
+    }
+    assert [
+        obj["uco-core:hasFacet"][0]["uco-observable:serialNumber"] for obj in objects
+    ] == [format(serial, "x") for serial in range(1, 40)]
+
+    # Certificates are shared between parsers
+    other = CertificateParser(workers=1, certificates=parser.certificates)
+    assert other.ingest([der_path], bundle) == 0
@@ -0,0 +1,96 @@
+import io
+import json
+
+from case_mapping import instrumentation, uco
+from case_mapping.base import FacetEntity
+from case_mapping.stream import BundleWriter
+
+
+def _objects(count):
+    objects = []
+    for i in range(count):
+        obj = uco.observable.ObservableObject()
+        obj.append_facets(
+            uco.observable.FacetFile(file_name=f"{i}.txt", size_bytes=i),
+            uco.observable.FacetContentData(hash_method="SHA256", hash_value="00"),
+        )
+        objects.append(obj)
+    return objects
+
+
+def test_counts_timings_and_bytes() -> None:
+    original_init = FacetEntity.__init__
+    with instrumentation.instrumented() as metrics:
+        assert FacetEntity.__init__ is not original_init
+        bundle = uco.core.Bundle()
+        objects = _objects(10)
+        bundle.append_to_uco_object(objects)
+        text = str(bundle)
+        output = io.StringIO()
+        with BundleWriter(output) as writer:
+            writer.write(objects)
+    # Disabled: the original methods are back
+    assert FacetEntity.__init__ is original_init
+
+    stats = bundle.stats()
+    assert stats == metrics.snapshot() | {
+        "time": stats["time"],
+        "elapsed": stats["elapsed"],
+    }
+    assert stats["constructed"]["ObservableObject"]["count"] == 10
+    assert stats["constructed"]["FacetFile"]["count"] == 10
+    assert stats["constructed"]["Bundle"]["count"] == 1
+    assert stats["constructed"]["FacetFile"]["seconds"] > 0
+    assert stats["setters"]["_int_vars"]["calls"] >= 20
+    assert stats["setters"]["_str_vars"]["seconds"] > 0
+
+    serialized = stats["serialized"]
+    assert serialized["uco-core:Bundle"] == {
+        "count": 1,
+        "bytes": len(text),
+        "seconds": serialized["uco-core:Bundle"]["seconds"],
+    }
+    # 10 objects in the bundle, and 10 written
+    assert serialized["uco-observable:ObservableObject"]["count"] == 20
+    assert serialized["uco-observable:FileFacet"]["count"] == 20
+    compact = sum(len(json.dumps(obj, separators=(",", ":"))) for obj in objects)
+    assert serialized["uco-observable:ObservableObject"]["bytes"] == 2 * compact
+
+    # Nothing is collected once disabled
+    _objects(1)
+    assert bundle.stats()["constructed"]["ObservableObject"]["count"] == 10
+
+
+def test_classes_defined_when_enabled() -> None:
+    with instrumentation.instrumented() as metrics:
+
+        class FacetCustom(FacetEntity):
+            def __init__(self, name=None):
+                super().__init__()
+                self["@type"] = "kb:CustomFacet"
+                self._str_vars(**{"uco-core:name": name})
+
+        original_init = FacetCustom.__dict__["__init__"].__wrapped__
+        FacetCustom(name="custom")
+    assert FacetCustom.__init__ is original_init
+    assert "__init_subclass__" not in FacetEntity.__dict__
+    FacetCustom()
+    entry = metrics.snapshot()["constructed"]["FacetCustom"]
+    assert entry["count"] == 1 and entry["seconds"] > 0
+
+
+def test_periodic_snapshots(tmp_path) -> None:
+    path = tmp_path / "metrics.jsonl"
+    snapshots = []
+    metrics = instrumentation.enable(breakdown=False)
+    try:
+        metrics.reset()
+        metrics.start_snapshots(path, interval=0.01)
+        _objects(3)
+        metrics.start_snapshots(snapshots.append, interval=60)
+    finally:
+        instrumentation.disable()
+    lines = path.read_text().splitlines()
+    assert lines and json.loads(lines[-1])["constructed"]["FacetFile"]["count"] == 3
+    # The last snapshot is exported when stopped
+    assert len(snapshots) == 1
@@ -0,0 +1,78 @@
+import json
+
+from case_mapping import uco
+from case_mapping.journal import compact_journal
+
+
+def test_journal_records_only_changes(tmp_path) -> None:
+    bundle = uco.core.Bundle(description="live acquisition")
+    device = uco.observable.ObservableObject()
+    bundle.append_to_uco_object(device)
+    journal = bundle.enable_journal(tmp_path / "case.journal")
+
+    phones = [uco.observable.ObservableObject() for _ in range(3)]
+    bundle.append_to_uco_object(phones)
+    # The header, the pre-existing device and the three phones
+    assert journal.flush() == 5
+    assert journal.flush() == 0
+
+    # Appending a facet and setting a field on a facet only dirty the owning object.
+    facet = uco.observable.FacetPhoneAccount()
+    phones[1].append_facets(facet)
+    assert journal.flush() == 1
+    facet._str_vars(**{"uco-observable:phoneNumber": "123456"})
+    bundle.append_to_rdfs_comments("snapshot 2")
+    assert journal.flush() == 2
+
+    destination = tmp_path / "case.json"
+    assert journal.compact(destination) == 4
+    assert json.loads(destination.read_text()) == json.loads(str(bundle))
+    journal.close()
+
+
+def test_compaction_ignores_truncated_record(tmp_path) -> None:
+    bundle = uco.core.Bundle()
+    journal = bundle.enable_journal(tmp_path / "case.journal")
+    bundle.append_to_uco_object(uco.identity.Organization(name="Nikon"))
+    journal.close()
+    with open(tmp_path / "case.journal", "ab") as fp:
+        fp.write(b'{"key":"uco-core:object","object":{"@id"')
+
+    assert compact_journal(tmp_path / "case.journal", tmp_path / "case.json") == 1
+
+
+def test_compaction_drops_removed_objects(tmp_path) -> None:
+    bundle = uco.core.Bundle()
+    journal = bundle.enable_journal(tmp_path / "case.journal")
+    phones = [uco.observable.ObservableObject() for _ in range(3)]
+    bundle.append_to_uco_object(phones)
+    journal.flush()
+
+    bundle.remove(phones[1])
+    # A removed object is not recorded anymore
+    phones[1].append_facets(uco.observable.FacetPhoneAccount())
+    assert journal.flush() == 0
+
+    destination = tmp_path / "case.json"
+    assert journal.compact(destination) == 2
+    assert json.loads(destination.read_text()) == json.loads(str(bundle))
+    journal.close()
+
+
+def test_snapshot_edits_are_not_journaled(tmp_path) -> None:
+    bundle = uco.core.Bundle()
+    journal = bundle.enable_journal(tmp_path / "case.journal")
+    phone = uco.observable.ObservableObject()
+    phone.append_facets(uco.observable.FacetPhoneAccount(phone_number="123"))
+    bundle.append_to_uco_object(phone)
+    journal.flush()
+    recorded = (tmp_path / "case.journal").read_bytes()
+
+    # The copy made for the snapshot belongs to the snapshot, which has no journal
+    clone = bundle.snapshot().edit(phone)
+    assert clone._journal is None and clone["uco-core:hasFacet"][0]._journal is None
+    clone["uco-core:hasFacet"][0]._str_vars(**{"uco-observable:displayName": "Bob"})
+    clone.append_facets(uco.observable.FacetAccount(identifier="bob"))
+    assert journal.flush() == 0
+    assert (tmp_path / "case.journal").read_bytes() == recorded
+    journal.close()
@@ -0,0 +1,52 @@
+import sys
+import tracemalloc
+
+from case_mapping import uco
+
+
+def _bundle(bodies):
+    bundle = uco.core.Bundle(uco_core_name="memory")
+    for body in bodies:
+        message = uco.observable.ObservableObject()
+        message.append_facets(
+            uco.observable.FacetEmailMessage(body=body, subject="subject")
+        )
+        bundle.append_to_uco_object(message)
+    return bundle
+
+
+def test_memory_report() -> None:
+    body = "x" * 100000
+    report = _bundle([body, body, "short"]).memory_report(largest=2)
+
+    assert report["bytes"] == sum(entry["bytes"] for entry in report["types"].values())
+    assert report["bytes"] == sum(report["keys"].values())
+    assert report["types"]["uco-observable:ObservableObject"]["count"] == 3
+    assert report["types"]["uco-observable:EmailMessageFacet"]["count"] == 3
+    assert list(report["types"])[0] == "uco-observable:EmailMessageFacet"
+    assert list(report["keys"])[0] == "uco-observable:body"
+    # The shared body is counted once, with the first object holding it
+    assert sys.getsizeof(body) <= report["keys"]["uco-observable:body"]
+    assert report["keys"]["uco-observable:body"] < 2 * sys.getsizeof(body)
+    largest = report["largest"]
+    assert len(largest) == 2
+    assert largest[0]["bytes"] > sys.getsizeof(body) > largest[1]["bytes"]
+    assert largest[0]["@type"] == "uco-observable:ObservableObject"
+    assert report["allocations"] is None
+
+    copies = _bundle(["x" * 100000, "x" * 100000, "short"]).memory_report()
+    assert copies["keys"]["uco-observable:body"] == report["keys"][
+        "uco-observable:body"
+    ] + sys.getsizeof(body)
+
+
+def test_memory_report_allocations() -> None:
+    tracemalloc.start()
+    try:
+        bundle = _bundle(["y" * 100000])
+        report = bundle.memory_report(allocations=3)
+    finally:
+        tracemalloc.stop()
+    (site, *_) = report["allocations"]
+    assert site["file"] == __file__
+    assert site["bytes"] >= 100000
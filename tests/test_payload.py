@@ -0,0 +1,78 @@
+import base64
+import json
+import os
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.base import json_default
+from case_mapping.payload import BlobStore, PayloadReference
+from case_mapping.stream import BundleWriter
+
+DATA = os.urandom(3 * 1000 + 1)
+
+
+def _payload_object(payload):
+    obj = uco.observable.ObservableObject()
+    obj.append_facets(uco.observable.FacetContentData(data_payload=payload))
+    return obj
+
+
+def test_byte_range(tmp_path) -> None:
+    path = tmp_path / "image.bin"
+    path.write_bytes(DATA)
+    reference = PayloadReference(path, offset=10, length=100)
+    assert reference.size() == 100
+    assert reference.read() == DATA[10:110]
+    assert PayloadReference(path, offset=len(DATA) - 5).size() == 5
+    # Chunked encoding yields the same text as encoding the payload whole
+    assert "".join(reference.iter_json()) == json.dumps(reference.to_json())
+
+
+def test_blob_store_dedup(tmp_path) -> None:
+    store = BlobStore(tmp_path / "blobs")
+    source = tmp_path / "source.bin"
+    source.write_bytes(b"xx" + DATA)
+
+    first = store.put_bytes(DATA)
+    assert store.put_bytes(DATA) == first
+    assert store.put_file(source, offset=2) == first
+    assert store.put_stream(iter([DATA[:7], DATA[7:]])) == first
+    assert first.read() == DATA
+    stored = [name for _, _, names in os.walk(store.root) for name in names]
+    assert len(stored) == 1
+
+
+def test_serialization(tmp_path) -> None:
+    path = tmp_path / "image.bin"
+    path.write_bytes(DATA)
+    obj = _payload_object(PayloadReference(path))
+    encoded = base64.b64encode(DATA).decode("ascii")
+    assert (
+        json.loads(str(obj))["uco-core:hasFacet"][0]["uco-observable:dataPayload"]
+        == encoded
+    )
+
+    bundle = uco.core.Bundle(description="payloads")
+    bundle.append_to_uco_object(obj)
+    for indent in (None, 2):
+        case_path = tmp_path / "case.json"
+        with BundleWriter(case_path, bundle, indent=indent) as writer:
+            writer.write(_payload_object(PayloadReference(path, 1, 2)))
+        objects = json.loads(case_path.read_text())["uco-core:object"]
+        payloads = [
+            obj["uco-core:hasFacet"][0]["uco-observable:dataPayload"] for obj in objects
+        ]
+        assert payloads == [encoded, base64.b64encode(DATA[1:3]).decode("ascii")]
+
+
+def test_plain_json_dumps(tmp_path) -> None:
+    path = tmp_path / "image.bin"
+    path.write_bytes(DATA)
+    facet = uco.observable.FacetContentData(data_payload=PayloadReference(path))
+    # As documented: the payload is only materialized through the default hook
+    with pytest.raises(TypeError):
+        json.dumps(facet)
+    encoded = json.loads(json.dumps(facet, default=json_default))
+    assert encoded == json.loads(str(facet))
+    assert encoded["uco-observable:dataPayload"] == base64.b64encode(DATA).decode()
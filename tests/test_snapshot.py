@@ -0,0 +1,48 @@
+import json
+
+from case_mapping import uco
+
+
+def _base_bundle():
+    bundle = uco.core.Bundle(description="base")
+    for number in range(100):
+        phone = uco.observable.ObservableObject()
+        phone.append_facets(uco.observable.FacetPhoneAccount(phone_number=str(number)))
+        bundle.append_to_uco_object(phone)
+    return bundle
+
+
+def test_snapshots_share_unchanged_objects() -> None:
+    base = _base_bundle()
+    before = str(base)
+    redacted, annotated = base.snapshot(), base.snapshot()
+
+    phones = base["uco-core:object"]
+    redacted.remove(phones[0], phones[1]["@id"])
+    edited = annotated.edit(phones[2])
+    edited["uco-core:hasFacet"][0]._str_vars(**{"uco-observable:displayName": "Bob"})
+    edited.append_facets(uco.observable.FacetAccount(identifier="bob"))
+    annotated.append_to_rdfs_comments("annotated")
+
+    assert str(base) == before
+    assert len(redacted["uco-core:object"]) == 98
+    assert redacted["uco-core:object"][0] is phones[2]
+    assert annotated["uco-core:object"][3] is phones[3]
+    assert annotated["uco-core:object"][2] is edited is not phones[2]
+    assert annotated.edit(edited["@id"]) is edited
+    assert len(edited["uco-core:hasFacet"]) == 2
+    assert json.loads(str(annotated))["rdfs:comment"] == ["annotated"]
+
+
+def test_edit_after_snapshot_does_not_leak_into_snapshot() -> None:
+    base = _base_bundle()
+    snapshot = base.snapshot()
+    base.edit(base["uco-core:object"][0]).append_facets(uco.observable.FacetAccount())
+    assert len(snapshot["uco-core:object"][0]["uco-core:hasFacet"]) == 1
+    assert len(base["uco-core:object"][0]["uco-core:hasFacet"]) == 2
+
+
+def test_snapshot_merges_pending_appends() -> None:
+    base = _base_bundle()
+    base.concurrent_appends().append_to_uco_object(uco.observable.ObservableObject())
+    assert len(base.snapshot()["uco-core:object"]) == 101
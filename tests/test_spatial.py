@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.references import ReferenceGraph
+from case_mapping.stream import BundleWriter
+
+numpy = pytest.importorskip("numpy")
+
+from case_mapping.spatial import SpatialIndex, _distances  # noqa: E402
+
+
+def _location(latitude, longitude):
+    return uco.location.Location(
+        facets=uco.location.FacetLocation(latitude=latitude, longitude=longitude)
+    )
+
+
+def _bundle():
+    bundle = uco.core.Bundle()
+    generator = random.Random(7)
+    locations = [
+        _location(generator.uniform(59, 63), generator.uniform(8, 12))
+        for _ in range(2000)
+    ]
+    # Oslo, and both sides of the antimeridian
+    oslo = _location(59.9139, 10.7522)
+    east, west = _location(0.0, 179.99), _location(0.0, -179.99)
+    device = uco.observable.ObservableObject()
+    relationship = uco.observable.ObservableRelationship(
+        source=device, target=oslo, kind_of_relationship="Located_At"
+    )
+    bundle.append_to_uco_object(*locations, oslo, east, west, device, relationship)
+    return bundle, locations, oslo, east, west, device, relationship
+
+
+def _brute_force(locations, latitude, longitude, radius):
+    latitudes = numpy.array(
+        [obj["uco-core:hasFacet"][0]["uco-location:latitude"] for obj in locations]
+    )
+    longitudes = numpy.array(
+        [obj["uco-core:hasFacet"][0]["uco-location:longitude"] for obj in locations]
+    )
+    distances = _distances(latitude, longitude, latitudes, longitudes)
+    return {locations[i]["@id"] for i in numpy.flatnonzero(distances <= radius)}
+
+
+def test_queries() -> None:
+    bundle, locations, oslo, east, west, *_ = _bundle()
+    index = SpatialIndex.from_bundle(bundle, cell_size=0.05)
+    assert len(index) == 2003
+
+    found = index.radius(59.91, 10.75, 20000)
+    assert found[0] is oslo
+    assert {obj["@id"] for obj in found} == _brute_force(
+        locations + [oslo], 59.91, 10.75, 20000
+    )
+    # Across the antimeridian
+    assert {obj["@id"] for obj in index.radius(0.0, 180.0, 5000)} == {
+        east["@id"],
+        west["@id"],
+    }
+    assert {obj["@id"] for obj in index.bounding_box(-1, 179, 1, -179)} == {
+        east["@id"],
+        west["@id"],
+    }
+    in_box = index.bounding_box(60, 9, 60.5, 9.5)
+    assert in_box and all(
+        60 <= obj["uco-core:hasFacet"][0]["uco-location:latitude"] <= 60.5
+        and 9 <= obj["uco-core:hasFacet"][0]["uco-location:longitude"] <= 9.5
+        for obj in in_box
+    )
+
+    nearest = index.nearest(59.9139, 10.7522, count=3)
+    assert nearest[0] == (0.0, oslo)
+    assert nearest[1][0] <= nearest[2][0]
+    assert index.nearest(0.0, 179.0)[0][1] is east
+    # Far from every point: the search radius grows until a point is found
+    assert index.nearest(-60.0, -60.0)[0][1] in (east, west)
+
+
+def test_linked_objects(tmp_path) -> None:
+    bundle, _, oslo, _, _, device, relationship = _bundle()
+    path = tmp_path / "case.json"
+    with BundleWriter(path) as writer:
+        writer.write(*bundle["uco-core:object"])
+    index = SpatialIndex.from_case_file(path, references=True)
+    near = index.radius(59.9139, 10.7522, 10)
+    assert [obj["@id"] for obj in near] == [oslo["@id"]]
+    assert [obj["@id"] for obj in index.linked(near)] == [relationship["@id"]]
+    assert [obj["@id"] for obj in index.linked(near, depth=2)] == [relationship["@id"]]
+    with pytest.raises(ValueError):
+        SpatialIndex.from_bundle(bundle).linked(near)
+
+
+def test_reference_graph() -> None:
+    bundle, _, oslo, _, _, device, relationship = _bundle()
+    graph = ReferenceGraph.from_bundle(bundle)
+    assert graph.referrers_of(oslo["@id"]) == [relationship["@id"]]
+    assert graph.referrers_of(device["@id"]) == [relationship["@id"]]
+    assert graph.resolve(graph.linked([device["@id"]])) == [relationship]
@@ -0,0 +1,35 @@
+import json
+
+from case_mapping import uco
+from case_mapping.stream import BundleWriter, iter_case_file, read_case_header
+
+
+def test_writer_round_trip(tmp_path) -> None:
+    bundle = uco.core.Bundle(description="streamed")
+    bundle.append_to_uco_object(uco.identity.Organization(name="Nikon"))
+    extra = [uco.location.Location(), uco.observable.ObservableObject(state="é")]
+    path = tmp_path / "case.json"
+
+    for indent in (None, 4):
+        with BundleWriter(path, bundle, indent=indent) as writer:
+            writer.write(extra)
+        bundle_dict = json.loads(str(bundle))
+        bundle_dict["uco-core:object"] += json.loads(json.dumps(extra))
+        assert json.loads(path.read_text(encoding="utf-8")) == bundle_dict
+
+    # A tiny chunk size forces values (including numbers) to cross buffer boundaries.
+    events = list(iter_case_file(path, chunk_size=7))
+    assert [value["@id"] for event, _, value in events if event == "object"] == [
+        obj["@id"] for obj in bundle_dict["uco-core:object"]
+    ]
+    assert read_case_header(path)["uco-core:description"] == "streamed"
+
+
+def test_iter_case_file_numbers(tmp_path) -> None:
+    path = tmp_path / "case.json"
+    path.write_text('{"a": 1234567, "uco-core:object": [{"n": 98765}, {"n": 1.5}]}')
+    assert list(iter_case_file(path, chunk_size=3)) == [
+        ("property", "a", 1234567),
+        ("object", "uco-core:object", {"n": 98765}),
+        ("object", "uco-core:object", {"n": 1.5}),
+    ]
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from case_mapping.base import json_default
+from case_mapping.references import iter_references
+from case_mapping.synthetic import CaseGenerator
+from case_mapping.validation import Validator
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+
+
+def test_generator() -> None:
+    for count in (0, 1, 5, 2000):
+        objects = list(CaseGenerator(seed=1).iter_objects(count))
+        assert len(objects) == count
+
+    objects = list(CaseGenerator(seed=1).iter_objects(2000))
+    types = Counter(
+        facet["@type"] for obj in objects for facet in obj.get("uco-core:hasFacet", [])
+    )
+    for kind in ("FileFacet", "EXIFFacet", "EmailMessageFacet", "CallFacet"):
+        assert types[f"uco-observable:{kind}"] > 0
+    assert types["uco-observable:MessageThreadFacet"] > 0
+    assert any(
+        obj["@type"] == "uco-observable:ObservableRelationship" for obj in objects
+    )
+
+    # The same seed gives the same objects, up to their @ids
+    sizes = [len(json.dumps(obj, default=json_default)) for obj in objects]
+    again = CaseGenerator(seed=1).iter_objects(2000)
+    assert [len(json.dumps(obj, default=json_default)) for obj in again] == sizes
+    assert Validator().validate_objects(objects) == []
+    # Referenced objects come first (thread items are inline nodes of their thread)
+    ids = {obj["@id"] for obj in objects}
+    seen = set()
+    for obj in objects:
+        assert set(iter_references(obj)) & ids <= seen
+        seen.add(obj["@id"])
+
+
+def test_benchmark_run(tmp_path) -> None:
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(BENCHMARKS, "run.py"),
+            "--sizes",
+            "200",
+            "--output",
+            str(output),
+            "--work-dir",
+            str(tmp_path),
+            "--threads",
+            "1",
+            "4",
+            "--scaling-objects",
+            "400",
+        ],
+        check=True,
+        stderr=subprocess.DEVNULL,
+    )
+    document = json.loads(output.read_text())
+    (result,) = document["results"]
+    assert result["objects"] == 200
+    assert result["construct_per_second"] > 0
+    assert sum(entry["count"] for entry in result["object_types"].values()) == 200
+    assert result["file_bytes"] > sum(
+        entry["bytes"] for entry in result["object_types"].values()
+    )
+    assert [entry["threads"] for entry in document["scaling"]] == [1, 4]
+    assert document["scaling"][0]["speedup"] == 1.0
+    assert all(entry["objects_per_second"] > 0 for entry in document["scaling"])
+    slots = document["slot_memory"]
+    assert slots["compact_bytes"] * 10 < slots["legacy_bytes"]
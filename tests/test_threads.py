@@ -0,0 +1,159 @@
+import io
+import json
+import time
+from uuid import NAMESPACE_URL, uuid5
+
+import pytest
+
+from case_mapping import uco
+from case_mapping.directory import load_entity
+from case_mapping.stream import BundleWriter
+from case_mapping.threads import ThreadGraph
+
+
+def _positions(graph):
+    return {graph.ids[index]: i for i, index in enumerate(graph.topological_order())}
+
+
+def test_incremental_order() -> None:
+    graph = ThreadGraph("thread")
+    graph.append({"b": ["c"]})
+    graph.append({"c": ["d"], "e": ["f"]})
+    # Links against the current order are accepted when they do not close a cycle
+    graph.append({"a": ["b"], "f": ["a"]})
+    positions = _positions(graph)
+    for source, target in [("a", "b"), ("b", "c"), ("c", "d"), ("e", "f"), ("f", "a")]:
+        assert positions[source] < positions[target]
+    assert (graph.origins, graph.termini) == (1, 1)
+    assert graph.item_id(0) == str(uuid5(NAMESPACE_URL, "thread#b"))
+
+
+def test_cycles_are_rejected() -> None:
+    graph = ThreadGraph("thread")
+    graph.append({"a": ["b"], "b": ["c"]})
+    before = _positions(graph)
+    with pytest.raises(ValueError):
+        graph.append({"c": ["x", "a"]})
+    with pytest.raises(ValueError):
+        graph.append({"a": ["a"]})
+    assert graph.ids == ["a", "b", "c"]
+    assert _positions(graph) == before
+    assert list(graph.iter_elements()) == [{"@id": "a"}, {"@id": "b"}, {"@id": "c"}]
+    assert (graph.origins, graph.termini) == (1, 1)
+
+
+def test_single_terminus() -> None:
+    graph = ThreadGraph("thread", single_terminus=True)
+    graph.append({"a": ["b"]})
+    with pytest.raises(ValueError):
+        graph.append({"a": ["c"]})
+    graph.append({"a": ["c"], "c": ["b"]})
+    assert len(graph) == 3
+
+
+def test_facet_serialization() -> None:
+    facet = uco.observable.FacetMessagethread(
+        display_name="chat", messages={"m1": {"m2", "m3"}}
+    )
+    facet.append_messages({"m3": [uco.observable.Message()]})
+    thread = json.loads(str(facet))["uco-observable:messageThread"]
+    assert thread["co:size"]["@value"] == "4"
+    assert thread["co:element"][0] == {"@id": "m1"}
+    items = {item["@id"]: item for item in thread["co:item"]}
+    origin = items[thread["uco-types:threadOriginItem"][0]["@id"]]
+    assert origin["co:itemContent"] == {"@id": "m1"}
+    assert {
+        items[item["@id"]]["co:itemContent"]["@id"]
+        for item in origin["uco-types:threadNextItem"]
+    } == {"m2", "m3"}
+
+    # The streamed output of BundleWriter is identical
+    output = io.StringIO()
+    with BundleWriter(output) as writer:
+        writer.write(facet)
+    assert json.loads(output.getvalue())["uco-core:object"][0] == json.loads(str(facet))
+
+
+def test_empty_thread() -> None:
+    thread = json.loads(str(uco.observable.FacetMessagethread()))[
+        "uco-observable:messageThread"
+    ]
+    assert thread["co:size"]["@value"] == "0"
+    assert "co:element" not in thread
+
+
+def _nodes(facet):
+    thread = facet["uco-observable:messageThread"]
+    return {
+        key: thread.get(key)
+        for key in ("co:size", "co:element", "co:item", "uco-types:threadOriginItem")
+    }
+
+
+def test_incremental_nodes() -> None:
+    facet = uco.observable.FacetMessagethread()
+    # Plain JSON values, whatever the serializer
+    assert json.loads(json.dumps(facet)) == json.loads(str(facet))
+    for messages in (
+        {"m1": ["m2"]},
+        {"m2": ["m3"], "m4": []},
+        # Links between messages in order, the second one taking an origin
+        {"m1": ["m3", "m4"]},
+        # Links moving messages appended earlier, whose nodes are then regenerated
+        {"m0": ["m1"], "m4": ["m5"]},
+        {"m5": ["m2"]},
+    ):
+        facet.append_messages(messages)
+        graph = facet._thread
+        assert _nodes(facet) == {
+            "co:size": {"@type": "xsd:nonNegativeInteger", "@value": str(len(graph))},
+            "co:element": list(graph.iter_elements()),
+            "co:item": list(graph.iter_items()),
+            "uco-types:threadOriginItem": list(graph.iter_origins()),
+        }
+    assert len(facet["uco-observable:messageThread"]["uco-types:threadOriginItem"]) == 1
+    assert json.loads(json.dumps(facet)) == json.loads(str(facet))
+
+
+def test_copied_and_loaded_facets() -> None:
+    facet = uco.observable.FacetMessagethread(messages={"m1": ["m2"]})
+    message = uco.observable.ObservableObject(facets=facet)
+    bundle = uco.core.Bundle()
+    bundle.append_to_uco_object(message)
+    snapshot = bundle.snapshot()
+    (clone,) = snapshot.edit(message)["uco-core:hasFacet"]
+    clone.append_messages({"m2": ["m3"]})
+    assert facet["uco-observable:messageThread"]["co:size"]["@value"] == "2"
+    assert len(facet._thread) == 2
+    assert clone["uco-observable:messageThread"]["co:size"]["@value"] == "3"
+
+    (loaded,) = load_entity(json.loads(str(message)))["uco-core:hasFacet"]
+    loaded.append_messages({"m2": ["m3"]})
+    assert _nodes(loaded) == _nodes(clone)
+
+
+def test_append_cost(monkeypatch) -> None:
+    calls = []
+    topological_order = ThreadGraph.topological_order
+    monkeypatch.setattr(
+        ThreadGraph,
+        "topological_order",
+        lambda graph: calls.append(graph) or topological_order(graph),
+    )
+    facet = uco.observable.FacetMessagethread()
+    durations = []
+    for block in range(20):
+        start = time.perf_counter()
+        for i in range(block * 1000, (block + 1) * 1000):
+            facet.append_messages({f"m{i}": [f"m{i + 1}"]})
+        durations.append(time.perf_counter() - start)
+    # The nodes are only generated when serialized, so appending does not slow down as the thread grows
+    assert not calls
+    assert durations[-1] < 5 * min(durations[:3])
+    thread = json.loads(json.dumps(facet))["uco-observable:messageThread"]
+    assert len(calls) == 3
+    assert thread["co:size"]["@value"] == "20001"
+    assert len(thread["co:item"]) == len(thread["co:element"]) == 20001
+    assert thread["uco-types:threadOriginItem"] == [
+        {"@id": thread["co:item"][0]["@id"]}
+    ]
@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+from case_mapping import uco, validation
+from case_mapping.stream import BundleWriter
+from case_mapping.validation import Validator, compile_shapes
+
+
+def _bundle():
+    bundle = uco.core.Bundle(uco_core_name="validation")
+    phone = uco.observable.ObservableObject()
+    phone.append_facets(uco.observable.FacetPhoneAccount(phone_number="+4712345678"))
+    image = uco.observable.ObservableObject()
+    image.append_facets(
+        uco.observable.FacetFile(
+            file_name="a.jpg",
+            size_bytes=1024,
+            modified_time=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        ),
+        uco.observable.FacetContentData(hash_method="SHA256", hash_value="00" * 32),
+    )
+    relationship = uco.observable.ObservableRelationship(
+        source=image, target=phone, kind_of_relationship="Contained_Within"
+    )
+    bundle.append_to_uco_object(
+        phone, image, relationship, uco.identity.Organization(name="Police")
+    )
+    return bundle, phone, image, relationship
+
+
+def test_compiled_shapes() -> None:
+    shapes = compile_shapes()
+    is_object, keys = shapes["uco-identity:Organization"]
+    assert is_object and keys["uco-core:name"] == ("str",)
+    assert keys["uco-core:hasFacet"] == ("objects",)
+    is_object, keys = shapes["uco-observable:X509CertificateFacet"]
+    assert not is_object and keys["uco-observable:thumbprintHash"] == ("any",)
+    _, keys = shapes["uco-observable:FileFacet"]
+    assert keys["uco-observable:modifiedTime"] == ("datetime",)
+    assert keys["uco-core:tag"] == ("str_list",)
+
+
+def test_bundle_issues(tmp_path) -> None:
+    bundle, phone, image, relationship = _bundle()
+    validator = Validator()
+    assert validator.validate_bundle(bundle) == []
+
+    file_facet = image["uco-core:hasFacet"][0]
+    file_facet["uco-observable:sizeInBytes"] = "1024"
+    file_facet["uco-observable:fileNmae"] = "a.jpg"
+    file_facet["uco-observable:modifiedTime"]["@value"] = "yesterday"
+    relationship["uco-core:target"] = {"@id": image["@id"], "@type": "uco-core:Bundle"}
+    relationship["uco-core:source"] = {"@id": "missing"}
+    # Direct changes are reported as the setters do
+    file_facet._changed()
+    relationship._changed()
+    bundle.append_to_uco_object(uco.observable.FacetFile(file_name="facet.txt"))
+    issues = validator.validate_bundle(bundle)
+    assert {(issue.id, issue.key) for issue in issues} == {
+        (file_facet["@id"], "uco-observable:sizeInBytes"),
+        (file_facet["@id"], "uco-observable:fileNmae"),
+        (file_facet["@id"], "uco-observable:modifiedTime"),
+        (relationship["@id"], "uco-core:target"),
+        (relationship["@id"], "uco-core:source"),
+        (bundle["uco-core:object"][-1]["@id"], "@type"),
+    }
+
+    path = tmp_path / "case.json"
+    duplicate = uco.observable.ObservableObject()
+    duplicate["@id"] = phone["@id"]
+    with BundleWriter(path, bundle) as writer:
+        # The same definition again is accepted, a different one is not
+        writer.write(phone, duplicate)
+    issues = Validator(check_references=False).validate_case_file(path)
+    assert {(issue.id, issue.key) for issue in issues} == {
+        (file_facet["@id"], "uco-observable:sizeInBytes"),
+        (file_facet["@id"], "uco-observable:fileNmae"),
+        (file_facet["@id"], "uco-observable:modifiedTime"),
+        (relationship["@id"], "uco-core:target"),
+        (bundle["uco-core:object"][-1]["@id"], "@type"),
+        (phone["@id"], "@id"),
+    }
+
+
+def test_only_changed_objects_are_checked() -> None:
+    bundle, phone, image, _ = _bundle()
+    validator = Validator()
+    validator.validate_bundle(bundle)
+    assert (validator.checked, validator.cached) == (4, 0)
+
+    bundle.append_to_uco_object(uco.observable.ObservableObject())
+    phone["uco-core:hasFacet"][0]["uco-observable:phoneNumber"] = 12345678
+    phone["uco-core:hasFacet"][0]._changed()
+    issues = validator.validate_bundle(bundle)
+    assert (validator.checked, validator.cached) == (2, 3)
+    assert [issue.key for issue in issues] == ["uco-observable:phoneNumber"]
+    # Cached results are reported again
+    assert validator.validate_bundle(bundle) == issues
+    assert (validator.checked, validator.cached) == (0, 5)
+
+
+def test_example_case(tmp_path) -> None:
+    # The example embeds the same nodes at top level and in an investigation
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = tmp_path / "example.json"
+    with open(path, "w") as fp:
+        subprocess.run(
+            [sys.executable, os.path.join(root, "example.py")],
+            check=True,
+            cwd=root,
+            stdout=fp,
+        )
+    assert Validator().validate_case_file(path) == []
+
+
+def test_source_unavailable(monkeypatch) -> None:
+    def getsource(cls):
+        raise OSError("could not get source code")
+
+    monkeypatch.setattr(validation.inspect, "getsource", getsource)
+    validation._class_keys.cache_clear()
+    try:
+        with pytest.warns(RuntimeWarning, match="without its source"):
+            shapes = compile_shapes(
+                {
+                    "uco-observable:ObservableObject": uco.observable.ObservableObject,
+                    "uco-observable:FileFacet": uco.observable.FacetFile,
+                }
+            )
+    finally:
+        monkeypatch.undo()
+        validation._class_keys.cache_clear()
+    # The keys are not checked, everything else is
+    facet = uco.observable.FacetFile(file_name="a.txt")
+    facet["uco-observable:fileNmae"] = "a.txt"
+    obj = uco.observable.ObservableObject(facets=facet)
+    issues = Validator(shapes).validate_objects([obj, facet])
+    assert [(issue.id, issue.key) for issue in issues] == [(facet["@id"], "@type")]
+
+
+def test_unchanged_entities_are_not_serialized(monkeypatch) -> None:
+    bundle, phone, image, _ = _bundle()
+    validator = Validator()
+    validator.validate_bundle(bundle)
+    serialized = []
+    digest = validation._digest
+    monkeypatch.setattr(
+        validation, "_digest", lambda value: serialized.append(value) or digest(value)
+    )
+    image["uco-core:hasFacet"][0]._str_vars(**{"uco-observable:fileName": "b.jpg"})
+    assert validator.validate_bundle(bundle) == []
+    assert (validator.checked, validator.cached) == (1, 3)
+    # Only the changed facet is serialized again
+    assert [value["@id"] for value in serialized] == [
+        image["uco-core:hasFacet"][0]["@id"]
+    ]